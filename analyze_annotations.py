@@ -1,70 +1,271 @@
 import os
 import csv
+import json
 import glob
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
-import matplotlib.pyplot as plt
 from pydub import AudioSegment
+from anotacoes import carregar_anotacoes
+import instrumentacao
 import warnings
 
 # Ignorar warnings específicos
 warnings.filterwarnings("ignore", category=UserWarning)
 
-def analisar_audios_anotados(pasta_entrada):
+# Versão do formato do cache de estatísticas (incrementar ao mudar a estrutura)
+CACHE_VERSAO = 2
+
+# Buckets fixos do histograma de durações: 50 ms até 5 s (o último acumula o excedente)
+LARGURA_BUCKET_S = 0.05
+N_BUCKETS = 100
+
+def analisar_audios_anotados(pasta_entrada, caminho_cache=None, cache=None):
     """
     Analisa áudios anotados, conta vocalizações por label, plota duração média
     e calcula duração total dos áudios
     
+    As estatísticas de cada arquivo ficam em um cache (por caminho, tamanho e mtime),
+    de modo que execuções repetidas só reprocessam os arquivos alterados.
+    
     Args:
         pasta_entrada (str): Pasta contendo arquivos .wav e .wav.csv
+        caminho_cache (str): Arquivo JSON do cache (default: .analise_cache.json na pasta)
+        cache (dict): Cache já carregado, para compartilhar entre várias pastas.
+                      Quando informado, não é salvo aqui (quem chamou salva)
+    
+    Returns:
+        dict: Estatísticas combinadas da pasta
     """
     print(f"Analisando pasta: {pasta_entrada}")
     
-    # Coletar todos os arquivos WAV
-    arquivos_wav = glob.glob(os.path.join(pasta_entrada, '*.wav'))
-    print(f"Encontrados {len(arquivos_wav)} arquivos de áudio")
+    salvar = cache is None
+    if caminho_cache is None:
+        caminho_cache = os.path.join(pasta_entrada, '.analise_cache.json')
+    if cache is None:
+        cache = carregar_cache(caminho_cache)
+    
+    estatisticas = estatisticas_pasta(pasta_entrada, cache)
+    
+    if salvar:
+        salvar_cache(cache, caminho_cache)
+    
+    # Imprimir estatísticas
+    imprimir_estatisticas(estatisticas['contagem_labels'], estatisticas['duracoes_medias'],
+                          estatisticas['duracao_total_s'], estatisticas['total_vocalizacoes'])
+    
+    # Plotar gráficos
+    plotar_graficos(estatisticas['contagem_labels'], estatisticas['duracoes_medias'],
+                    estatisticas['duracoes_por_label'])
+    
+    return estatisticas
+
+def analisar_varias_pastas(pastas, caminho_cache):
+    """
+    Analisa várias pastas em uma única execução compartilhando o mesmo cache
+    (ex: EXISTING e depois ALL, onde ALL contém os arquivos de EXISTING)
+    
+    Args:
+        pastas (list): Lista de pastas com arquivos .wav e .wav.csv
+        caminho_cache (str): Arquivo JSON do cache compartilhado
     
-    # Estatísticas gerais
+    Returns:
+        dict: Estatísticas por pasta
+    """
+    cache = carregar_cache(caminho_cache)
+    resultados = {}
+    for pasta in pastas:
+        resultados[pasta] = analisar_audios_anotados(pasta, cache=cache)
+    salvar_cache(cache, caminho_cache)
+    return resultados
+
+def carregar_cache(caminho_cache):
+    """
+    Carrega o cache de estatísticas por arquivo (ou um cache vazio)
+    
+    Args:
+        caminho_cache (str): Arquivo JSON do cache
+    
+    Returns:
+        dict: Cache no formato {'versao': int, 'arquivos': {caminho: entrada}}
+    """
+    try:
+        with open(caminho_cache, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get('versao') == CACHE_VERSAO:
+            return cache
+        print("Cache de versão diferente, recalculando estatísticas")
+    except FileNotFoundError:
+        pass
+    except (ValueError, OSError) as e:
+        print(f"Erro ao ler cache {os.path.basename(caminho_cache)}: {str(e)}")
+    return {'versao': CACHE_VERSAO, 'arquivos': {}}
+
+def salvar_cache(cache, caminho_cache):
+    """
+    Salva o cache de forma atômica (arquivo temporário + rename)
+    
+    Args:
+        cache (dict): Cache de estatísticas
+        caminho_cache (str): Arquivo JSON do cache
+    """
+    try:
+        pasta_cache = os.path.dirname(os.path.abspath(caminho_cache))
+        os.makedirs(pasta_cache, exist_ok=True)
+        caminho_tmp = caminho_cache + '.tmp'
+        with open(caminho_tmp, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(caminho_tmp, caminho_cache)
+    except OSError as e:
+        print(f"Erro ao salvar cache {os.path.basename(caminho_cache)}: {str(e)}")
+
+def chave_arquivo(arquivo_wav, arquivo_csv):
+    """
+    Gera a chave de validade de um arquivo: tamanho e mtime do WAV e do CSV
+    """
+    stat_wav = os.stat(arquivo_wav)
+    chave = [stat_wav.st_size, stat_wav.st_mtime_ns]
+    if os.path.exists(arquivo_csv):
+        stat_csv = os.stat(arquivo_csv)
+        chave += [stat_csv.st_size, stat_csv.st_mtime_ns]
+    return chave
+
+def histograma_duracoes(duracoes):
+    """
+    Conta durações nos buckets fixos (LARGURA_BUCKET_S), somáveis entre arquivos
+    """
+    # Arredonda para ms antes de dividir para evitar erros de ponto flutuante nas bordas
+    duracoes = np.round(np.asarray(duracoes, dtype=float), 3)
+    indices = np.floor(duracoes / LARGURA_BUCKET_S + 1e-9).astype(int)
+    indices = np.clip(indices, 0, N_BUCKETS - 1)
+    return np.bincount(indices, minlength=N_BUCKETS).tolist()
+
+def estatisticas_arquivo(arquivo_wav):
+    """
+    Calcula as estatísticas parciais de um único arquivo WAV e seu CSV
+    
+    Args:
+        arquivo_wav (str): Caminho do arquivo WAV
+    
+    Returns:
+        dict: Duração, se há CSV e, por label, contagem, soma das durações,
+              histograma e lista de durações
+    """
+    # Calcular duração do áudio
+    with instrumentacao.medir('decodificacao'):
+        audio = AudioSegment.from_wav(arquivo_wav)
+    instrumentacao.registrar_leitura(arquivo_wav)
+    entrada = {'duracao_s': len(audio) / 1000.0, 'csv': False, 'labels': {}}
+    
+    # Buscar arquivo CSV correspondente
+    arquivo_csv = arquivo_wav + '.csv'
+    if not os.path.exists(arquivo_csv):
+        return entrada
+    entrada['csv'] = True
+    
+    # Processar anotações do CSV
     contagem_labels = {}
     duracoes_por_label = {}
-    duracao_total_audios = 0
-    total_vocalizacoes = 0
+    processar_csv_anotacoes(arquivo_csv, contagem_labels, duracoes_por_label)
+    
+    for label, contagem in contagem_labels.items():
+        duracoes = duracoes_por_label[label]
+        entrada['labels'][label] = {
+            'contagem': contagem,
+            'soma_duracoes': float(sum(duracoes)),
+            'histograma': histograma_duracoes(duracoes),
+            'duracoes': duracoes
+        }
+    return entrada
+
+def estatisticas_pasta(pasta_entrada, cache):
+    """
+    Calcula as estatísticas de uma pasta, reprocessando apenas os arquivos
+    novos ou alterados e combinando os parciais do cache
+    
+    Args:
+        pasta_entrada (str): Pasta contendo arquivos .wav e .wav.csv
+        cache (dict): Cache carregado com carregar_cache (atualizado in-place)
     
-    # Processar cada arquivo WAV e seu CSV correspondente
-    for arquivo_wav in arquivos_wav:
+    Returns:
+        dict: Estatísticas combinadas da pasta
+    """
+    # Coletar todos os arquivos WAV
+    arquivos_wav = glob.glob(os.path.join(pasta_entrada, '*.wav'))
+    print(f"Encontrados {len(arquivos_wav)} arquivos de áudio")
+    
+    parciais = []
+    reprocessados = 0
+    for indice, arquivo_wav in enumerate(arquivos_wav):
+        instrumentacao.progresso('analise', indice, len(arquivos_wav))
         try:
-            # Calcular duração do áudio
-            audio = AudioSegment.from_wav(arquivo_wav)
-            duracao_audio_s = len(audio) / 1000.0
-            duracao_total_audios += duracao_audio_s
+            caminho = os.path.abspath(arquivo_wav)
+            chave = chave_arquivo(arquivo_wav, arquivo_wav + '.csv')
+            entrada = cache['arquivos'].get(caminho)
             
-            # Buscar arquivo CSV correspondente
-            arquivo_csv = arquivo_wav + '.csv'
+            if entrada is None or entrada['chave'] != chave:
+                entrada = estatisticas_arquivo(arquivo_wav)
+                entrada['chave'] = chave
+                cache['arquivos'][caminho] = entrada
+                reprocessados += 1
             
-            if not os.path.exists(arquivo_csv):
+            if not entrada['csv']:
                 print(f"Aviso: CSV não encontrado para {os.path.basename(arquivo_wav)}")
-                continue
-            
-            # Processar anotações do CSV
-            processar_csv_anotacoes(arquivo_csv, contagem_labels, duracoes_por_label)
+            parciais.append(entrada)
             
         except Exception as e:
             print(f"Erro ao processar {os.path.basename(arquivo_wav)}: {str(e)}")
             continue
     
-    # Calcular total de vocalizações
-    total_vocalizacoes = sum(contagem_labels.values())
+    instrumentacao.progresso('analise', len(arquivos_wav), len(arquivos_wav))
+    instrumentacao.contar('arquivos_reprocessados', reprocessados)
+    print(f"Arquivos reprocessados: {reprocessados} (demais lidos do cache)")
+    return combinar_estatisticas(parciais)
+
+def combinar_estatisticas(parciais):
+    """
+    Soma as estatísticas parciais por arquivo
     
-    # Calcular durações médias
-    duracoes_medias = {}
-    for label, duracoes in duracoes_por_label.items():
-        if duracoes:
-            duracoes_medias[label] = np.mean(duracoes)
+    Args:
+        parciais (list): Entradas geradas por estatisticas_arquivo
     
-    # Imprimir estatísticas
-    imprimir_estatisticas(contagem_labels, duracoes_medias, duracao_total_audios, total_vocalizacoes)
+    Returns:
+        dict: contagem_labels, duracoes_medias, duracoes_por_label, histogramas,
+              duracao_total_s, total_vocalizacoes e n_arquivos
+    """
+    contagem_labels = {}
+    soma_duracoes = {}
+    histogramas = {}
+    duracoes_por_label = {}
+    duracao_total_audios = 0
     
-    # Plotar gráficos
-    plotar_graficos(contagem_labels, duracoes_medias, duracoes_por_label)
+    for entrada in parciais:
+        duracao_total_audios += entrada['duracao_s']
+        for label, dados in entrada['labels'].items():
+            contagem_labels[label] = contagem_labels.get(label, 0) + dados['contagem']
+            soma_duracoes[label] = soma_duracoes.get(label, 0.0) + dados['soma_duracoes']
+            if label in histogramas:
+                histogramas[label] += np.asarray(dados['histograma'])
+            else:
+                histogramas[label] = np.asarray(dados['histograma'])
+            duracoes_por_label.setdefault(label, []).extend(dados['duracoes'])
+    
+    # Calcular durações médias
+    duracoes_medias = {}
+    for label, contagem in contagem_labels.items():
+        if contagem:
+            duracoes_medias[label] = soma_duracoes[label] / contagem
+    
+    return {
+        'n_arquivos': len(parciais),
+        'duracao_total_s': duracao_total_audios,
+        'total_vocalizacoes': sum(contagem_labels.values()),
+        'contagem_labels': contagem_labels,
+        'duracoes_medias': duracoes_medias,
+        'duracoes_por_label': duracoes_por_label,
+        'histogramas': histogramas
+    }
 
 def processar_csv_anotacoes(arquivo_csv, contagem_labels, duracoes_por_label):
     """
@@ -76,34 +277,16 @@ def processar_csv_anotacoes(arquivo_csv, contagem_labels, duracoes_por_label):
         duracoes_por_label (dict): Dicionário para armazenar durações por label
     """
     try:
-        with open(arquivo_csv, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
+        anotacoes = carregar_anotacoes(arquivo_csv)
+        duracoes = anotacoes.offsets - anotacoes.onsets
+        
+        for codigo, label in enumerate(anotacoes.vocabulario):
+            duracoes_label = duracoes[anotacoes.codigos == codigo].tolist()
+            
+            # Atualizar contagem e durações
+            contagem_labels[label] = contagem_labels.get(label, 0) + len(duracoes_label)
+            duracoes_por_label.setdefault(label, []).extend(duracoes_label)
             
-            for linha in reader:
-                try:
-                    label = linha['label'].strip()
-                    onset_s = float(linha['onset_s'])
-                    offset_s = float(linha['offset_s'])
-                    
-                    # Calcular duração da vocalização
-                    duracao = offset_s - onset_s
-                    
-                    # Atualizar contagem
-                    if label in contagem_labels:
-                        contagem_labels[label] += 1
-                    else:
-                        contagem_labels[label] = 1
-                    
-                    # Atualizar durações
-                    if label in duracoes_por_label:
-                        duracoes_por_label[label].append(duracao)
-                    else:
-                        duracoes_por_label[label] = [duracao]
-                        
-                except (ValueError, KeyError) as e:
-                    print(f"Erro na linha do CSV {os.path.basename(arquivo_csv)}: {str(e)}")
-                    continue
-                    
     except Exception as e:
         print(f"Erro ao ler CSV {os.path.basename(arquivo_csv)}: {str(e)}")
 
@@ -143,10 +326,25 @@ def imprimir_estatisticas(contagem_labels, duracoes_medias, duracao_total_audios
         contagem = contagem_labels[label]
         print(f"Label '{label}': {duracao_media:.3f}s (baseado em {contagem} amostras)")
 
-def plotar_graficos(contagem_labels, duracoes_medias, duracoes_por_label):
+def plotar_graficos(contagem_labels, duracoes_medias, duracoes_por_label,
+                    caminho_saida='analise_vocalizacoes.png', mostrar=True):
     """
     Plota gráficos de análise dos dados
+    
+    Args:
+        contagem_labels (dict): Contagem de vocalizações por label
+        duracoes_medias (dict): Duração média por label
+        duracoes_por_label (dict): Lista de durações por label
+        caminho_saida (str): Caminho da imagem salva (default: 'analise_vocalizacoes.png')
+        mostrar (bool): Se True, abre a janela do gráfico (bloqueia até ser fechada)
     """
+    with instrumentacao.medir('grafico'):
+        _plotar_graficos(contagem_labels, duracoes_medias, duracoes_por_label, caminho_saida, mostrar)
+
+def _plotar_graficos(contagem_labels, duracoes_medias, duracoes_por_label, caminho_saida, mostrar):
+    # pyplot só é importado quando há gráfico a fazer (a importação leva quase um segundo)
+    import matplotlib.pyplot as plt
+    
     # Configurar matplotlib para melhor visualização
     plt.style.use('default')
     fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 12))
@@ -218,27 +416,391 @@ def plotar_graficos(contagem_labels, duracoes_medias, duracoes_por_label):
     plt.tight_layout()
     
     # Salvar gráfico
-    plt.savefig('analise_vocalizacoes.png', dpi=300, bbox_inches='tight')
-    plt.show()
-    print(f"\nGráfico salvo como 'analise_vocalizacoes.png'")
+    plt.savefig(caminho_saida, dpi=300, bbox_inches='tight')
+    if mostrar:
+        plt.show()
+    plt.close(fig)
+    print(f"\nGráfico salvo como '{caminho_saida}'")
+
+def carregar_intervalos(pastas):
+    """
+    Carrega os intervalos anotados de todos os .wav.csv das pastas em arrays NumPy
+    
+    Args:
+        pastas (list): Lista de pastas contendo arquivos .wav.csv
+    
+    Returns:
+        dict: 'arquivos' (lista de CSVs), 'labels' (lista de labels) e os arrays
+              'id_arquivo', 'onsets', 'offsets' e 'codigos' (índice em 'labels')
+    """
+    arquivos = []
+    labels = []
+    codigo_por_label = {}
+    id_arquivo, onsets, offsets, codigos = [], [], [], []
+    
+    for pasta in pastas:
+        for arquivo_csv in sorted(glob.glob(os.path.join(pasta, '*.wav.csv'))):
+            try:
+                anotacoes = carregar_anotacoes(arquivo_csv)
+            except Exception as e:
+                print(f"Erro ao ler CSV {os.path.basename(arquivo_csv)}: {str(e)}")
+                continue
+            
+            # Traduz os códigos locais do arquivo para o vocabulário global
+            for label in anotacoes.vocabulario:
+                if label not in codigo_por_label:
+                    codigo_por_label[label] = len(labels)
+                    labels.append(label)
+            traducao = np.array([codigo_por_label[label] for label in anotacoes.vocabulario], dtype=np.int64)
+            
+            id_arquivo.append(np.full(len(anotacoes), len(arquivos), dtype=np.int64))
+            onsets.append(anotacoes.onsets)
+            offsets.append(anotacoes.offsets)
+            codigos.append(traducao[anotacoes.codigos] if len(anotacoes) else np.zeros(0, dtype=np.int64))
+            arquivos.append(arquivo_csv)
+    
+    def concatenar(partes, dtype):
+        return np.concatenate(partes).astype(dtype) if partes else np.zeros(0, dtype=dtype)
+    
+    return {
+        'arquivos': arquivos,
+        'labels': labels,
+        'id_arquivo': concatenar(id_arquivo, np.int64),
+        'onsets': concatenar(onsets, float),
+        'offsets': concatenar(offsets, float),
+        'codigos': concatenar(codigos, np.int64)
+    }
+
+def analisar_sobreposicoes(intervalos):
+    """
+    Calcula sobreposições e intervalos entre chamadas (ICI) com uma varredura
+    (sweep-line) O(n log n), vetorizada sobre todo o corpus de uma vez
+    
+    Os arquivos são dispostos em uma única linha do tempo (cada um deslocado para
+    depois do fim do anterior), de forma que uma única ordenação cobre o corpus inteiro
+    sem que intervalos de arquivos diferentes se sobreponham.
+    
+    Args:
+        intervalos (dict): Saída de carregar_intervalos
+    
+    Returns:
+        dict: 'tempo_sobreposto_s', 'tempo_vocalizado_s', 'sobreposicao_por_arquivo_s',
+              'pares' ({(label1, label2): {'contagem', 'duracao_s'}}) e
+              'ici' ({label: estatísticas do intervalo onset-a-onset})
+    """
+    labels = intervalos['labels']
+    ids = intervalos['id_arquivo']
+    onsets = intervalos['onsets']
+    offsets = intervalos['offsets']
+    codigos = intervalos['codigos']
+    n_arquivos = len(intervalos['arquivos'])
+    
+    resultado = {
+        'tempo_sobreposto_s': 0.0,
+        'tempo_vocalizado_s': 0.0,
+        'sobreposicao_por_arquivo_s': np.zeros(n_arquivos),
+        'pares': {},
+        'ici': {}
+    }
+    if len(onsets) == 0:
+        return resultado
+    
+    # Linha do tempo única: desloca cada arquivo para depois do fim do anterior
+    fim_por_arquivo = np.zeros(n_arquivos)
+    np.maximum.at(fim_por_arquivo, ids, offsets)
+    deslocamento = np.concatenate([[0.0], np.cumsum(fim_por_arquivo + 1.0)[:-1]])
+    inicio = onsets + deslocamento[ids]
+    fim = offsets + deslocamento[ids]
+    
+    # Varredura: +1 no onset, -1 no offset (fins antes de inícios no mesmo instante,
+    # para que intervalos apenas encostados não contem como sobreposição)
+    tempos = np.concatenate([inicio, fim])
+    deltas = np.concatenate([np.ones(len(inicio), dtype=np.int64), -np.ones(len(fim), dtype=np.int64)])
+    ordem = np.lexsort((deltas, tempos))
+    tempos = tempos[ordem]
+    profundidade = np.cumsum(deltas[ordem])[:-1]
+    comprimentos = np.diff(tempos)
+    
+    sobreposto = profundidade >= 2
+    resultado['tempo_sobreposto_s'] = float(comprimentos[sobreposto].sum())
+    resultado['tempo_vocalizado_s'] = float(comprimentos[profundidade >= 1].sum())
+    arquivo_do_trecho = np.searchsorted(deslocamento, tempos[:-1], side='right') - 1
+    resultado['sobreposicao_por_arquivo_s'] = np.bincount(
+        arquivo_do_trecho[sobreposto], weights=comprimentos[sobreposto], minlength=n_arquivos)
+    
+    # Pares sobrepostos: com os intervalos ordenados por início, i se sobrepõe a todo
+    # j > i cujo início é anterior ao fim de i
+    ordem = np.argsort(inicio, kind='stable')
+    inicio_ord = inicio[ordem]
+    fim_ord = fim[ordem]
+    codigos_ord = codigos[ordem]
+    n = len(ordem)
+    limite = np.searchsorted(inicio_ord, fim_ord, side='left')
+    n_pares = np.maximum(limite - np.arange(n) - 1, 0)
+    total_pares = int(n_pares.sum())
+    
+    if total_pares:
+        idx_i = np.repeat(np.arange(n), n_pares)
+        primeiro_par = np.cumsum(n_pares) - n_pares
+        idx_j = idx_i + 1 + (np.arange(total_pares) - np.repeat(primeiro_par, n_pares))
+        
+        codigo_a = np.minimum(codigos_ord[idx_i], codigos_ord[idx_j])
+        codigo_b = np.maximum(codigos_ord[idx_i], codigos_ord[idx_j])
+        chave_par = codigo_a * len(labels) + codigo_b
+        duracao_par = np.minimum(fim_ord[idx_i], fim_ord[idx_j]) - inicio_ord[idx_j]
+        
+        chaves, inverso, contagens = np.unique(chave_par, return_inverse=True, return_counts=True)
+        duracoes = np.bincount(inverso, weights=duracao_par)
+        for chave, contagem, duracao in zip(chaves, contagens, duracoes):
+            par = (labels[chave // len(labels)], labels[chave % len(labels)])
+            resultado['pares'][par] = {'contagem': int(contagem), 'duracao_s': float(duracao)}
+    
+    # ICI: diferença entre onsets consecutivos da mesma label no mesmo arquivo
+    ordem = np.lexsort((onsets, codigos, ids))
+    mesmo_grupo = (ids[ordem][1:] == ids[ordem][:-1]) & (codigos[ordem][1:] == codigos[ordem][:-1])
+    icis = np.diff(onsets[ordem])[mesmo_grupo]
+    codigos_ici = codigos[ordem][1:][mesmo_grupo]
+    
+    for codigo, label in enumerate(labels):
+        valores = icis[codigos_ici == codigo]
+        if len(valores) == 0:
+            continue
+        percentis = np.percentile(valores, [5, 25, 50, 75, 95])
+        resultado['ici'][label] = {
+            'n': int(len(valores)),
+            'media_s': float(valores.mean()),
+            'p5_s': float(percentis[0]),
+            'p25_s': float(percentis[1]),
+            'mediana_s': float(percentis[2]),
+            'p75_s': float(percentis[3]),
+            'p95_s': float(percentis[4]),
+            'histograma': histograma_duracoes(valores)
+        }
+    
+    return resultado
+
+def imprimir_sobreposicoes(resultado):
+    """
+    Imprime o resumo de sobreposições e de intervalos entre chamadas
+    """
+    print("\n" + "="*60)
+    print("SOBREPOSIÇÕES E INTERVALOS ENTRE CHAMADAS")
+    print("="*60)
+    
+    tempo_vocalizado = resultado['tempo_vocalizado_s']
+    tempo_sobreposto = resultado['tempo_sobreposto_s']
+    porcentagem = (tempo_sobreposto / tempo_vocalizado * 100) if tempo_vocalizado else 0
+    print(f"Tempo vocalizado: {tempo_vocalizado:.2f} segundos")
+    print(f"Tempo sobreposto: {tempo_sobreposto:.2f} segundos ({porcentagem:.1f}% do tempo vocalizado)")
+    
+    print("\n" + "-"*40)
+    print("SOBREPOSIÇÕES POR PAR DE LABELS")
+    print("-"*40)
+    
+    pares_ordenados = sorted(resultado['pares'].items(), key=lambda x: x[1]['contagem'], reverse=True)
+    for (label1, label2), dados in pares_ordenados:
+        print(f"Par '{label1}{label2}': {dados['contagem']:5d} sobreposições - Duração total: {dados['duracao_s']:.3f}s")
+    
+    print("\n" + "-"*40)
+    print("INTERVALO ENTRE CHAMADAS (ONSET A ONSET) POR LABEL")
+    print("-"*40)
+    
+    for label, dados in sorted(resultado['ici'].items()):
+        print(f"Label '{label}': mediana {dados['mediana_s']:.3f}s "
+              f"(p5 {dados['p5_s']:.3f}s, p95 {dados['p95_s']:.3f}s, n={dados['n']})")
+
+def analisar_sobreposicoes_pastas(pastas):
+    """
+    Carrega as anotações de uma ou mais pastas e imprime a análise de sobreposições
+    
+    Args:
+        pastas (str | list): Pasta ou lista de pastas contendo arquivos .wav.csv
+    
+    Returns:
+        dict: Resultado de analisar_sobreposicoes
+    """
+    if isinstance(pastas, str):
+        pastas = [pastas]
+    
+    intervalos = carregar_intervalos(pastas)
+    print(f"Carregados {len(intervalos['onsets'])} intervalos de {len(intervalos['arquivos'])} arquivos")
+    
+    resultado = analisar_sobreposicoes(intervalos)
+    imprimir_sobreposicoes(resultado)
+    return resultado
 
-def gerar_relatorio_detalhado(pasta_entrada, pasta_saida=None):
+def gerar_relatorio_detalhado(pasta_entrada, pasta_saida=None, caminho_cache=None):
     """
     Gera um relatório detalhado em arquivo de texto
     
     Args:
         pasta_entrada (str): Pasta com os arquivos analisados
         pasta_saida (str): Pasta para salvar o relatório (opcional)
+        caminho_cache (str): Arquivo JSON do cache de estatísticas (opcional)
+    
+    Returns:
+        str: Caminho do relatório gerado
     """
     if pasta_saida is None:
         pasta_saida = pasta_entrada
+    os.makedirs(pasta_saida, exist_ok=True)
+    
+    if caminho_cache is None:
+        caminho_cache = os.path.join(pasta_entrada, '.analise_cache.json')
+    cache = carregar_cache(caminho_cache)
+    estatisticas = estatisticas_pasta(pasta_entrada, cache)
+    salvar_cache(cache, caminho_cache)
+    sobreposicoes = analisar_sobreposicoes(carregar_intervalos([pasta_entrada]))
     
     arquivo_relatorio = os.path.join(pasta_saida, 'relatorio_analise.txt')
     
-    # Redirecionar saída para arquivo (implementação simples)
+    # Redirecionar as mesmas saídas do console para o arquivo
+    with open(arquivo_relatorio, 'w', encoding='utf-8') as f:
+        with contextlib.redirect_stdout(f):
+            print(f"Pasta analisada: {pasta_entrada}")
+            print(f"Arquivos de áudio: {estatisticas['n_arquivos']}")
+            imprimir_estatisticas(estatisticas['contagem_labels'], estatisticas['duracoes_medias'],
+                                  estatisticas['duracao_total_s'], estatisticas['total_vocalizacoes'])
+            imprimir_sobreposicoes(sobreposicoes)
+    
     print(f"\nRelatório detalhado salvo em: {arquivo_relatorio}")
+    return arquivo_relatorio
+
+def resumo_para_json(estatisticas, sobreposicoes):
+    """
+    Converte as estatísticas de uma pasta em tipos serializáveis em JSON
+    (sem as listas de durações, que ficam apenas no cache)
+    """
+    return {
+        'n_arquivos': estatisticas['n_arquivos'],
+        'duracao_total_s': estatisticas['duracao_total_s'],
+        'total_vocalizacoes': estatisticas['total_vocalizacoes'],
+        'contagem_labels': estatisticas['contagem_labels'],
+        'duracoes_medias': estatisticas['duracoes_medias'],
+        'histogramas': {label: np.asarray(h).tolist() for label, h in estatisticas['histogramas'].items()},
+        'largura_bucket_s': LARGURA_BUCKET_S,
+        'tempo_sobreposto_s': sobreposicoes['tempo_sobreposto_s'],
+        'tempo_vocalizado_s': sobreposicoes['tempo_vocalizado_s'],
+        'pares': {f"{l1}{l2}": dados for (l1, l2), dados in sobreposicoes['pares'].items()},
+        'ici': sobreposicoes['ici']
+    }
+
+def _analisar_pasta_headless(pasta, caminho_figura, entradas_cache):
+    """
+    Worker do modo headless: calcula as estatísticas de uma pasta e salva a figura
+    usando o backend Agg (sem janela)
+    
+    Returns:
+        tuple: (resumo JSON da pasta, entradas do cache atualizadas)
+    """
+    # Só escolhe o backend; pyplot é importado em _plotar_graficos se houver gráfico
+    import matplotlib
+    matplotlib.use('Agg')
+    
+    cache = {'versao': CACHE_VERSAO, 'arquivos': entradas_cache}
+    estatisticas = estatisticas_pasta(pasta, cache)
+    sobreposicoes = analisar_sobreposicoes(carregar_intervalos([pasta]))
+    
+    if estatisticas['total_vocalizacoes']:
+        plotar_graficos(estatisticas['contagem_labels'], estatisticas['duracoes_medias'],
+                        estatisticas['duracoes_por_label'], caminho_saida=caminho_figura, mostrar=False)
+    
+    return resumo_para_json(estatisticas, sobreposicoes), cache['arquivos']
+
+def analisar_pastas_headless(pastas, pasta_relatorio, caminho_cache=None, n_workers=None):
+    """
+    Analisa várias pastas em paralelo sem interface gráfica (para execuções
+    agendadas): salva uma figura por pasta e um relatório JSON + CSV
+    
+    Args:
+        pastas (list): Lista de pastas contendo arquivos .wav e .wav.csv
+        pasta_relatorio (str): Pasta para salvar figuras e relatórios
+        caminho_cache (str): Cache compartilhado (default: analise_cache.json em pasta_relatorio)
+        n_workers (int): Número de processos (default: número de CPUs)
+    
+    Returns:
+        dict: Resumo por pasta
+    """
+    os.makedirs(pasta_relatorio, exist_ok=True)
+    if caminho_cache is None:
+        caminho_cache = os.path.join(pasta_relatorio, 'analise_cache.json')
+    cache = carregar_cache(caminho_cache)
+    
+    # Nome único por pasta para as figuras
+    nomes = []
+    for pasta in pastas:
+        nome = os.path.basename(os.path.normpath(pasta)) or 'raiz'
+        if nome in nomes:
+            nome = f"{nome}_{len(nomes)}"
+        nomes.append(nome)
+    
+    resumos = {}
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futuros = {}
+        for pasta, nome in zip(pastas, nomes):
+            # Cada worker recebe apenas as entradas do cache da sua pasta
+            prefixo = os.path.join(os.path.abspath(pasta), '')
+            entradas = {caminho: entrada for caminho, entrada in cache['arquivos'].items()
+                        if caminho.startswith(prefixo)}
+            caminho_figura = os.path.join(pasta_relatorio, f"analise_{nome}.png")
+            futuros[executor.submit(_analisar_pasta_headless, pasta, caminho_figura, entradas)] = (pasta, nome)
+        
+        for futuro in as_completed(futuros):
+            pasta, nome = futuros[futuro]
+            try:
+                resumo, entradas = futuro.result()
+                cache['arquivos'].update(entradas)
+                resumo['pasta'] = pasta
+                resumos[nome] = resumo
+            except Exception as e:
+                print(f"Erro ao analisar pasta {pasta}: {str(e)}")
+    
+    salvar_cache(cache, caminho_cache)
+    
+    # Relatório JSON completo
+    caminho_json = os.path.join(pasta_relatorio, 'relatorio_analise.json')
+    with open(caminho_json, 'w', encoding='utf-8') as f:
+        json.dump(resumos, f, indent=2, ensure_ascii=False)
+    
+    # Relatório CSV: uma linha por pasta e label
+    caminho_csv = os.path.join(pasta_relatorio, 'relatorio_analise.csv')
+    with open(caminho_csv, 'w', newline='', encoding='utf-8') as f:
+        fieldnames = ['pasta', 'label', 'contagem', 'duracao_media_s', 'ici_mediana_s',
+                      'n_arquivos', 'duracao_total_s', 'tempo_sobreposto_s']
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for nome in nomes:
+            if nome not in resumos:
+                continue
+            resumo = resumos[nome]
+            for label, contagem in sorted(resumo['contagem_labels'].items()):
+                writer.writerow({
+                    'pasta': resumo['pasta'],
+                    'label': label,
+                    'contagem': contagem,
+                    'duracao_media_s': round(resumo['duracoes_medias'].get(label, 0.0), 4),
+                    'ici_mediana_s': round(resumo['ici'][label]['mediana_s'], 4) if label in resumo['ici'] else '',
+                    'n_arquivos': resumo['n_arquivos'],
+                    'duracao_total_s': round(resumo['duracao_total_s'], 3),
+                    'tempo_sobreposto_s': round(resumo['tempo_sobreposto_s'], 3)
+                })
+    
+    print(f"\nRelatórios salvos em: {caminho_json} e {caminho_csv}")
+    return resumos
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Análise de áudios anotados")
+    parser.add_argument('pastas', nargs='*', help="Pastas a analisar (modo headless)")
+    parser.add_argument('--saida', default='relatorios', help="Pasta dos relatórios no modo headless")
+    parser.add_argument('--cache', default=None, help="Arquivo do cache compartilhado")
+    parser.add_argument('--workers', type=int, default=None, help="Número de processos")
+    args = parser.parse_args()
+    
+    if args.pastas:
+        # Modo headless: python analyze_annotations.py --saida relatorios pasta1 pasta2
+        analisar_pastas_headless(args.pastas, args.saida, caminho_cache=args.cache, n_workers=args.workers)
+        raise SystemExit(0)
+    
     # Exemplo de uso
     pasta_dados = r'C:\Users\EthogenesisLab\Documents\Train_Sobreposition_PheePhee_PheeTsik_TrillTrill\data\wav_created'  # Altere para sua pasta
     
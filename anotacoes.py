@@ -0,0 +1,238 @@
+import os
+import csv
+import hashlib
+import numpy as np
+
+# Labels usadas nas anotações originais e nos dados gerados (u = background / fallback)
+LABELS_CONHECIDOS = ('a', 'c', 'e', 'g', 'h', 'k', 'l', 'o', 'p', 'r', 's', 'y', 'z',
+                     'm', 'n', 'v', 'w', 'u')
+
+# Cache em memória das anotações já carregadas: caminho -> (chave, Anotacoes)
+_cache_memoria = {}
+
+class Anotacoes:
+    """
+    Anotações de um arquivo em arrays NumPy, ordenadas por onset, com índice
+    para consultas por intervalo e por ponto
+    
+    Atributos:
+        caminho (str): Arquivo de origem (.wav.csv ou .txt)
+        onsets (np.ndarray): Inícios em segundos (float64, ordenados)
+        offsets (np.ndarray): Fins em segundos (float64)
+        codigos (np.ndarray): Índice de cada label em `vocabulario` (int16)
+        vocabulario (tuple): Labels distintas presentes no arquivo
+    """
+    def __init__(self, onsets, offsets, codigos, vocabulario, caminho=None):
+        ordem = np.argsort(onsets, kind='stable')
+        self.caminho = caminho
+        self.onsets = np.asarray(onsets, dtype=np.float64)[ordem]
+        self.offsets = np.asarray(offsets, dtype=np.float64)[ordem]
+        self.codigos = np.asarray(codigos, dtype=np.int16)[ordem]
+        self.vocabulario = tuple(vocabulario)
+        # Máximo acumulado dos offsets: permite achar por busca binária o primeiro
+        # intervalo que ainda pode alcançar um instante, mesmo com sobreposições
+        self._max_offset = np.maximum.accumulate(self.offsets) if len(self.offsets) else self.offsets
+    
+    def __len__(self):
+        return len(self.onsets)
+    
+    @property
+    def labels(self):
+        """Array com a label de cada intervalo"""
+        return np.asarray(self.vocabulario, dtype=object)[self.codigos] if len(self) else np.array([], dtype=object)
+    
+    def linhas(self):
+        """Itera sobre (onset_s, offset_s, label) em ordem de onset"""
+        for onset, offset, codigo in zip(self.onsets.tolist(), self.offsets.tolist(), self.codigos.tolist()):
+            yield onset, offset, self.vocabulario[codigo]
+    
+    def filtrar(self, labels):
+        """
+        Retorna apenas os intervalos cujas labels estão na lista
+        
+        Args:
+            labels (list): Labels a manter
+        
+        Returns:
+            Anotacoes: Novo objeto com os intervalos selecionados
+        """
+        labels = set(labels)
+        codigos_validos = [i for i, label in enumerate(self.vocabulario) if label in labels]
+        mascara = np.isin(self.codigos, codigos_validos)
+        return Anotacoes(self.onsets[mascara], self.offsets[mascara], self.codigos[mascara],
+                         self.vocabulario, self.caminho)
+    
+    def no_intervalo(self, inicio_s, fim_s):
+        """
+        Índices dos intervalos que se sobrepõem a [inicio_s, fim_s)
+        
+        Args:
+            inicio_s (float): Início da consulta em segundos
+            fim_s (float): Fim da consulta em segundos
+        
+        Returns:
+            np.ndarray: Índices (em ordem de onset)
+        """
+        primeiro = np.searchsorted(self._max_offset, inicio_s, side='right')
+        ultimo = np.searchsorted(self.onsets, fim_s, side='left')
+        candidatos = np.arange(primeiro, max(primeiro, ultimo))
+        return candidatos[self.offsets[candidatos] > inicio_s]
+    
+    def no_ponto(self, tempo_s):
+        """
+        Índices dos intervalos que contêm o instante tempo_s (onset <= t < offset)
+        """
+        primeiro = np.searchsorted(self._max_offset, tempo_s, side='right')
+        ultimo = np.searchsorted(self.onsets, tempo_s, side='right')
+        candidatos = np.arange(primeiro, max(primeiro, ultimo))
+        return candidatos[self.offsets[candidatos] > tempo_s]
+    
+    def salvar_csv(self, caminho_csv):
+        """
+        Salva as anotações no formato padrão onset_s,offset_s,label
+        
+        Args:
+            caminho_csv (str): Caminho do arquivo CSV
+        """
+        with open(caminho_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['onset_s', 'offset_s', 'label'])
+            for onset, offset, label in self.linhas():
+                writer.writerow([repr(onset), repr(offset), label])
+
+def _ler_linhas(caminho):
+    """
+    Lê as linhas brutas de um arquivo de anotações
+    
+    .wav.csv: cabeçalho com onset_s, offset_s e label (em qualquer ordem)
+    .txt: sem cabeçalho, campos separados por espaços ou tabs (onset offset label)
+    
+    Returns:
+        list: Tuplas (número da linha, campos onset, offset, label)
+    """
+    linhas = []
+    with open(caminho, 'r', encoding='utf-8') as f:
+        if caminho.lower().endswith('.txt'):
+            for numero, linha in enumerate(f, start=1):
+                campos = linha.split()
+                if not campos:
+                    continue
+                linhas.append((numero, campos))
+        else:
+            reader = csv.reader(f)
+            cabecalho = [campo.strip() for campo in next(reader, [])]
+            try:
+                colunas = [cabecalho.index(nome) for nome in ('onset_s', 'offset_s', 'label')]
+            except ValueError:
+                raise ValueError(f"cabeçalho inválido em {os.path.basename(caminho)}: {cabecalho}")
+            for numero, campos in enumerate(reader, start=2):
+                if not campos:
+                    continue
+                try:
+                    linhas.append((numero, [campos[i] for i in colunas]))
+                except IndexError:
+                    linhas.append((numero, campos))
+    return linhas
+
+def _validar(caminho, linhas, labels_validos, estrito):
+    """
+    Converte e valida as linhas lidas (onset < offset, label conhecida, 3 campos)
+    
+    Linhas inválidas são descartadas com um aviso, ou geram ValueError se estrito=True.
+    """
+    onsets, offsets, codigos = [], [], []
+    vocabulario = []
+    codigo_por_label = {}
+    nome = os.path.basename(caminho)
+    
+    for numero, campos in linhas:
+        erro = None
+        if len(campos) != 3:
+            erro = f"esperados 3 campos, encontrados {len(campos)}"
+        else:
+            try:
+                onset = float(campos[0])
+                offset = float(campos[1])
+                label = campos[2].strip()
+                if not label:
+                    erro = "label vazia"
+                elif not onset < offset:
+                    erro = f"onset ({onset}) não é menor que offset ({offset})"
+                elif labels_validos is not None and label not in labels_validos:
+                    erro = f"label desconhecida '{label}'"
+            except ValueError as e:
+                erro = str(e)
+        
+        if erro:
+            if estrito:
+                raise ValueError(f"{nome}, linha {numero}: {erro}")
+            print(f"Erro na linha {numero} do arquivo {nome}: {erro}")
+            continue
+        
+        if label not in codigo_por_label:
+            codigo_por_label[label] = len(vocabulario)
+            vocabulario.append(label)
+        onsets.append(onset)
+        offsets.append(offset)
+        codigos.append(codigo_por_label[label])
+    
+    return Anotacoes(onsets, offsets, codigos, vocabulario, caminho)
+
+def _caminho_cache_disco(pasta_cache, caminho):
+    chave = hashlib.sha1(os.path.abspath(caminho).encode('utf-8')).hexdigest()
+    return os.path.join(pasta_cache, f"{chave}.npz")
+
+def carregar_anotacoes(caminho, labels_validos=None, estrito=False, pasta_cache=None):
+    """
+    Carrega e valida um arquivo de anotações (.wav.csv ou .txt), com cache
+    
+    O resultado fica em cache em memória (e, opcionalmente, em disco como .npz)
+    e só é relido se o tamanho ou o mtime do arquivo mudar.
+    
+    Args:
+        caminho (str): Caminho do arquivo .wav.csv ou .txt
+        labels_validos (list): Labels aceitas (None aceita qualquer label)
+        estrito (bool): Se True, linhas inválidas geram ValueError em vez de aviso
+        pasta_cache (str): Pasta para o cache em disco (None usa apenas memória)
+    
+    Returns:
+        Anotacoes: Anotações ordenadas por onset
+    """
+    stat = os.stat(caminho)
+    # estrito faz parte da chave: um resultado não estrito pode ter descartado linhas inválidas
+    chave = (os.path.abspath(caminho), stat.st_size, stat.st_mtime_ns,
+             tuple(sorted(labels_validos)) if labels_validos is not None else None, bool(estrito))
+    
+    em_memoria = _cache_memoria.get(chave[0])
+    if em_memoria is not None and em_memoria[0] == chave:
+        return em_memoria[1]
+    
+    anotacoes = None
+    if pasta_cache is not None:
+        arquivo_npz = _caminho_cache_disco(pasta_cache, caminho)
+        try:
+            with np.load(arquivo_npz, allow_pickle=False) as dados:
+                if dados['chave'].tolist() == [str(parte) for parte in chave]:
+                    anotacoes = Anotacoes(dados['onsets'], dados['offsets'], dados['codigos'],
+                                          dados['vocabulario'].tolist(), caminho)
+        except (OSError, KeyError, ValueError):
+            pass
+    
+    if anotacoes is None:
+        anotacoes = _validar(caminho, _ler_linhas(caminho), labels_validos, estrito)
+        if pasta_cache is not None:
+            os.makedirs(pasta_cache, exist_ok=True)
+            np.savez(_caminho_cache_disco(pasta_cache, caminho),
+                     chave=np.array([str(parte) for parte in chave]),
+                     onsets=anotacoes.onsets, offsets=anotacoes.offsets, codigos=anotacoes.codigos,
+                     vocabulario=np.array(anotacoes.vocabulario, dtype=str))
+    
+    _cache_memoria[chave[0]] = (chave, anotacoes)
+    return anotacoes
+
+def caminho_anotacoes(caminho_wav):
+    """
+    Retorna o arquivo de anotações de um WAV (audio.wav.csv), ou None se não existir
+    """
+    caminho_csv = f"{os.path.splitext(caminho_wav)[0]}.wav.csv"
+    return caminho_csv if os.path.exists(caminho_csv) else None
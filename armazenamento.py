@@ -0,0 +1,551 @@
+import os
+import csv
+import glob
+import wave
+import struct
+import shutil
+import hashlib
+import threading
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from pydub import AudioSegment
+import instrumentacao
+
+# Manifesto dos cortes virtuais de uma pasta: cada corte é só uma lista de trechos
+# (em quadros) de uma gravação original, lida sob demanda do arquivo mapeado em memória
+ARQUIVO_CORTES_VIRTUAIS = 'cortes_virtuais.csv'
+MAX_GRAVACOES_MAPEADAS = 64
+
+_manifestos = {}  # caminho do manifesto -> (mtime_ns, {nome: (gravacao, trechos)})
+_gravacoes = OrderedDict()  # caminho da gravação -> (mtime_ns, mapa de bytes, cabeçalho)
+
+def ler_cabecalho_wav(caminho):
+    """
+    Percorre os chunks RIFF de um WAV PCM
+    
+    Returns:
+        tuple: (offset dos dados em bytes, número de quadros, canais, largura da amostra em bytes, taxa)
+    """
+    with open(caminho, 'rb') as f:
+        riff = f.read(12)
+        if riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            raise ValueError(f"{caminho} não é um arquivo WAV")
+        canais, largura, taxa = None, None, None
+        while True:
+            cabecalho = f.read(8)
+            if len(cabecalho) < 8:
+                raise ValueError(f"{caminho} não tem chunk de dados")
+            nome, tamanho = cabecalho[:4], struct.unpack('<I', cabecalho[4:])[0]
+            if nome == b'fmt ':
+                formato = f.read(tamanho)
+                canais, taxa = struct.unpack('<HI', formato[2:8])
+                largura = struct.unpack('<H', formato[14:16])[0] // 8
+                f.seek(tamanho % 2, 1)
+            elif nome == b'data':
+                offset = f.tell()
+                tamanho = min(tamanho, os.path.getsize(caminho) - offset)
+                return offset, tamanho // (canais * largura), canais, largura, taxa
+            else:
+                f.seek(tamanho + tamanho % 2, 1)
+
+def fatiar_trechos(trechos, taxa, inicio_ms, fim_ms=None):
+    """
+    Equivalente a `audio[inicio_ms:fim_ms]` do pydub sobre a concatenação dos trechos,
+    sem decodificar o áudio
+    
+    Args:
+        trechos (list): Trechos (quadro inicial, quadro final) da gravação, na ordem
+        taxa (int): Taxa de amostragem da gravação
+        inicio_ms (int): Início do corte em ms
+        fim_ms (int): Fim do corte em ms (default: até o fim)
+    
+    Returns:
+        list: Trechos do corte
+    """
+    total = sum(fim - inicio for inicio, fim in trechos)
+    duracao_ms = round(1000 * total / taxa)
+    if fim_ms is None:
+        fim_ms = duracao_ms
+    inicio_corte = int(min(inicio_ms, duracao_ms) * taxa / 1000.0)
+    fim_corte = int(min(fim_ms, duracao_ms) * taxa / 1000.0)
+    
+    resultado = []
+    posicao = 0
+    for inicio, fim in trechos:
+        a = max(inicio_corte, posicao)
+        b = min(fim_corte, posicao + fim - inicio)
+        if b > a:
+            if resultado and resultado[-1][1] == inicio + a - posicao:
+                resultado[-1] = (resultado[-1][0], inicio + b - posicao)
+            else:
+                resultado.append((inicio + a - posicao, inicio + b - posicao))
+        posicao += fim - inicio
+    return resultado
+
+def _gravacao_mapeada(caminho):
+    caminho = os.path.abspath(caminho)
+    mtime_ns = os.stat(caminho).st_mtime_ns
+    entrada = _gravacoes.get(caminho)
+    if entrada is None or entrada[0] != mtime_ns:
+        cabecalho = ler_cabecalho_wav(caminho)
+        entrada = (mtime_ns, np.memmap(caminho, dtype=np.uint8, mode='r'), cabecalho)
+        _gravacoes[caminho] = entrada
+        while len(_gravacoes) > MAX_GRAVACOES_MAPEADAS:
+            _gravacoes.popitem(last=False)
+    else:
+        _gravacoes.move_to_end(caminho)
+    return entrada[1], entrada[2]
+
+def ler_trechos(gravacao, trechos):
+    """
+    Lê os trechos de uma gravação direto do arquivo mapeado em memória, com a mesma
+    conversão para 48 kHz dos cortes gravados por crop.py
+    
+    Returns:
+        AudioSegment: Concatenação dos trechos
+    """
+    with instrumentacao.medir('decodificacao'):
+        mapa, (offset, n_quadros, canais, largura, taxa) = _gravacao_mapeada(gravacao)
+        tamanho_quadro = canais * largura
+        dados = b''.join(mapa[offset + min(inicio, n_quadros) * tamanho_quadro:
+                              offset + min(fim, n_quadros) * tamanho_quadro].tobytes()
+                         for inicio, fim in trechos)
+        if largura == 3:
+            # Como o pydub, amostras de 24 bits viram 32 bits com um byte baixo extra: 0xFF nas
+            # amostras negativas, 0x00 nas demais (AudioSegment.__init__)
+            amostras = np.frombuffer(dados, dtype=np.uint8).reshape(-1, 3)
+            preenchimento = np.where(amostras[:, 2:] > 0x7F, 0xFF, 0x00).astype(np.uint8)
+            dados = np.hstack([preenchimento, amostras]).tobytes()
+            largura = 4
+        audio = AudioSegment(dados, frame_rate=taxa, sample_width=largura, channels=canais)
+    instrumentacao.contar('bytes_lidos', len(dados))
+    if audio.frame_rate != 48000:
+        with instrumentacao.medir('reamostragem'):
+            audio = audio.set_frame_rate(48000)
+    return audio
+
+def _ler_manifesto(pasta):
+    caminho = os.path.join(os.path.abspath(pasta), ARQUIVO_CORTES_VIRTUAIS)
+    try:
+        mtime_ns = os.stat(caminho).st_mtime_ns
+    except OSError:
+        return {}
+    entrada = _manifestos.get(caminho)
+    if entrada is None or entrada[0] != mtime_ns:
+        referencias = {}
+        with open(caminho, 'r', newline='', encoding='utf-8') as f:
+            for linha in csv.DictReader(f):
+                trechos = [tuple(int(valor) for valor in trecho.split('-'))
+                           for trecho in linha['trechos'].split(';') if trecho]
+                referencias[linha['nome']] = (linha['gravacao'], trechos)
+        entrada = _manifestos[caminho] = (mtime_ns, referencias)
+    return entrada[1]
+
+class ArmazenamentoDisco:
+    """
+    Acesso padrão aos áudios intermediários: cada clipe é um arquivo WAV em disco
+    
+    As etapas (crop, overlap, combine_60s) leem, listam e gravam clipes apenas
+    por meio destes métodos, de modo que outro armazenamento (ex: em memória)
+    pode substituir o disco sem mudar a lógica das etapas.
+    """
+    def criar_pasta(self, pasta):
+        os.makedirs(pasta, exist_ok=True)
+    
+    def listar_pastas(self, pasta):
+        """Nomes das subpastas de `pasta`"""
+        if not os.path.isdir(pasta):
+            return []
+        return sorted(nome for nome in os.listdir(pasta) if os.path.isdir(os.path.join(pasta, nome)))
+    
+    def listar_wavs(self, pasta):
+        """Caminhos dos arquivos .wav de `pasta` (incluindo os cortes virtuais)"""
+        virtuais = [os.path.join(pasta, nome) for nome in self.referencias(pasta)]
+        return sorted(set(glob.glob(os.path.join(pasta, '*.wav'))) | set(virtuais))
+    
+    def referencias(self, pasta):
+        """Cortes virtuais de `pasta`: nome -> (gravação, trechos em quadros)"""
+        return _ler_manifesto(pasta)
+    
+    def referencia(self, caminho):
+        """(gravação, trechos) se `caminho` é um corte virtual sem arquivo próprio, senão None"""
+        if os.path.exists(caminho):
+            return None
+        return self.referencias(os.path.dirname(caminho)).get(os.path.basename(caminho))
+    
+    def salvar_referencias(self, pasta, referencias):
+        """
+        Grava o manifesto de cortes virtuais de `pasta` no lugar dos WAVs. Os cortes já presentes
+        no manifesto são mantidos (como os WAVs de execuções anteriores); os de mesmo nome são substituídos.
+        
+        Args:
+            pasta (str): Pasta dos cortes (ex: croped_vocal/p)
+            referencias (dict): nome do corte -> (caminho da gravação, lista de (quadro inicial, quadro final))
+        """
+        os.makedirs(pasta, exist_ok=True)
+        referencias = {**self.referencias(pasta), **referencias}
+        caminho = os.path.join(pasta, ARQUIVO_CORTES_VIRTUAIS)
+        with instrumentacao.medir('escrita'):
+            with open(caminho + '.tmp', 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['nome', 'gravacao', 'trechos'])
+                for nome, (gravacao, trechos) in sorted(referencias.items()):
+                    writer.writerow([nome, os.path.abspath(gravacao),
+                                     ';'.join(f"{inicio}-{fim}" for inicio, fim in trechos)])
+            os.replace(caminho + '.tmp', caminho)
+        instrumentacao.registrar_escrita(caminho)
+    
+    def carregar(self, caminho):
+        referencia = self.referencia(caminho)
+        if referencia is not None:
+            instrumentacao.contar('cortes_virtuais_lidos')
+            return ler_trechos(*referencia)
+        with instrumentacao.medir('decodificacao'):
+            audio = AudioSegment.from_wav(caminho)
+        instrumentacao.registrar_leitura(caminho)
+        return audio
+    
+    def salvar(self, audio, caminho):
+        with instrumentacao.medir('escrita'):
+            audio.export(caminho, format='wav')
+        instrumentacao.registrar_escrita(caminho)
+    
+    def importar(self, caminho_origem, caminho):
+        """Coloca em `caminho` um WAV já pronto (ex: vindo do cache de artefatos)"""
+        with instrumentacao.medir('escrita'):
+            shutil.copyfile(caminho_origem, caminho)
+        instrumentacao.registrar_escrita(caminho)
+    
+    def duracao_ms(self, caminho):
+        """Duração do clipe em ms (mesmo arredondamento do len() do pydub), lida só do cabeçalho"""
+        referencia = self.referencia(caminho)
+        if referencia is not None:
+            gravacao, trechos = referencia
+            _, _, _, _, taxa = _gravacao_mapeada(gravacao)[1]
+            if taxa != 48000:
+                return len(self.carregar(caminho))
+            return round(1000 * sum(fim - inicio for inicio, fim in trechos) / taxa)
+        with wave.open(caminho, 'rb') as f:
+            return round(1000 * (f.getnframes() / f.getframerate()))
+    
+    def hash_clipe(self, caminho, memo=None):
+        """
+        Hash SHA-1 do conteúdo do clipe
+        
+        Args:
+            caminho (str): Caminho do clipe
+            memo (dict): Hashes já calculados, indexados por caminho + tamanho + mtime
+        """
+        referencia = self.referencia(caminho)
+        if referencia is not None:
+            # Corte virtual: identificado pela gravação (caminho, tamanho, mtime) e pelos trechos
+            gravacao, trechos = referencia
+            info = os.stat(gravacao)
+            return hashlib.sha1(f"{os.path.abspath(gravacao)}|{info.st_size}|{info.st_mtime_ns}|{trechos}"
+                                .encode()).hexdigest()
+        info = os.stat(caminho)
+        chave_memo = f"{os.path.abspath(caminho)}|{info.st_size}|{info.st_mtime_ns}"
+        if memo is not None and chave_memo in memo:
+            return memo[chave_memo]
+        h = hashlib.sha1()
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloco)
+        instrumentacao.registrar_leitura(caminho)
+        if memo is not None:
+            memo[chave_memo] = h.hexdigest()
+        return h.hexdigest()
+    
+    def antecipar(self, grupos):
+        """
+        Avisa quais clipes serão lidos em seguida, em ordem (sem efeito no acesso síncrono)
+        
+        Args:
+            grupos (list): Caminhos, ou tuplas de caminhos lidos juntos em qualquer ordem (ex: um par)
+        """
+    
+    def agendar_escrita(self, funcao, *args):
+        """Executa uma gravação que não é de clipe (ex: CSV de anotações)"""
+        funcao(*args)
+    
+    def aguardar(self):
+        """Espera as gravações pendentes (sem efeito no acesso síncrono)"""
+
+class ArmazenamentoMemoria(ArmazenamentoDisco):
+    """
+    Mantém os clipes gravados em memória (dicionário caminho -> AudioSegment),
+    evitando a ida e volta ao disco entre etapas
+    
+    Clipes gravados dentro de uma das `pastas_persistidas` vão para o disco
+    normalmente. A leitura procura primeiro na memória e depois no disco, e a
+    listagem combina os dois.
+    
+    Args:
+        pastas_persistidas (list): Pastas cujos clipes devem ser gravados em disco
+    """
+    def __init__(self, pastas_persistidas=()):
+        self.clipes = {}
+        self.cortes_virtuais = {}  # pasta -> {nome: (gravação, trechos)} das pastas não persistidas
+        self.pastas_persistidas = [os.path.abspath(pasta) for pasta in pastas_persistidas]
+    
+    def _persistido(self, caminho):
+        caminho = os.path.abspath(caminho)
+        return any(caminho == pasta or caminho.startswith(os.path.join(pasta, ''))
+                   for pasta in self.pastas_persistidas)
+    
+    def criar_pasta(self, pasta):
+        if self._persistido(pasta):
+            os.makedirs(pasta, exist_ok=True)
+    
+    def listar_pastas(self, pasta):
+        pasta = os.path.abspath(pasta)
+        nomes = set(super().listar_pastas(pasta))
+        for caminho in self.clipes:
+            pasta_clipe = os.path.dirname(os.path.dirname(caminho))
+            if pasta_clipe == pasta:
+                nomes.add(os.path.basename(os.path.dirname(caminho)))
+        for pasta_cortes in self.cortes_virtuais:
+            if os.path.dirname(pasta_cortes) == pasta:
+                nomes.add(os.path.basename(pasta_cortes))
+        return sorted(nomes)
+    
+    def listar_wavs(self, pasta):
+        pasta = os.path.abspath(pasta)
+        em_memoria = [caminho for caminho in self.clipes if os.path.dirname(caminho) == pasta]
+        em_disco = [os.path.abspath(caminho) for caminho in super().listar_wavs(pasta)]
+        return sorted(set(em_memoria) | set(em_disco))
+    
+    def referencias(self, pasta):
+        referencias = self.cortes_virtuais.get(os.path.abspath(pasta))
+        return referencias if referencias is not None else super().referencias(pasta)
+    
+    def salvar_referencias(self, pasta, referencias):
+        if self._persistido(pasta):
+            super().salvar_referencias(pasta, referencias)
+        else:
+            self.cortes_virtuais[os.path.abspath(pasta)] = {**self.referencias(pasta), **referencias}
+    
+    def carregar(self, caminho):
+        audio = self.clipes.get(os.path.abspath(caminho))
+        if audio is not None:
+            instrumentacao.contar('clipes_lidos_da_memoria')
+            return audio
+        return super().carregar(caminho)
+    
+    def salvar(self, audio, caminho):
+        if self._persistido(caminho):
+            super().salvar(audio, caminho)
+        else:
+            instrumentacao.contar('clipes_mantidos_em_memoria')
+            self.clipes[os.path.abspath(caminho)] = audio
+    
+    def importar(self, caminho_origem, caminho):
+        if self._persistido(caminho):
+            super().importar(caminho_origem, caminho)
+        else:
+            self.clipes[os.path.abspath(caminho)] = super().carregar(caminho_origem)
+    
+    def duracao_ms(self, caminho):
+        audio = self.clipes.get(os.path.abspath(caminho))
+        if audio is not None:
+            return len(audio)
+        return super().duracao_ms(caminho)
+    
+    def hash_clipe(self, caminho, memo=None):
+        audio = self.clipes.get(os.path.abspath(caminho))
+        if audio is None:
+            return super().hash_clipe(caminho, memo)
+        h = hashlib.sha1(f"{audio.frame_rate}|{audio.channels}|{audio.sample_width}|".encode())
+        h.update(audio.raw_data)
+        return h.hexdigest()
+    
+    def descartar(self, pasta):
+        """Libera da memória os clipes gravados dentro de `pasta`"""
+        prefixo = os.path.join(os.path.abspath(pasta), '')
+        for caminho in [caminho for caminho in self.clipes if caminho.startswith(prefixo)]:
+            del self.clipes[caminho]
+        for pasta_cortes in [pasta_cortes for pasta_cortes in self.cortes_virtuais
+                             if os.path.join(pasta_cortes, '').startswith(prefixo)]:
+            del self.cortes_virtuais[pasta_cortes]
+    
+    def bytes_em_memoria(self):
+        """Total aproximado de bytes de áudio mantidos em memória"""
+        return sum(len(audio.raw_data) for audio in self.clipes.values())
+
+class ArmazenamentoAssincrono:
+    """
+    Envolve outro armazenamento com leitura antecipada e gravação em segundo plano
+    
+    Os clipes avisados por antecipar() são decodificados por um pool de threads
+    enquanto a etapa mixa os anteriores, até `profundidade_leitura` clipes à frente.
+    Ao ler um clipe de um grupo, os grupos anteriores ainda não lidos (pulados pela
+    etapa, ex: por acerto no cache) são descartados.
+    salvar() e agendar_escrita() entregam a gravação a outro pool e retornam; com
+    `profundidade_escrita` gravações pendentes, a próxima espera uma terminar, de
+    forma que a memória ocupada fica limitada. Ler um caminho com gravação pendente
+    espera essa gravação. aguardar() deve ser chamado ao fim de cada etapa.
+    
+    Args:
+        base: Armazenamento envolvido (default: ArmazenamentoDisco)
+        profundidade_leitura (int): Máximo de clipes lidos antecipadamente e ainda não consumidos
+        profundidade_escrita (int): Máximo de gravações pendentes
+        threads_leitura (int): Threads de leitura
+        threads_escrita (int): Threads de escrita
+    """
+    def __init__(self, base=None, profundidade_leitura=8, profundidade_escrita=8, threads_leitura=4,
+                 threads_escrita=2):
+        self.base = base if base is not None else ArmazenamentoDisco()
+        self.profundidade_leitura = profundidade_leitura
+        self.profundidade_escrita = profundidade_escrita
+        self._leitores = ThreadPoolExecutor(max_workers=threads_leitura)
+        self._escritores = ThreadPoolExecutor(max_workers=threads_escrita)
+        self._vagas_escrita = threading.BoundedSemaphore(profundidade_escrita)
+        self._avisados = deque()
+        self._n_avisos = Counter()
+        self._lidos = {}
+        self._n_grupos = 0
+        self._escritas = {}
+        self._trava = threading.Lock()
+    
+    def __getattr__(self, nome):
+        # Demais métodos do armazenamento envolvido (ex: bytes_em_memoria)
+        return getattr(self.base, nome)
+    
+    def antecipar(self, grupos):
+        for grupo in grupos:
+            for caminho in ([grupo] if isinstance(grupo, str) else grupo):
+                self._avisados.append((self._n_grupos, os.path.abspath(caminho)))
+                self._n_avisos[os.path.abspath(caminho)] += 1
+            self._n_grupos += 1
+        self._completar()
+    
+    def _retirar_aviso(self, indice=0):
+        grupo, caminho = self._avisados[indice]
+        del self._avisados[indice]
+        self._n_avisos[caminho] -= 1
+        if not self._n_avisos[caminho]:
+            del self._n_avisos[caminho]
+        return grupo, caminho
+    
+    def _completar(self):
+        while self._avisados and len(self._lidos) < self.profundidade_leitura:
+            grupo, caminho = self._retirar_aviso()
+            if caminho not in self._lidos:
+                self._lidos[caminho] = (grupo, self._leitores.submit(self._carregar_base, caminho))
+    
+    def _pular_anteriores(self, grupo):
+        # Grupos anteriores ainda não lidos foram pulados pela etapa (ex: reaproveitados do
+        # cache ou com erro): as leituras deles são canceladas e os avisos descartados
+        for outro in [outro for outro, (grupo_outro, _) in self._lidos.items() if grupo_outro < grupo]:
+            self._lidos.pop(outro)[1].cancel()
+        while self._avisados and self._avisados[0][0] < grupo:
+            self._retirar_aviso()
+    
+    def _carregar_base(self, caminho):
+        self._esperar_escrita(caminho)
+        return self.base.carregar(caminho)
+    
+    def carregar(self, caminho):
+        caminho_abs = os.path.abspath(caminho)
+        if caminho_abs in self._lidos:
+            grupo, futuro = self._lidos.pop(caminho_abs)
+            self._pular_anteriores(grupo)
+            audio = futuro.result()
+            instrumentacao.contar('clipes_lidos_antecipadamente')
+        else:
+            if caminho_abs in self._n_avisos:
+                # Avisado mas ainda não submetido: o grupo dele passa a ser o atual e o aviso é
+                # consumido aqui, para não ser lido de novo em segundo plano
+                grupo = next(grupo for grupo, outro in self._avisados if outro == caminho_abs)
+                self._pular_anteriores(grupo)
+                self._retirar_aviso(next(indice for indice, (_, outro) in enumerate(self._avisados)
+                                         if outro == caminho_abs))
+            audio = self._carregar_base(caminho)
+        self._completar()
+        return audio
+    
+    def _esperar_escrita(self, caminho):
+        with self._trava:
+            futuro = self._escritas.get(caminho)
+        if futuro is not None:
+            futuro.result()
+    
+    def _agendar(self, caminho, funcao, *args):
+        self._vagas_escrita.acquire()
+        
+        def executar():
+            try:
+                funcao(*args)
+            except Exception as e:
+                print(f"Erro na gravação em segundo plano de {caminho}: {str(e)}")
+            finally:
+                self._vagas_escrita.release()
+        
+        futuro = self._escritores.submit(executar)
+        if caminho is not None:
+            with self._trava:
+                self._escritas[caminho] = futuro
+            futuro.add_done_callback(lambda _: self._liberar_escrita(caminho, futuro))
+    
+    def _liberar_escrita(self, caminho, futuro):
+        with self._trava:
+            if self._escritas.get(caminho) is futuro:
+                del self._escritas[caminho]
+    
+    def salvar(self, audio, caminho):
+        caminho_abs = os.path.abspath(caminho)
+        self._esperar_escrita(caminho_abs)
+        self._agendar(caminho_abs, self.base.salvar, audio, caminho)
+    
+    def importar(self, caminho_origem, caminho):
+        caminho_abs = os.path.abspath(caminho)
+        self._esperar_escrita(caminho_abs)
+        self._agendar(caminho_abs, self.base.importar, caminho_origem, caminho)
+    
+    def agendar_escrita(self, funcao, *args):
+        self._agendar(None, funcao, *args)
+    
+    def _esperar_escritas(self):
+        # Ocupar todas as vagas só é possível depois que todas as gravações terminaram
+        for _ in range(self.profundidade_escrita):
+            self._vagas_escrita.acquire()
+        for _ in range(self.profundidade_escrita):
+            self._vagas_escrita.release()
+    
+    def aguardar(self):
+        """Espera todas as gravações pendentes e descarta as leituras antecipadas não usadas"""
+        self._esperar_escritas()
+        for _, futuro in self._lidos.values():
+            futuro.cancel()
+        self._lidos.clear()
+        self._avisados.clear()
+        self._n_avisos.clear()
+    
+    def fechar(self):
+        self.aguardar()
+        self._leitores.shutdown()
+        self._escritores.shutdown()
+    
+    def criar_pasta(self, pasta):
+        self.base.criar_pasta(pasta)
+    
+    def listar_pastas(self, pasta):
+        self._esperar_escritas()
+        return self.base.listar_pastas(pasta)
+    
+    def listar_wavs(self, pasta):
+        self._esperar_escritas()
+        return self.base.listar_wavs(pasta)
+    
+    def duracao_ms(self, caminho):
+        self._esperar_escrita(os.path.abspath(caminho))
+        return self.base.duracao_ms(caminho)
+    
+    def hash_clipe(self, caminho, memo=None):
+        self._esperar_escrita(os.path.abspath(caminho))
+        return self.base.hash_clipe(caminho, memo)
+    
+    def descartar(self, pasta):
+        self.aguardar()
+        self.base.descartar(pasta)
@@ -0,0 +1,366 @@
+import os
+import json
+import time
+import glob
+import wave
+import random
+import shutil
+import platform
+import argparse
+import subprocess
+import multiprocessing
+from datetime import datetime
+import numpy as np
+import instrumentacao
+
+SAMPLE_RATE = 48000
+
+def gerar_wav_sintetico(caminho, duracao_s, chamadas, rng, sample_rate=SAMPLE_RATE):
+    """
+    Gera um WAV mono 16 bits com ruído de fundo e chamadas sintéticas (chirps)
+    
+    Args:
+        caminho (str): Caminho do WAV a ser criado
+        duracao_s (float): Duração total em segundos
+        chamadas (list): Lista de (onset_s, offset_s) das chamadas
+        rng (np.random.Generator): Gerador aleatório
+        sample_rate (int): Taxa de amostragem (default: 48000)
+    """
+    n = int(duracao_s * sample_rate)
+    sinal = rng.normal(0, 300, n)
+    
+    for onset, offset in chamadas:
+        inicio = int(onset * sample_rate)
+        fim = min(int(offset * sample_rate), n)
+        t = np.arange(fim - inicio) / sample_rate
+        f0 = rng.uniform(4000, 9000)
+        f1 = f0 + rng.uniform(-2000, 3000)
+        fase = 2 * np.pi * (f0 * t + (f1 - f0) * t ** 2 / (2 * max(t[-1], 1e-3))) if len(t) else t
+        envelope = np.sin(np.pi * np.linspace(0, 1, len(t))) if len(t) else t
+        sinal[inicio:fim] += rng.uniform(3000, 12000) * envelope * np.sin(fase)
+    
+    with wave.open(caminho, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(np.clip(sinal, -32768, 32767).astype(np.int16).tobytes())
+
+def gerar_dados_sinteticos(pasta, n_gravacoes, duracao_s=60, chamadas_por_minuto=30,
+                           duracao_chamada=(0.2, 1.5), labels=('p', 'l', 'k'), semente=0):
+    """
+    Gera gravações sintéticas de 48 kHz com anotações .wav.csv (mesmo formato de ALL_DATA)
+    
+    Args:
+        pasta (str): Pasta de saída
+        n_gravacoes (int): Número de gravações
+        duracao_s (float): Duração de cada gravação em segundos
+        chamadas_por_minuto (float): Densidade média de chamadas
+        duracao_chamada (tuple): Faixa (min, max) da duração das chamadas em segundos
+        labels (tuple): Labels sorteadas para as chamadas
+        semente (int): Semente do gerador aleatório
+    
+    Returns:
+        dict: Número de gravações, de chamadas e duração total em segundos
+    """
+    os.makedirs(pasta, exist_ok=True)
+    rng = np.random.default_rng(semente)
+    total_chamadas = 0
+    
+    for i in range(n_gravacoes):
+        # Chamadas em sequência, sem sobreposição, com intervalos exponenciais
+        chamadas = []
+        anotacoes = []
+        intervalo_medio = 60.0 / chamadas_por_minuto
+        t = rng.exponential(intervalo_medio)
+        while True:
+            duracao = rng.uniform(*duracao_chamada)
+            if t + duracao >= duracao_s - 0.1:
+                break
+            chamadas.append((t, t + duracao))
+            anotacoes.append((round(t, 3), round(t + duracao, 3), labels[rng.integers(len(labels))]))
+            t += duracao + rng.exponential(intervalo_medio)
+        
+        nome = f"sintetico_{i:04d}"
+        gerar_wav_sintetico(os.path.join(pasta, f"{nome}.wav"), duracao_s, chamadas, rng)
+        with open(os.path.join(pasta, f"{nome}.wav.csv"), 'w', encoding='utf-8') as f:
+            f.write("onset_s,offset_s,label\n")
+            for onset, offset, label in anotacoes:
+                f.write(f"{onset:.3f},{offset:.3f},{label}\n")
+        total_chamadas += len(anotacoes)
+    
+    return {'gravacoes': n_gravacoes, 'chamadas': total_chamadas, 'duracao_s': n_gravacoes * duracao_s}
+
+def _tamanho(caminhos):
+    return sum(os.path.getsize(caminho) for caminho in caminhos if os.path.exists(caminho))
+
+def _tamanho_pasta(pasta):
+    return _tamanho(glob.glob(os.path.join(pasta, '**', '*'), recursive=True))
+
+def _duracao_wav(caminho):
+    with wave.open(caminho, 'rb') as f:
+        return f.getnframes() / f.getframerate()
+
+def _executar_etapa(etapa, args):
+    """
+    Executa uma etapa no processo filho e mede o pico de memória
+    
+    Returns:
+        dict: Retorno da etapa (tempo da parte medida, arquivos, segundos de áudio, bytes)
+              e 'pico_rss_mb'
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    
+    metricas = ETAPAS[etapa](**args)
+    metricas['pico_rss_mb'] = instrumentacao.pico_memoria_mb()
+    return metricas
+
+def _bench_cortar_audios(pasta_dados, pasta_saida, labels):
+    from crop import cortar_audios
+    wavs = glob.glob(os.path.join(pasta_dados, '*.wav'))
+    inicio = time.perf_counter()
+    cortar_audios(pasta_dados, pasta_saida, labels)
+    return {'tempo_s': time.perf_counter() - inicio, 'arquivos': len(wavs), 'audio_s': sum(_duracao_wav(w) for w in wavs),
+            'bytes_lidos': _tamanho(wavs) + _tamanho(w + '.csv' for w in wavs),
+            'bytes_escritos': _tamanho_pasta(pasta_saida)}
+
+def _bench_cortar_background(pasta_dados, pasta_saida):
+    from crop import cortar_background
+    wavs = glob.glob(os.path.join(pasta_dados, '*.wav'))
+    inicio = time.perf_counter()
+    cortar_background(pasta_dados, pasta_saida)
+    return {'tempo_s': time.perf_counter() - inicio, 'arquivos': len(wavs), 'audio_s': sum(_duracao_wav(w) for w in wavs),
+            'bytes_lidos': _tamanho(wavs) + _tamanho(w + '.csv' for w in wavs),
+            'bytes_escritos': _tamanho_pasta(os.path.join(pasta_saida, 'u'))}
+
+def _bench_processar_overlap(pares, pasta_saida, taxa_reducao):
+    from overlap import processar_overlap
+    # Apenas a mixagem: o espectrograma é medido separadamente
+    os.makedirs(pasta_saida, exist_ok=True)
+    inicio = time.perf_counter()
+    for arq1, arq2, label1, label2 in pares:
+        processar_overlap(arq1, arq2, pasta_saida, label1, label2, taxa_reducao, espectrograma=False)
+    tempo = time.perf_counter() - inicio
+    entradas = [arq for arq1, arq2, _, _ in pares for arq in (arq1, arq2)]
+    return {'tempo_s': tempo, 'arquivos': len(pares), 'audio_s': sum(_duracao_wav(arq) for arq in entradas),
+            'bytes_lidos': _tamanho(entradas), 'bytes_escritos': _tamanho_pasta(pasta_saida)}
+
+def _bench_gerar_espectrograma(arquivos, pasta_saida):
+    from overlap import gerar_espectrograma
+    from pydub import AudioSegment
+    # A primeira chamada paga a importação de librosa/pyplot, os submódulos preguiçosos do librosa
+    # e a compilação JIT: uma chamada sobre um clipe curto, fora da medição
+    if arquivos:
+        pasta_aquecimento = pasta_saida + '_aquecimento'
+        os.makedirs(pasta_aquecimento, exist_ok=True)
+        clipe = os.path.join(pasta_aquecimento, 'aquecimento.wav')
+        AudioSegment.from_wav(arquivos[0])[:200].export(clipe, format='wav')
+        gerar_espectrograma(clipe, pasta_aquecimento, 'aquecimento')
+        shutil.rmtree(pasta_aquecimento, ignore_errors=True)
+    os.makedirs(pasta_saida, exist_ok=True)
+    inicio = time.perf_counter()
+    for arquivo in arquivos:
+        nome_base = os.path.splitext(os.path.basename(arquivo))[0]
+        gerar_espectrograma(arquivo, pasta_saida, nome_base)
+    return {'tempo_s': time.perf_counter() - inicio, 'arquivos': len(arquivos), 'audio_s': sum(_duracao_wav(arq) for arq in arquivos),
+            'bytes_lidos': _tamanho(arquivos), 'bytes_escritos': _tamanho_pasta(pasta_saida)}
+
+def _bench_criar_audio_individual(vocalizacoes, arquivos_background, n_audios, pasta_saida, semente):
+    from combine_60s import criar_audio_individual
+    random.seed(semente)
+    os.makedirs(pasta_saida, exist_ok=True)
+    por_audio = max(1, len(vocalizacoes) // n_audios)
+    inicio = time.perf_counter()
+    for i in range(n_audios):
+        lote = vocalizacoes[i * por_audio:(i + 1) * por_audio]
+        audio, _ = criar_audio_individual(lote, arquivos_background, 60000)
+        if audio is not None:
+            audio.export(os.path.join(pasta_saida, f"audio_60s_{i + 1:03d}.wav"), format='wav')
+    return {'tempo_s': time.perf_counter() - inicio, 'arquivos': n_audios, 'audio_s': 60.0 * n_audios,
+            'bytes_lidos': _tamanho(vocalizacoes) + _tamanho(arquivos_background),
+            'bytes_escritos': _tamanho_pasta(pasta_saida)}
+
+def _bench_analisar_audios_anotados(pasta_dados, pasta_trabalho):
+    import analyze_annotations
+    os.makedirs(pasta_trabalho, exist_ok=True)
+    caminho_cache = os.path.join(pasta_trabalho, 'analise_cache.json')
+    if os.path.exists(caminho_cache):
+        os.remove(caminho_cache)
+    wavs = glob.glob(os.path.join(pasta_dados, '*.wav'))
+    # Execução a frio (sem cache), com o gráfico salvo na pasta de trabalho
+    inicio = time.perf_counter()
+    estatisticas = analyze_annotations.estatisticas_pasta(pasta_dados, analyze_annotations.carregar_cache(caminho_cache))
+    analyze_annotations.plotar_graficos(estatisticas['contagem_labels'], estatisticas['duracoes_medias'],
+                                        estatisticas['duracoes_por_label'],
+                                        caminho_saida=os.path.join(pasta_trabalho, 'analise_vocalizacoes.png'),
+                                        mostrar=False)
+    return {'tempo_s': time.perf_counter() - inicio, 'arquivos': len(wavs), 'audio_s': estatisticas['duracao_total_s'],
+            'bytes_lidos': _tamanho(wavs) + _tamanho(w + '.csv' for w in wavs),
+            'bytes_escritos': _tamanho_pasta(pasta_trabalho)}
+
+ETAPAS = {
+    'cortar_audios': _bench_cortar_audios,
+    'cortar_background': _bench_cortar_background,
+    'processar_overlap': _bench_processar_overlap,
+    'gerar_espectrograma': _bench_gerar_espectrograma,
+    'criar_audio_individual': _bench_criar_audio_individual,
+    'analisar_audios_anotados': _bench_analisar_audios_anotados,
+}
+
+def _medir(pool_ctx, etapa, args):
+    # Cada medição roda em um processo novo para que o pico de RSS seja só da etapa
+    with pool_ctx.Pool(1) as pool:
+        metricas = pool.apply(_executar_etapa, (etapa, args))
+    tempo = max(metricas['tempo_s'], 1e-9)
+    metricas['etapa'] = etapa
+    metricas['arquivos_por_s'] = metricas['arquivos'] / tempo
+    metricas['audio_s_por_s'] = metricas['audio_s'] / tempo
+    metricas['mb_por_s'] = (metricas['bytes_lidos'] + metricas['bytes_escritos']) / 1e6 / tempo
+    print(f"  {etapa:26s} {metricas['tempo_s']:8.2f}s  {metricas['arquivos_por_s']:8.2f} arq/s  "
+          f"{metricas['audio_s_por_s']:8.1f} s_audio/s  {metricas['mb_por_s']:7.1f} MB/s  "
+          f"pico {metricas['pico_rss_mb'] or 0:.0f} MB")
+    return metricas
+
+def executar_benchmark(pasta_trabalho, escalas=(2, 8, 32), duracao_s=60, chamadas_por_minuto=30,
+                       duracao_chamada=(0.2, 1.5), etapas=None, semente=0, caminho_resultado=None):
+    """
+    Gera dados sintéticos em várias escalas e mede cada etapa do pipeline
+    
+    Args:
+        pasta_trabalho (str): Pasta temporária para dados e saídas (apagada por escala)
+        escalas (tuple): Números de gravações sintéticas por escala
+        duracao_s (float): Duração de cada gravação em segundos
+        chamadas_por_minuto (float): Densidade de chamadas
+        duracao_chamada (tuple): Faixa da duração das chamadas em segundos
+        etapas (list): Etapas a medir (default: todas de ETAPAS)
+        semente (int): Semente dos dados e das escolhas aleatórias
+        caminho_resultado (str): Arquivo JSON para salvar os resultados
+    
+    Returns:
+        dict: Metadados da execução e lista de medições
+    """
+    if etapas is None:
+        etapas = list(ETAPAS)
+    labels = ['p', 'l', 'k']
+    pool_ctx = multiprocessing.get_context('spawn')
+    resultados = []
+    
+    for escala in escalas:
+        pasta_escala = os.path.join(pasta_trabalho, f"escala_{escala}")
+        shutil.rmtree(pasta_escala, ignore_errors=True)
+        pasta_dados = os.path.join(pasta_escala, 'ALL_DATA')
+        pasta_crop = os.path.join(pasta_escala, 'croped_vocal')
+        pasta_overlap = os.path.join(pasta_escala, 'overlap')
+        
+        info = gerar_dados_sinteticos(pasta_dados, escala, duracao_s, chamadas_por_minuto,
+                                      duracao_chamada, labels, semente)
+        print(f"\nEscala {escala}: {info['gravacoes']} gravações, {info['chamadas']} chamadas, "
+              f"{info['duracao_s']:.0f}s de áudio")
+        
+        # As etapas seguintes usam as saídas das anteriores, então crop e background
+        # sempre rodam (e só são reportados se pedidos)
+        medicoes = {}
+        medicoes['cortar_audios'] = _medir(pool_ctx, 'cortar_audios',
+                                           {'pasta_dados': pasta_dados, 'pasta_saida': pasta_crop, 'labels': labels})
+        medicoes['cortar_background'] = _medir(pool_ctx, 'cortar_background',
+                                               {'pasta_dados': pasta_dados, 'pasta_saida': pasta_crop})
+        
+        rng = random.Random(semente)
+        cortes = {label: sorted(glob.glob(os.path.join(pasta_crop, label, '*.wav'))) for label in labels}
+        todos = [(arq, label) for label, arqs in cortes.items() for arq in arqs]
+        rng.shuffle(todos)
+        pares = [(a, b, la, lb) for (a, la), (b, lb) in zip(todos[0::2], todos[1::2])]
+        
+        if 'processar_overlap' in etapas or 'gerar_espectrograma' in etapas or 'criar_audio_individual' in etapas:
+            medicoes['processar_overlap'] = _medir(pool_ctx, 'processar_overlap', {
+                'pares': pares, 'pasta_saida': os.path.join(pasta_overlap, 'pp'),
+                'taxa_reducao': {label: (0.1, 0.2) for label in labels}})
+        overlaps = sorted(glob.glob(os.path.join(pasta_overlap, 'pp', '*.wav')))
+        
+        if 'gerar_espectrograma' in etapas:
+            medicoes['gerar_espectrograma'] = _medir(pool_ctx, 'gerar_espectrograma', {
+                'arquivos': overlaps, 'pasta_saida': os.path.join(pasta_escala, 'espectrogramas')})
+        if 'criar_audio_individual' in etapas:
+            medicoes['criar_audio_individual'] = _medir(pool_ctx, 'criar_audio_individual', {
+                'vocalizacoes': overlaps,
+                'arquivos_background': sorted(glob.glob(os.path.join(pasta_crop, 'u', '*.wav'))),
+                'n_audios': max(1, escala // 2), 'pasta_saida': os.path.join(pasta_escala, 'audios_60s'),
+                'semente': semente})
+        if 'analisar_audios_anotados' in etapas:
+            medicoes['analisar_audios_anotados'] = _medir(pool_ctx, 'analisar_audios_anotados', {
+                'pasta_dados': pasta_dados, 'pasta_trabalho': os.path.join(pasta_escala, 'analise')})
+        
+        for etapa in etapas:
+            if etapa in medicoes:
+                medicoes[etapa]['escala'] = escala
+                medicoes[etapa]['chamadas'] = info['chamadas']
+                resultados.append(medicoes[etapa])
+        
+        shutil.rmtree(pasta_escala, ignore_errors=True)
+    
+    execucao = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'versao_codigo': _versao_codigo(),
+        'plataforma': platform.platform(),
+        'python': platform.python_version(),
+        'parametros': {'escalas': list(escalas), 'duracao_s': duracao_s,
+                       'chamadas_por_minuto': chamadas_por_minuto,
+                       'duracao_chamada': list(duracao_chamada), 'semente': semente},
+        'resultados': resultados
+    }
+    
+    if caminho_resultado:
+        with open(caminho_resultado, 'w', encoding='utf-8') as f:
+            json.dump(execucao, f, indent=2)
+        print(f"\nResultados salvos em: {caminho_resultado}")
+    return execucao
+
+def _versao_codigo():
+    """Commit atual do repositório (ou None fora de um repositório git)"""
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def comparar_resultados(caminho_base, caminho_novo):
+    """
+    Compara dois arquivos de resultados (ex: duas versões do código) por etapa e escala
+    
+    Args:
+        caminho_base (str): JSON de referência
+        caminho_novo (str): JSON a comparar
+    """
+    with open(caminho_base, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(caminho_novo, 'r', encoding='utf-8') as f:
+        novo = json.load(f)
+    
+    indice_base = {(r['etapa'], r['escala']): r for r in base['resultados']}
+    print(f"Base: {base['versao_codigo']} ({base['data']})  Novo: {novo['versao_codigo']} ({novo['data']})")
+    for r in novo['resultados']:
+        ref = indice_base.get((r['etapa'], r['escala']))
+        if ref is None:
+            continue
+        ganho = r['audio_s_por_s'] / max(ref['audio_s_por_s'], 1e-9)
+        print(f"  {r['etapa']:26s} escala {r['escala']:4d}: {ref['audio_s_por_s']:8.1f} -> "
+              f"{r['audio_s_por_s']:8.1f} s_audio/s ({ganho:.2f}x)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline com dados sintéticos")
+    parser.add_argument('--pasta', default='benchmark_tmp', help="Pasta de trabalho temporária")
+    parser.add_argument('--escalas', type=int, nargs='+', default=[2, 8, 32], help="Gravações por escala")
+    parser.add_argument('--duracao', type=float, default=60, help="Duração de cada gravação (s)")
+    parser.add_argument('--densidade', type=float, default=30, help="Chamadas por minuto")
+    parser.add_argument('--duracao-chamada', type=float, nargs=2, default=[0.2, 1.5], help="Duração mín/máx das chamadas (s)")
+    parser.add_argument('--etapas', nargs='+', choices=list(ETAPAS), default=None)
+    parser.add_argument('--saida', default='benchmark_resultados.json', help="Arquivo JSON de resultados")
+    parser.add_argument('--comparar', nargs=2, metavar=('BASE', 'NOVO'), help="Compara dois JSONs de resultados")
+    args = parser.parse_args()
+    
+    if args.comparar:
+        comparar_resultados(*args.comparar)
+    else:
+        executar_benchmark(args.pasta, args.escalas, args.duracao, args.densidade,
+                           tuple(args.duracao_chamada), args.etapas, caminho_resultado=args.saida)
@@ -0,0 +1,145 @@
+import os
+import json
+import uuid
+import random
+import shutil
+import hashlib
+import instrumentacao
+
+def versao_codigo(*caminhos):
+    """
+    Versão do código que gera um artefato: hash do conteúdo dos arquivos-fonte
+    
+    Args:
+        caminhos (str): Arquivos .py cujo conteúdo define a versão
+    
+    Returns:
+        str: Hash (12 caracteres)
+    """
+    h = hashlib.sha1()
+    for caminho in caminhos:
+        with open(caminho, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+def gerador(semente, *partes):
+    """
+    Gerador aleatório próprio de um artefato, derivado da semente e da sua identidade
+    
+    Com um gerador por artefato, os sorteios de um overlap não dependem de quantos
+    outros foram gerados antes, e as chaves do cache continuam as mesmas quando
+    só parte da configuração muda.
+    
+    Args:
+        semente (int): Semente global (None usa o módulo random, como antes)
+        partes (str): Identidade do artefato (ex: tipo de overlap e nomes dos clipes)
+    
+    Returns:
+        random.Random ou módulo random
+    """
+    if semente is None:
+        return random
+    return random.Random(':'.join(str(parte) for parte in (semente,) + partes))
+
+class CacheArtefatos:
+    """
+    Armazém endereçado por conteúdo dos artefatos gerados (overlaps, áudios de 60s)
+    
+    Cada artefato é identificado por um hash de tudo o que o define (hashes dos
+    clipes de origem, labels, ganho e deslocamento sorteados, versão do código).
+    Uma entrada é uma pasta `pasta/<2 primeiros>/<chave>/` com os arquivos do
+    artefato e um `meta.json`. As entradas são gravadas em uma pasta temporária
+    e renomeadas ao final, de forma que uma entrada existente está sempre completa.
+    
+    Args:
+        pasta (str): Pasta do armazém
+        versao (str): Versão do código gerador (entra em todas as chaves)
+    """
+    def __init__(self, pasta, versao=''):
+        self.pasta = pasta
+        self.versao = versao
+        self.caminho_hashes = os.path.join(pasta, 'hashes.json')
+        os.makedirs(pasta, exist_ok=True)
+        # Hashes dos clipes em disco, indexados por caminho + tamanho + mtime
+        try:
+            with open(self.caminho_hashes, 'r', encoding='utf-8') as f:
+                self.hashes = json.load(f)
+        except (OSError, ValueError):
+            self.hashes = {}
+    
+    def chave(self, tipo, **entradas):
+        """
+        Chave de um artefato a partir de suas entradas (valores serializáveis em JSON)
+        """
+        conteudo = json.dumps({'tipo': tipo, 'versao': self.versao, **entradas}, sort_keys=True)
+        return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+    
+    def hash_clipe(self, caminho, armazenamento):
+        """Hash do conteúdo de um clipe (memorizado para clipes em disco)"""
+        return armazenamento.hash_clipe(caminho, self.hashes)
+    
+    def _pasta_entrada(self, chave):
+        return os.path.join(self.pasta, chave[:2], chave)
+    
+    def buscar(self, chave):
+        """
+        Returns:
+            dict: Metadados da entrada, ou None se a chave não está no armazém
+        """
+        try:
+            with open(os.path.join(self._pasta_entrada(chave), 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            instrumentacao.contar('cache_artefatos_faltas')
+            return None
+        instrumentacao.contar('cache_artefatos_acertos')
+        return meta
+    
+    def arquivo(self, chave, nome):
+        """Caminho de um arquivo de uma entrada existente"""
+        return os.path.join(self._pasta_entrada(chave), nome)
+    
+    def restaurar(self, chave, nome, destino):
+        """Copia um arquivo de uma entrada para `destino`"""
+        os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+        shutil.copyfile(self.arquivo(chave, nome), destino)
+        instrumentacao.registrar_escrita(destino)
+    
+    def guardar(self, chave, arquivos, meta=None):
+        """
+        Grava uma entrada no armazém
+        
+        Args:
+            chave (str): Chave do artefato
+            arquivos (dict): Nome na entrada -> caminho de um arquivo ou AudioSegment
+                             (clipes mantidos só em memória são exportados direto)
+            meta (dict): Metadados (ex: nome do arquivo de saída)
+        """
+        pasta_final = self._pasta_entrada(chave)
+        if os.path.isdir(pasta_final):
+            return
+        pasta_tmp = os.path.join(self.pasta, f"tmp-{uuid.uuid4().hex}")
+        os.makedirs(pasta_tmp)
+        try:
+            for nome, origem in arquivos.items():
+                if isinstance(origem, str):
+                    shutil.copyfile(origem, os.path.join(pasta_tmp, nome))
+                else:
+                    origem.export(os.path.join(pasta_tmp, nome), format='wav')
+            with open(os.path.join(pasta_tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta or {}, f)
+            os.makedirs(os.path.dirname(pasta_final), exist_ok=True)
+            os.replace(pasta_tmp, pasta_final)
+        except OSError:
+            # Outra execução gravou a mesma entrada primeiro
+            if not os.path.isdir(pasta_final):
+                raise
+        finally:
+            shutil.rmtree(pasta_tmp, ignore_errors=True)
+    
+    def salvar_hashes(self):
+        """Grava o índice de hashes dos clipes (escrita atômica)"""
+        caminho_tmp = f"{self.caminho_hashes}.{uuid.uuid4().hex}.tmp"
+        with open(caminho_tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.hashes, f)
+        os.replace(caminho_tmp, self.caminho_hashes)
@@ -0,0 +1,177 @@
+import os
+import wave
+import sqlite3
+import numpy as np
+from divisao import PADRAO_TRECHO
+import instrumentacao
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS pastas (
+    id INTEGER PRIMARY KEY,
+    caminho TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS cortes (
+    id INTEGER PRIMARY KEY,
+    pasta_id INTEGER NOT NULL REFERENCES pastas(id),
+    nome TEXT NOT NULL,
+    label TEXT NOT NULL,
+    gravacao TEXT,
+    onset_s REAL,
+    offset_s REAL,
+    duracao_ms INTEGER,
+    taxa INTEGER,
+    tamanho INTEGER,
+    mtime_ns INTEGER,
+    UNIQUE (pasta_id, nome)
+);
+CREATE INDEX IF NOT EXISTS idx_cortes_label ON cortes (label);
+CREATE INDEX IF NOT EXISTS idx_cortes_gravacao ON cortes (gravacao);
+"""
+
+def _descrever_corte(caminho, nome):
+    """
+    Gravação de origem, onset/offset (do nome), duração e taxa (do cabeçalho WAV)
+    """
+    trecho = PADRAO_TRECHO.match(os.path.splitext(nome)[0])
+    gravacao, onset_s, offset_s = None, None, None
+    if trecho:
+        gravacao, onset_s, offset_s = trecho.group(1), float(trecho.group(2)), float(trecho.group(3))
+    try:
+        with wave.open(caminho, 'rb') as f:
+            taxa = f.getframerate()
+            duracao_ms = round(1000 * (f.getnframes() / taxa))
+    except (wave.Error, EOFError, OSError):
+        taxa, duracao_ms = None, None
+    return gravacao, onset_s, offset_s, duracao_ms, taxa
+
+class CatalogoCortes:
+    """
+    Catálogo persistente (SQLite) dos cortes em disco, com um id inteiro por corte
+    
+    Cada pasta de cortes (ex: croped_vocal/p) é reindexada só quando o mtime do
+    diretório muda, isto é, quando arquivos são criados, removidos ou renomeados.
+    Nas demais execuções a listagem vem do banco, sem varrer a pasta.
+    Arquivos sobrescritos no lugar não mudam o mtime da pasta; use forcar=True.
+    
+    Args:
+        caminho_db (str): Arquivo do banco SQLite
+    """
+    def __init__(self, caminho_db):
+        self.caminho_db = caminho_db
+        self.conexao = sqlite3.connect(caminho_db)
+        self.conexao.executescript(ESQUEMA)
+    
+    def _pasta_id(self, pasta):
+        linha = self.conexao.execute("SELECT id, mtime_ns FROM pastas WHERE caminho = ?", (pasta,)).fetchone()
+        if linha is None:
+            cursor = self.conexao.execute("INSERT INTO pastas (caminho, mtime_ns) VALUES (?, NULL)", (pasta,))
+            return cursor.lastrowid, None
+        return linha
+    
+    def atualizar(self, pasta, forcar=False):
+        """
+        Sincroniza o catálogo com os .wav de uma pasta (label = nome da pasta)
+        
+        Returns:
+            int: Número de cortes inseridos, alterados ou removidos
+        """
+        pasta = os.path.abspath(pasta)
+        if not os.path.isdir(pasta):
+            return 0
+        mtime_pasta = os.stat(pasta).st_mtime_ns
+        pasta_id, mtime_catalogo = self._pasta_id(pasta)
+        if mtime_catalogo == mtime_pasta and not forcar:
+            return 0
+        
+        existentes = {nome: (id_corte, tamanho, mtime_ns) for id_corte, nome, tamanho, mtime_ns in
+                      self.conexao.execute("SELECT id, nome, tamanho, mtime_ns FROM cortes WHERE pasta_id = ?",
+                                           (pasta_id,))}
+        label = os.path.basename(pasta)
+        vistos = set()
+        alteracoes = 0
+        with os.scandir(pasta) as entradas:
+            for entrada in entradas:
+                if not entrada.is_file() or not entrada.name.lower().endswith('.wav'):
+                    continue
+                vistos.add(entrada.name)
+                info = entrada.stat()
+                anterior = existentes.get(entrada.name)
+                if anterior is not None and anterior[1:] == (info.st_size, info.st_mtime_ns):
+                    continue
+                descricao = _descrever_corte(entrada.path, entrada.name)
+                if anterior is None:
+                    self.conexao.execute(
+                        "INSERT INTO cortes (pasta_id, nome, label, gravacao, onset_s, offset_s, duracao_ms, taxa, "
+                        "tamanho, mtime_ns) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (pasta_id, entrada.name, label) + descricao + (info.st_size, info.st_mtime_ns))
+                else:
+                    self.conexao.execute(
+                        "UPDATE cortes SET gravacao = ?, onset_s = ?, offset_s = ?, duracao_ms = ?, taxa = ?, "
+                        "tamanho = ?, mtime_ns = ? WHERE id = ?",
+                        descricao + (info.st_size, info.st_mtime_ns, anterior[0]))
+                alteracoes += 1
+        
+        removidos = [(id_corte,) for nome, (id_corte, _, _) in existentes.items() if nome not in vistos]
+        self.conexao.executemany("DELETE FROM cortes WHERE id = ?", removidos)
+        alteracoes += len(removidos)
+        self.conexao.execute("UPDATE pastas SET mtime_ns = ? WHERE id = ?", (mtime_pasta, pasta_id))
+        self.conexao.commit()
+        instrumentacao.contar('catalogo_alteracoes', alteracoes)
+        return alteracoes
+    
+    def atualizar_raiz(self, pasta_raiz, forcar=False):
+        """
+        Sincroniza todas as subpastas (uma por label) de `pasta_raiz`
+        
+        Returns:
+            list: Nomes das subpastas
+        """
+        if not os.path.isdir(pasta_raiz):
+            return []
+        with os.scandir(pasta_raiz) as entradas:
+            subpastas = sorted(entrada.name for entrada in entradas if entrada.is_dir())
+        for nome in subpastas:
+            self.atualizar(os.path.join(pasta_raiz, nome), forcar)
+        return subpastas
+    
+    def listar(self, pasta):
+        """
+        Cortes de uma pasta, em ordem de nome
+        
+        Returns:
+            tuple: (np.ndarray de ids, lista de caminhos)
+        """
+        pasta = os.path.abspath(pasta)
+        linhas = self.conexao.execute(
+            "SELECT c.id, c.nome FROM cortes c JOIN pastas p ON p.id = c.pasta_id "
+            "WHERE p.caminho = ? ORDER BY c.nome", (pasta,)).fetchall()
+        ids = np.array([linha[0] for linha in linhas], dtype=np.int64)
+        return ids, [os.path.join(pasta, linha[1]) for linha in linhas]
+    
+    def consultar(self, onde="1", parametros=()):
+        """
+        Consulta livre sobre a tabela de cortes (ex: onde="label = ? AND duracao_ms > ?")
+        
+        Returns:
+            list: Tuplas (id, caminho, label, gravacao, onset_s, offset_s, duracao_ms, taxa)
+        """
+        return [(id_corte, os.path.join(pasta, nome), *resto) for id_corte, pasta, nome, *resto in
+                self.conexao.execute(
+                    "SELECT c.id, p.caminho, c.nome, c.label, c.gravacao, c.onset_s, c.offset_s, c.duracao_ms, "
+                    f"c.taxa FROM cortes c JOIN pastas p ON p.id = c.pasta_id WHERE {onde} ORDER BY c.id",
+                    parametros)]
+    
+    def fechar(self):
+        self.conexao.close()
+
+if __name__ == "__main__":
+    import sys
+    
+    caminho_db = sys.argv[1] if len(sys.argv) > 1 else 'catalogo.db'
+    catalogo = CatalogoCortes(caminho_db)
+    for pasta_raiz in sys.argv[2:] or ['J:\\croped_vocal']:
+        for label in catalogo.atualizar_raiz(pasta_raiz):
+            ids, _ = catalogo.listar(os.path.join(pasta_raiz, label))
+            print(f"{pasta_raiz} / {label}: {len(ids)} cortes")
+    catalogo.fechar()
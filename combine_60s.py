@@ -1,15 +1,25 @@
 import os
 import random
-import glob
 import numpy as np
 from pydub import AudioSegment
+from armazenamento import ArmazenamentoDisco
+from cache_artefatos import CacheArtefatos, versao_codigo, gerador
+from catalogo import CatalogoCortes
+from intensidade import AlvoNivel
+from anotacoes import carregar_anotacoes
+from rotulos import salvar_rotulos
+import instrumentacao
 import warnings
 import csv
 
 # Ignorar warnings específicos do Librosa
 warnings.filterwarnings("ignore", category=UserWarning)
 
-def criar_audios_60s(pasta_overlaps, pasta_background, pasta_saida, n_vocalizacoes=500):
+DURACAO_ALVO_MS = 60 * 1000  # 60 segundos em ms
+
+def criar_audios_60s(pasta_overlaps, pasta_background, pasta_saida, n_vocalizacoes=500, armazenamento=None,
+                     semente=None, pasta_cache=None, caminho_catalogo=None, caminho_intensidades=None,
+                     snr_db=None, rotulos_quadros=False):
     """
     Cria áudios de 60 segundos combinando sobreposições com intervalos de background aleatórios
     
@@ -18,94 +28,167 @@ def criar_audios_60s(pasta_overlaps, pasta_background, pasta_saida, n_vocalizaco
         pasta_background (str): Pasta com áudios de background (J:\\croped_vocal\\u)
         pasta_saida (str): Pasta para salvar os áudios finais de 60s
         n_vocalizacoes (int): Número de vocalizações de cada tipo a serem utilizadas (default: 500)
+        armazenamento: De onde ler overlaps/backgrounds e onde gravar os áudios (default: ArmazenamentoDisco)
+        semente (int): Se informada, cada áudio de 60s tem seu próprio gerador aleatório
+        pasta_cache (str): Armazém de artefatos (CacheArtefatos); áudios com as mesmas
+                           vocalizações, backgrounds e semente são reaproveitados (requer semente)
+        caminho_catalogo (str): Banco SQLite do catálogo de cortes; overlaps e backgrounds são
+                                listados pelo catálogo em vez de varrer as pastas
+        caminho_intensidades (str): Índice de intensidade (intensidade.py) de overlaps e backgrounds
+        snr_db (tuple): (min, max) em dB do nível de cada vocalização em relação à mediana
+                        dos backgrounds; requer o índice
+        rotulos_quadros (bool): Gravar também `audio_60s_XXX.wav.rotulos.npy` com os rótulos por
+                                quadro (uint8, quadros do hop do espectrograma x CLASSES_60S)
     """
+    if armazenamento is None:
+        armazenamento = ArmazenamentoDisco()
+    cache = None
+    if pasta_cache:
+        if semente is None:
+            print("Aviso: o cache de áudios de 60s requer uma semente; gerando sem cache")
+        else:
+            cache = CacheArtefatos(pasta_cache, versao_codigo(__file__))
+    alvo_nivel = AlvoNivel(caminho_intensidades, snr_db=snr_db) if caminho_intensidades and snr_db else None
     # Garantir que a pasta de saída existe
     os.makedirs(pasta_saida, exist_ok=True)
     
-    # Coletar todas as vocalizações por tipo
-    vocalizacoes_por_tipo = {}
+    catalogo = CatalogoCortes(caminho_catalogo) if caminho_catalogo else None
+    
+    def listar_wavs(pasta):
+        if catalogo is None:
+            return armazenamento.listar_wavs(pasta)
+        catalogo.atualizar(pasta)
+        return catalogo.listar(pasta)[1]
     
+    # Coletar todas as vocalizações por tipo
     print("Coletando vocalizações...")
-    for pasta in os.listdir(pasta_overlaps):
-        caminho_pasta = os.path.join(pasta_overlaps, pasta)
-        if os.path.isdir(caminho_pasta):
-            arquivos_wav = glob.glob(os.path.join(caminho_pasta, '*.wav'))
-            if arquivos_wav:
-                # Limitar ao número especificado de vocalizações
-                if len(arquivos_wav) > n_vocalizacoes:
-                    arquivos_wav = random.sample(arquivos_wav, n_vocalizacoes)
-                vocalizacoes_por_tipo[pasta] = arquivos_wav
-                print(f"Tipo {pasta}: {len(arquivos_wav)} vocalizações")
+    vocalizacoes_por_tipo = {}
+    pastas = catalogo.atualizar_raiz(pasta_overlaps) if catalogo else armazenamento.listar_pastas(pasta_overlaps)
+    for pasta in pastas:
+        vocalizacoes_por_tipo[pasta] = listar_wavs(os.path.join(pasta_overlaps, pasta))
+    lotes = agrupar_vocalizacoes(vocalizacoes_por_tipo, n_vocalizacoes, semente)
     
     # Coletar áudios de background
     print("Coletando áudios de background...")
-    arquivos_background = glob.glob(os.path.join(pasta_background, '*.wav'))
+    arquivos_background = listar_wavs(pasta_background)
+    if catalogo is not None:
+        catalogo.fechar()
     if not arquivos_background:
         print("Erro: Nenhum arquivo de background encontrado!")
         return
     
     print(f"Encontrados {len(arquivos_background)} arquivos de background")
+    duracao_alvo_ms = DURACAO_ALVO_MS
+    num_audios_necessarios = len(lotes)
     
-    # Criar lista única com todas as vocalizações
-    todas_vocalizacoes = []
-    for tipo, arquivos in vocalizacoes_por_tipo.items():
-        todas_vocalizacoes.extend(arquivos)
-    
-    print(f"Total de vocalizações: {len(todas_vocalizacoes)}")
-    
-    # Embaralhar as vocalizações para distribuição aleatória
-    random.shuffle(todas_vocalizacoes)
-    
-    # Calcular quantas vocalizações cabem em 60s e quantos áudios precisamos
-    duracao_alvo_ms = 60 * 1000  # 60 segundos em ms
-    intervalo_min_ms = 500  # 500 ms
-    intervalo_max_ms = 2000  # 2 segundos
-
-    # Estimar duração média das vocalizações (vamos assumir ~1.2s como estimativa)
-    duracao_media_vocalizacao_ms = 1200
-    intervalo_medio_ms = (intervalo_min_ms + intervalo_max_ms) / 2
-    
-    # Calcular quantas vocalizações cabem aproximadamente em 60s
-    vocalizacoes_por_audio = int(duracao_alvo_ms / (duracao_media_vocalizacao_ms + intervalo_medio_ms))
+    if cache is not None:
+        hashes_background = [cache.hash_clipe(arquivo, armazenamento) for arquivo in arquivos_background]
     
-    # Calcular quantos áudios de 60s precisamos
-    num_audios_necessarios = int(np.ceil(len(todas_vocalizacoes) / vocalizacoes_por_audio))
-    
-    print(f"Estimativa: ~{vocalizacoes_por_audio} vocalizações por áudio")
-    print(f"Criando {num_audios_necessarios} áudios de 60s")
+    # Ler antecipadamente as vocalizações dos próximos áudios (um grupo por áudio)
+    armazenamento.antecipar([tuple(lote) for lote in lotes])
     
     # Criar os áudios de 60s
     for i in range(num_audios_necessarios):
+        instrumentacao.progresso('combine_60s', i, num_audios_necessarios)
         print(f"\nCriando áudio {i+1}/{num_audios_necessarios}...")
         
         # Pegar o próximo lote de vocalizações
-        inicio_idx = i * vocalizacoes_por_audio
-        fim_idx = min((i + 1) * vocalizacoes_por_audio, len(todas_vocalizacoes))
-        vocalizacoes_lote = todas_vocalizacoes[inicio_idx:fim_idx]
-        
-        if not vocalizacoes_lote:
-            break
-            
+        vocalizacoes_lote = lotes[i]
         print(f"Processando {len(vocalizacoes_lote)} vocalizações...")
         
+        nome_arquivo = f"audio_60s_{i+1:03d}.wav"
+        caminho_saida = os.path.join(pasta_saida, nome_arquivo)
+        nome_csv = f"audio_60s_{i+1:03d}.wav.csv"
+        caminho_csv = os.path.join(pasta_saida, nome_csv)
+        rng = gerador(semente, 'audio_60s', i + 1)
+        
+        # Reaproveitar o áudio se as mesmas entradas já foram geradas
+        if cache is not None:
+            chave = cache.chave(
+                'audio_60s',
+                vocalizacoes=[[cache.hash_clipe(caminho, armazenamento), obter_label_do_caminho(caminho)]
+                              for caminho in vocalizacoes_lote],
+                backgrounds=hashes_background, duracao_ms=duracao_alvo_ms, semente=[semente, i + 1],
+                nivel=alvo_nivel.descricao() if alvo_nivel is not None else None
+            )
+            if cache.buscar(chave) is not None:
+                armazenamento.importar(cache.arquivo(chave, 'audio.wav'), caminho_saida)
+                cache.restaurar(chave, 'anotacoes.csv', caminho_csv)
+                if rotulos_quadros:
+                    linhas = carregar_anotacoes(caminho_csv).linhas()
+                    salvar_rotulos(caminho_saida, [{'onset_s': onset, 'offset_s': offset, 'label': label}
+                                                   for onset, offset, label in linhas], duracao_alvo_ms * 48)
+                instrumentacao.contar('audios_60s_reutilizados')
+                print(f"Áudio reaproveitado do cache: {nome_arquivo}")
+                continue
+        
         # Criar áudio de 60s
-        audio_60s, anotacoes = criar_audio_individual(vocalizacoes_lote, arquivos_background, duracao_alvo_ms)
+        audio_60s, anotacoes = criar_audio_individual(vocalizacoes_lote, arquivos_background, duracao_alvo_ms,
+                                                      armazenamento, rng, alvo_nivel)
         
         if audio_60s and anotacoes:
             # Salvar o áudio
-            nome_arquivo = f"audio_60s_{i+1:03d}.wav"
-            caminho_saida = os.path.join(pasta_saida, nome_arquivo)
-            audio_60s.export(caminho_saida, format="wav")
+            armazenamento.salvar(audio_60s, caminho_saida)
             
-            # Salvar o CSV de anotações
-            nome_csv = f"audio_60s_{i+1:03d}.wav.csv"
-            caminho_csv = os.path.join(pasta_saida, nome_csv)
-            salvar_anotacoes_csv(anotacoes, caminho_csv)
+            # Salvar o CSV de anotações (e guardar no cache, que precisa do CSV já gravado)
+            armazenamento.agendar_escrita(gravar_anotacoes, anotacoes, caminho_csv, audio_60s, nome_arquivo,
+                                          cache, chave if cache is not None else None, rotulos_quadros)
+            instrumentacao.contar('audios_60s')
             
             print(f"Áudio salvo: {nome_arquivo} (duração: {len(audio_60s)/1000:.1f}s)")
             print(f"Anotações salvas: {nome_csv} ({len(anotacoes)} vocalizações)")
         else:
             print(f"Erro ao criar áudio {i+1}")
+    
+    instrumentacao.progresso('combine_60s', num_audios_necessarios, num_audios_necessarios)
+    armazenamento.aguardar()
+    
+    if cache is not None:
+        cache.salvar_hashes()
+
+def agrupar_vocalizacoes(vocalizacoes_por_tipo, n_vocalizacoes, semente=None):
+    """
+    Sorteia até n_vocalizacoes de cada tipo, embaralha e divide em um lote por áudio de 60s
+    
+    Args:
+        vocalizacoes_por_tipo (dict): Tipo (pasta) -> caminhos das vocalizações, em ordem
+        n_vocalizacoes (int): Número de vocalizações de cada tipo
+        semente (int): Semente do gerador da seleção
+    
+    Returns:
+        list: Lista de lotes (listas de caminhos), um por áudio
+    """
+    rng_selecao = gerador(semente, 'audio_60s')
+    todas_vocalizacoes = []
+    for tipo, arquivos_wav in vocalizacoes_por_tipo.items():
+        if arquivos_wav:
+            # Limitar ao número especificado de vocalizações
+            if len(arquivos_wav) > n_vocalizacoes:
+                arquivos_wav = rng_selecao.sample(arquivos_wav, n_vocalizacoes)
+            todas_vocalizacoes.extend(arquivos_wav)
+            print(f"Tipo {tipo}: {len(arquivos_wav)} vocalizações")
+    
+    print(f"Total de vocalizações: {len(todas_vocalizacoes)}")
+    
+    # Embaralhar as vocalizações para distribuição aleatória
+    rng_selecao.shuffle(todas_vocalizacoes)
+    
+    # Calcular quantas vocalizações cabem em 60s e quantos áudios precisamos
+    intervalo_min_ms = 500  # 500 ms
+    intervalo_max_ms = 2000  # 2 segundos
+    
+    # Estimar duração média das vocalizações (vamos assumir ~1.2s como estimativa)
+    duracao_media_vocalizacao_ms = 1200
+    intervalo_medio_ms = (intervalo_min_ms + intervalo_max_ms) / 2
+    
+    # Calcular quantas vocalizações cabem aproximadamente em 60s
+    vocalizacoes_por_audio = int(DURACAO_ALVO_MS / (duracao_media_vocalizacao_ms + intervalo_medio_ms))
+    lotes = [todas_vocalizacoes[i:i + vocalizacoes_por_audio]
+             for i in range(0, len(todas_vocalizacoes), vocalizacoes_por_audio)]
+    
+    print(f"Estimativa: ~{vocalizacoes_por_audio} vocalizações por áudio")
+    print(f"Criando {len(lotes)} áudios de 60s")
+    return lotes
 
 def salvar_anotacoes_csv(anotacoes, caminho_csv):
     """
@@ -127,6 +210,20 @@ def salvar_anotacoes_csv(anotacoes, caminho_csv):
     except Exception as e:
         print(f"Erro ao salvar CSV de anotações: {str(e)}")
 
+def gravar_anotacoes(anotacoes, caminho_csv, audio_60s, nome_arquivo, cache=None, chave=None, rotulos_quadros=False):
+    """
+    Grava o CSV de anotações de um áudio de 60s (e, se pedido, os rótulos por quadro) e, com
+    cache, guarda áudio + CSV no armazém (executada em segundo plano com ArmazenamentoAssincrono)
+    """
+    with instrumentacao.medir('escrita'):
+        salvar_anotacoes_csv(anotacoes, caminho_csv)
+        if rotulos_quadros:
+            salvar_rotulos(caminho_csv[:-len('.csv')], anotacoes, int(audio_60s.frame_count()))
+    instrumentacao.registrar_escrita(caminho_csv)
+    if cache is not None:
+        cache.guardar(chave, {'audio.wav': audio_60s, 'anotacoes.csv': caminho_csv},
+                      {'nome': nome_arquivo, 'arquivos': ['anotacoes.csv', 'audio.wav']})
+
 def obter_label_do_caminho(caminho_vocalizacao):
     """
     Extrai o label baseado no nome da pasta da vocalização
@@ -152,7 +249,8 @@ def obter_label_do_caminho(caminho_vocalizacao):
     
     return mapeamento_labels.get(pasta_pai, 'u')  # 'u' como fallback
 
-def criar_audio_individual(vocalizacoes, arquivos_background, duracao_alvo_ms):
+def criar_audio_individual(vocalizacoes, arquivos_background, duracao_alvo_ms, armazenamento=None, rng=None,
+                           alvo_nivel=None):
     """
     Cria um único áudio de 60s com as vocalizações e intervalos de background
     
@@ -160,32 +258,50 @@ def criar_audio_individual(vocalizacoes, arquivos_background, duracao_alvo_ms):
         vocalizacoes (list): Lista de caminhos das vocalizações para este áudio
         arquivos_background (list): Lista de arquivos de background disponíveis
         duracao_alvo_ms (int): Duração alvo em milissegundos (60000 para 60s)
+        armazenamento: De onde ler vocalizações e backgrounds (default: ArmazenamentoDisco)
+        rng: Gerador aleatório (default: módulo random)
+        alvo_nivel (AlvoNivel): Se informado (com snr_db), cada vocalização é ajustada para um
+                                nível sorteado em relação aos backgrounds
     
     Returns:
         tuple: (AudioSegment, list) - Áudio final de 60s e lista de anotações, ou (None, None) se houver erro
     """
+    if armazenamento is None:
+        armazenamento = ArmazenamentoDisco()
+    if rng is None:
+        rng = random
     try:
         # Criar áudio base vazio
         audio_final = AudioSegment.silent(duration=0, frame_rate=48000)
         anotacoes = []  # Lista para armazenar as anotações
         
         # Carregar um áudio de background base para usar como template
-        background_base = AudioSegment.from_wav(random.choice(arquivos_background))
+        background_base = armazenamento.carregar(rng.choice(arquivos_background))
         if background_base.frame_rate != 48000:
-            background_base = background_base.set_frame_rate(48000)
+            with instrumentacao.medir('reamostragem'):
+                background_base = background_base.set_frame_rate(48000)
+        nivel_fundo = alvo_nivel.nivel_fundo(arquivos_background) if alvo_nivel is not None else None
         
         for i, caminho_vocalizacao in enumerate(vocalizacoes):
             try:
                 # Carregar a vocalização
-                vocalizacao = AudioSegment.from_wav(caminho_vocalizacao)
+                vocalizacao = armazenamento.carregar(caminho_vocalizacao)
                 if vocalizacao.frame_rate != 48000:
-                    vocalizacao = vocalizacao.set_frame_rate(48000)
+                    with instrumentacao.medir('reamostragem'):
+                        vocalizacao = vocalizacao.set_frame_rate(48000)
+                
+                # Ajustar o nível da vocalização em relação ao background (pelo índice)
+                nivel_vocalizacao = alvo_nivel.nivel(caminho_vocalizacao) if nivel_fundo is not None else None
+                if nivel_vocalizacao is not None:
+                    with instrumentacao.medir('mixagem'):
+                        vocalizacao = vocalizacao + (nivel_fundo + rng.uniform(*alvo_nivel.snr_db) - nivel_vocalizacao)
                 
                 # Registrar posição inicial da vocalização (em segundos)
                 onset_s = len(audio_final) / 1000.0
                 
                 # Adicionar a vocalização
-                audio_final += vocalizacao
+                with instrumentacao.medir('mixagem'):
+                    audio_final += vocalizacao
                 
                 # Registrar posição final da vocalização (em segundos)
                 offset_s = len(audio_final) / 1000.0
@@ -207,7 +323,7 @@ def criar_audio_individual(vocalizacoes, arquivos_background, duracao_alvo_ms):
                 # Adicionar intervalo de background (exceto na última vocalização)
                 if i < len(vocalizacoes) - 1:
                     # Gerar duração aleatória do intervalo (1-2s)
-                    duracao_intervalo = random.randint(1000, 2000)
+                    duracao_intervalo = rng.randint(1000, 2000)
                     
                     # Verificar se o intervalo não vai ultrapassar o tempo limite
                     tempo_restante = duracao_alvo_ms - len(audio_final)
@@ -220,12 +336,13 @@ def criar_audio_individual(vocalizacoes, arquivos_background, duracao_alvo_ms):
                     
                     # Pegar um segmento aleatório do background
                     background_segmento = obter_segmento_background_aleatorio(
-                        arquivos_background, duracao_intervalo
+                        arquivos_background, duracao_intervalo, armazenamento, rng
                     )
                     
                     if background_segmento:
-                        audio_final += background_segmento
-                
+                        with instrumentacao.medir('mixagem'):
+                            audio_final += background_segmento
+            
             except Exception as e:
                 print(f"Erro ao processar vocalização {os.path.basename(caminho_vocalizacao)}: {str(e)}")
                 continue
@@ -246,12 +363,12 @@ def criar_audio_individual(vocalizacoes, arquivos_background, duracao_alvo_ms):
                         anotacao['offset_s'] = duracao_final_s
                     anotacoes_ajustadas.append(anotacao)
             anotacoes = anotacoes_ajustadas
-            
+        
         elif len(audio_final) < duracao_alvo_ms:
             # Completar com background se necessário
             tempo_restante = duracao_alvo_ms - len(audio_final)
             background_final = obter_segmento_background_aleatorio(
-                arquivos_background, tempo_restante
+                arquivos_background, tempo_restante, armazenamento, rng
             )
             if background_final:
                 audio_final += background_final
@@ -262,29 +379,36 @@ def criar_audio_individual(vocalizacoes, arquivos_background, duracao_alvo_ms):
                 audio_final += AudioSegment.silent(duration=silencio_restante, frame_rate=48000)
         
         return audio_final, anotacoes
-        
+    
     except Exception as e:
         print(f"Erro ao criar áudio individual: {str(e)}")
         return None, None
 
-def obter_segmento_background_aleatorio(arquivos_background, duracao_ms):
+def obter_segmento_background_aleatorio(arquivos_background, duracao_ms, armazenamento=None, rng=None):
     """
     Obtém um segmento aleatório de background com a duração especificada
     
     Args:
         arquivos_background (list): Lista de arquivos de background
         duracao_ms (int): Duração desejada em milissegundos
+        armazenamento: De onde ler os backgrounds (default: ArmazenamentoDisco)
+        rng: Gerador aleatório (default: módulo random)
     
     Returns:
         AudioSegment: Segmento de background ou None se houver erro
     """
+    if armazenamento is None:
+        armazenamento = ArmazenamentoDisco()
+    if rng is None:
+        rng = random
     try:
         # Escolher arquivo de background aleatório
-        arquivo_bg = random.choice(arquivos_background)
-        background = AudioSegment.from_wav(arquivo_bg)
+        arquivo_bg = rng.choice(arquivos_background)
+        background = armazenamento.carregar(arquivo_bg)
         
         if background.frame_rate != 48000:
-            background = background.set_frame_rate(48000)
+            with instrumentacao.medir('reamostragem'):
+                background = background.set_frame_rate(48000)
         
         # Se o background é menor que a duração desejada, repetir
         if len(background) < duracao_ms:
@@ -294,13 +418,13 @@ def obter_segmento_background_aleatorio(arquivos_background, duracao_ms):
         # Escolher ponto de início aleatório
         if len(background) > duracao_ms:
             inicio_max = len(background) - duracao_ms
-            inicio = random.randint(0, inicio_max)
+            inicio = rng.randint(0, inicio_max)
             segmento = background[inicio:inicio + duracao_ms]
         else:
             segmento = background
         
         return segmento
-        
+    
     except Exception as e:
         print(f"Erro ao obter segmento de background: {str(e)}")
         return None
@@ -1,8 +1,10 @@
 import os
 from pydub import AudioSegment
-import csv
+from anotacoes import carregar_anotacoes
+from armazenamento import ArmazenamentoDisco, ler_cabecalho_wav, fatiar_trechos
+import instrumentacao
 
-def cortar_audios(pasta_entrada, pasta_saida, labels):
+def cortar_audios(pasta_entrada, pasta_saida, labels, armazenamento=None, virtual=False):
     """
     Corta trechos de áudio baseados em um CSV de referência e exporta para 48kHz.
     Cada label é salva em uma pasta separada.
@@ -11,21 +13,29 @@ def cortar_audios(pasta_entrada, pasta_saida, labels):
         pasta_entrada (str): Caminho da pasta com arquivos .wav e .csv
         pasta_saida (str): Caminho da pasta para salvar os áudios cortados
         labels (list): Lista de labels a serem extraídas (ex: ['p', 'l'])
+        armazenamento: Onde gravar os cortes (default: ArmazenamentoDisco)
+        virtual (bool): Não gravar os WAVs: cada pasta de label recebe só o manifesto
+                        `cortes_virtuais.csv` (gravação + trecho em quadros), e os cortes
+                        são lidos da gravação original quando usados
     """
+    if armazenamento is None:
+        armazenamento = ArmazenamentoDisco()
     
     # Garante que a pasta de saída existe
-    os.makedirs(pasta_saida, exist_ok=True)
+    armazenamento.criar_pasta(pasta_saida)
     
     # Cria uma pasta para cada label
     for label in labels:
         pasta_label = os.path.join(pasta_saida, label)
-        os.makedirs(pasta_label, exist_ok=True)
+        armazenamento.criar_pasta(pasta_label)
+    
+    referencias = {label: {} for label in labels}  # Cortes virtuais por label
     
     # Processa cada arquivo WAV na pasta de entrada
-    for arquivo in os.listdir(pasta_entrada):
-        if not arquivo.lower().endswith('.wav'):
-            continue
-            
+    arquivos = [arquivo for arquivo in os.listdir(pasta_entrada) if arquivo.lower().endswith('.wav')]
+    for indice, arquivo in enumerate(arquivos):
+        instrumentacao.progresso('crop', indice, len(arquivos))
+        
         base_nome = os.path.splitext(arquivo)[0]
         caminho_wav = os.path.join(pasta_entrada, arquivo)
         caminho_csv = os.path.join(pasta_entrada, f"{base_nome}.wav.csv")
@@ -33,51 +43,69 @@ def cortar_audios(pasta_entrada, pasta_saida, labels):
         # Verifica se o CSV correspondente existe
         if not os.path.exists(caminho_csv):
             continue
-            
-        # Carrega o áudio original
-        audio = AudioSegment.from_wav(caminho_wav)
-        
-        # Processa o arquivo CSV
-        with open(caminho_csv, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for linha in reader:
-                label = linha.get('label', '').strip() if linha.get('label') else ''
+        
+        if virtual:
+            # Só o cabeçalho: os trechos são calculados em quadros, sem decodificar
+            _, n_quadros, _, _, taxa = ler_cabecalho_wav(caminho_wav)
+        else:
+            # Carrega o áudio original
+            with instrumentacao.medir('decodificacao'):
+                audio = AudioSegment.from_wav(caminho_wav)
+            instrumentacao.registrar_leitura(caminho_wav)
+        
+        # Carrega as anotações já validadas, apenas com as labels desejadas
+        try:
+            anotacoes = carregar_anotacoes(caminho_csv).filtrar(labels)
+        except (ValueError, OSError) as e:
+            print(f"Erro no arquivo {base_nome}: {str(e)}")
+            continue
+        
+        for onset, offset, label in anotacoes.linhas():
+            try:
+                # Arredonda os tempos
+                onset = round(onset, 3)
+                offset = round(offset, 3)
                 
-                # Verifica se a label está na lista desejada
-                if not label or label not in labels:
+                # Calcula durações em milissegundos
+                inicio_ms = int(onset * 1000)
+                fim_ms = int(offset * 1000)
+                
+                # Gera nome do arquivo de saída
+                nome_saida = f"{base_nome}_{onset:.3f}_{offset:.3f}.wav"
+                
+                if virtual:
+                    referencias[label][nome_saida] = (caminho_wav,
+                                                      fatiar_trechos([(0, n_quadros)], taxa, inicio_ms, fim_ms))
+                    instrumentacao.contar('cortes')
                     continue
-                    
-                try:
-                    # Converte tempos para float e arredonda
-                    onset = round(float(linha['onset_s']), 3)
-                    offset = round(float(linha['offset_s']), 3)
-                    
-                    # Calcula durações em milissegundos
-                    inicio_ms = int(onset * 1000)
-                    fim_ms = int(offset * 1000)
-                    
-                    # Corta o áudio
-                    corte = audio[inicio_ms:fim_ms]
-                    
-                    # Define sample rate para 48kHz
-                    if corte.frame_rate != 48000:
+                
+                # Corta o áudio
+                corte = audio[inicio_ms:fim_ms]
+                
+                # Define sample rate para 48kHz
+                if corte.frame_rate != 48000:
+                    with instrumentacao.medir('reamostragem'):
                         corte = corte.set_frame_rate(48000)
-                    
-                    # Gera nome do arquivo de saída
-                    nome_saida = f"{base_nome}_{onset:.3f}_{offset:.3f}.wav"
-                    
-                    # Define pasta específica para a label
-                    pasta_label = os.path.join(pasta_saida, label)
-                    caminho_saida = os.path.join(pasta_label, nome_saida)
-                    
-                    # Exporta o áudio
-                    corte.export(caminho_saida, format='wav')
-                    
-                except (ValueError, KeyError) as e:
-                    print(f"Erro no arquivo {base_nome}: {str(e)}")
-                    continue
+                
+                # Define pasta específica para a label
+                pasta_label = os.path.join(pasta_saida, label)
+                caminho_saida = os.path.join(pasta_label, nome_saida)
+                
+                # Exporta o áudio
+                armazenamento.salvar(corte, caminho_saida)
+                instrumentacao.contar('cortes')
+                
+            except (ValueError, KeyError) as e:
+                print(f"Erro no arquivo {base_nome}: {str(e)}")
+                continue
+    
+    if virtual:
+        for label in labels:
+            armazenamento.salvar_referencias(os.path.join(pasta_saida, label), referencias[label])
+    
+    instrumentacao.progresso('crop', len(arquivos), len(arquivos))
 
-def cortar_background(pasta_entrada, pasta_saida):
+def cortar_background(pasta_entrada, pasta_saida, armazenamento=None, virtual=False):
     """
     Corta trechos de áudio sem vocalização (background) e exporta para 48kHz.
     Para cada áudio, cria apenas um arquivo de background removendo todas as vocalizações.
@@ -86,20 +114,26 @@ def cortar_background(pasta_entrada, pasta_saida):
     Args:
         pasta_entrada (str): Caminho da pasta com arquivos .wav e .csv
         pasta_saida (str): Caminho da pasta para salvar os áudios de background
+        armazenamento: Onde gravar os backgrounds (default: ArmazenamentoDisco)
+        virtual (bool): Gravar só o manifesto `u/cortes_virtuais.csv` com os trechos sem
+                        vocalização de cada gravação, em vez dos WAVs
     """
+    if armazenamento is None:
+        armazenamento = ArmazenamentoDisco()
     
     # Garante que a pasta de saída existe
-    os.makedirs(pasta_saida, exist_ok=True)
+    armazenamento.criar_pasta(pasta_saida)
     
     # Cria pasta para background audio
     pasta_background = os.path.join(pasta_saida, 'u')
-    os.makedirs(pasta_background, exist_ok=True)
+    armazenamento.criar_pasta(pasta_background)
+    referencias = {}
     
     # Processa cada arquivo WAV na pasta de entrada
-    for arquivo in os.listdir(pasta_entrada):
-        if not arquivo.lower().endswith('.wav'):
-            continue
-            
+    arquivos = [arquivo for arquivo in os.listdir(pasta_entrada) if arquivo.lower().endswith('.wav')]
+    for indice, arquivo in enumerate(arquivos):
+        instrumentacao.progresso('background', indice, len(arquivos))
+        
         base_nome = os.path.splitext(arquivo)[0]
         caminho_wav = os.path.join(pasta_entrada, arquivo)
         caminho_csv = os.path.join(pasta_entrada, f"{base_nome}.wav.csv")
@@ -107,40 +141,55 @@ def cortar_background(pasta_entrada, pasta_saida):
         # Verifica se o CSV correspondente existe
         if not os.path.exists(caminho_csv):
             continue
-            
-        # Carrega o áudio original
-        audio = AudioSegment.from_wav(caminho_wav)
-        audio_background = audio  # Copia o áudio original
+        
+        if virtual:
+            # O background é só a lista de trechos (em quadros) que sobram da gravação
+            _, n_quadros, _, _, taxa = ler_cabecalho_wav(caminho_wav)
+            trechos = [(0, n_quadros)]
+        else:
+            # Carrega o áudio original
+            with instrumentacao.medir('decodificacao'):
+                audio = AudioSegment.from_wav(caminho_wav)
+            instrumentacao.registrar_leitura(caminho_wav)
+            audio_background = audio  # Copia o áudio original
         
         # Coleta todos os intervalos vocalizados
         intervalos_vocalizados = []
         
-        with open(caminho_csv, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for linha in reader:
-                try:
-                    onset = round(float(linha['onset_s']), 3)
-                    offset = round(float(linha['offset_s']), 3)
-                    
-                    inicio_ms = int(onset * 1000)
-                    fim_ms = int(offset * 1000)
-                    
-                    intervalos_vocalizados.append((inicio_ms, fim_ms))
-                    
-                except (ValueError, KeyError):
-                    continue
+        try:
+            anotacoes = carregar_anotacoes(caminho_csv)
+        except (ValueError, OSError) as e:
+            print(f"Erro no arquivo {base_nome}: {str(e)}")
+            continue
+        
+        for onset, offset, _ in anotacoes.linhas():
+            inicio_ms = int(round(onset, 3) * 1000)
+            fim_ms = int(round(offset, 3) * 1000)
+            
+            intervalos_vocalizados.append((inicio_ms, fim_ms))
         
         # Ordena intervalos por tempo de início (do maior para o menor para remoção)
         intervalos_vocalizados.sort(key=lambda x: x[0], reverse=True)
         
-        # Remove cada intervalo vocalizado do áudio (do fim para o início)
-        for inicio_ms, fim_ms in intervalos_vocalizados:
-            try:
-                # Remove o segmento vocalizado
-                audio_background = audio_background[:inicio_ms] + audio_background[fim_ms:]
-            except Exception as e:
-                print(f"Erro ao remover segmento {inicio_ms}-{fim_ms} do arquivo {base_nome}: {str(e)}")
+        if virtual:
+            # Mesmos cortes do caminho abaixo, feitos sobre a lista de trechos
+            for inicio_ms, fim_ms in intervalos_vocalizados:
+                trechos = fatiar_trechos(trechos, taxa, 0, inicio_ms) + fatiar_trechos(trechos, taxa, fim_ms)
+            if round(1000 * sum(fim - inicio for inicio, fim in trechos) / taxa) < 100:
+                print(f"Arquivo {base_nome} não tem background suficiente após remoção das vocalizações")
                 continue
+            referencias[f"{base_nome}_background.wav"] = (caminho_wav, trechos)
+            continue
+        
+        # Remove cada intervalo vocalizado do áudio (do fim para o início)
+        with instrumentacao.medir('mixagem'):
+            for inicio_ms, fim_ms in intervalos_vocalizados:
+                try:
+                    # Remove o segmento vocalizado
+                    audio_background = audio_background[:inicio_ms] + audio_background[fim_ms:]
+                except Exception as e:
+                    print(f"Erro ao remover segmento {inicio_ms}-{fim_ms} do arquivo {base_nome}: {str(e)}")
+                    continue
         
         # Verifica se ainda há áudio restante
         if len(audio_background) < 100:  # Menos de 100ms
@@ -150,19 +199,25 @@ def cortar_background(pasta_entrada, pasta_saida):
         try:
             # Define sample rate para 48kHz
             if audio_background.frame_rate != 48000:
-                audio_background = audio_background.set_frame_rate(48000)
+                with instrumentacao.medir('reamostragem'):
+                    audio_background = audio_background.set_frame_rate(48000)
             
             # Gera nome do arquivo de saída
             nome_saida = f"{base_nome}_background.wav"
             caminho_saida = os.path.join(pasta_background, nome_saida)
             
             # Exporta o áudio
-            audio_background.export(caminho_saida, format='wav')
+            armazenamento.salvar(audio_background, caminho_saida)
             print(f"Background salvo: {nome_saida}")
             
         except Exception as e:
             print(f"Erro ao salvar background do arquivo {base_nome}: {str(e)}")
             continue
+    
+    if virtual:
+        armazenamento.salvar_referencias(pasta_background, referencias)
+    
+    instrumentacao.progresso('background', len(arquivos), len(arquivos))
 
 if __name__ == "__main__":
     cortar_audios(r"H:\Users\Firmino\ALL_DATA",
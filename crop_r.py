@@ -1,6 +1,6 @@
 import os
 from pydub import AudioSegment
-import csv
+from anotacoes import carregar_anotacoes
 
 def cortar_audios(pasta_entrada, pasta_saida, labels):
     """
@@ -37,45 +37,42 @@ def cortar_audios(pasta_entrada, pasta_saida, labels):
         # Carrega o áudio original
         audio = AudioSegment.from_wav(caminho_wav)
         
-        # Processa o arquivo CSV - primeiro lê todas as linhas
-        with open(caminho_csv, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            linhas = list(reader)
+        # Carrega as anotações (todas as labels, para que outras labels quebrem os grupos)
+        try:
+            linhas = list(carregar_anotacoes(caminho_csv).linhas())
+        except (ValueError, OSError) as e:
+            print(f"Erro no arquivo {base_nome}: {str(e)}")
+            continue
         
         # Agrupa "r" consecutivos (até 5)
         grupos_r = []
         i = 0
         while i < len(linhas):
-            linha = linhas[i]
-            label = linha.get('label', '').strip() if linha.get('label') else ''
+            _, _, label = linhas[i]
             
             # Se não for uma label desejada, pula
-            if not label or label not in labels:
+            if label not in labels:
                 i += 1
                 continue
             
             # Inicia um grupo de "r" consecutivos
-            grupo = [linha]
+            grupo = [linhas[i]]
             j = i + 1
             
             # Verifica as próximas linhas para adicionar ao grupo (máximo 5)
             while j < len(linhas) and len(grupo) < 5:
-                proxima_label = linhas[j].get('label', '').strip() if linhas[j].get('label') else ''
+                onset_proximo, _, proxima_label = linhas[j]
                 if proxima_label in labels:
                     # Verifica a distância entre o offset da última linha do grupo e o onset da próxima
-                    try:
-                        offset_anterior = float(grupo[-1]['offset_s'])
-                        onset_proximo = float(linhas[j]['onset_s'])
-                        distancia = onset_proximo - offset_anterior
-                        
-                        # Se a distância for maior que 1 segundo, não adiciona ao grupo
-                        if distancia > 1.0:
-                            break
-                        
-                        grupo.append(linhas[j])
-                        j += 1
-                    except (ValueError, KeyError):
+                    offset_anterior = grupo[-1][1]
+                    distancia = onset_proximo - offset_anterior
+                    
+                    # Se a distância for maior que 1 segundo, não adiciona ao grupo
+                    if distancia > 1.0:
                         break
+                    
+                    grupo.append(linhas[j])
+                    j += 1
                 else:
                     break
             
@@ -86,8 +83,8 @@ def cortar_audios(pasta_entrada, pasta_saida, labels):
         for grupo in grupos_r:
             try:
                 # Pega o onset do primeiro e offset do último
-                onset = round(float(grupo[0]['onset_s']), 3)
-                offset = round(float(grupo[-1]['offset_s']), 3)
+                onset = round(grupo[0][0], 3)
+                offset = round(grupo[-1][1], 3)
                 
                 # Calcula durações em milissegundos
                 inicio_ms = int(onset * 1000)
@@ -0,0 +1,207 @@
+import os
+import re
+import csv
+import random
+import shutil
+import argparse
+
+# Trecho "{base}_{onset}_{offset}" (com sufixo "_nK" opcional do crop_r.py) no nome de um corte.
+# Overlaps têm dois trechos no nome ({corte1}_{corte2}_{taxa}), e ambos são considerados.
+PADRAO_TRECHO = re.compile(r'(.+?)_(\d+\.\d{3})_(\d+\.\d{3})(?:_n\d+)?(?=_|$)')
+
+def gravacoes_de_origem(nome_arquivo):
+    """
+    Extrai as gravações de origem do nome de um corte ou overlap
+    
+    Ex: 'audio1_12.345_13.000.wav' -> ['audio1']
+        'audio1_1.000_2.000_audio7_3.000_4.000_0p150.wav' -> ['audio1', 'audio7']
+    
+    Args:
+        nome_arquivo (str): Nome do arquivo (com ou sem extensão)
+    
+    Returns:
+        list: Gravações de origem (o próprio nome se não seguir o padrão)
+    """
+    nome = os.path.splitext(os.path.basename(nome_arquivo))[0]
+    gravacoes = []
+    for trecho in PADRAO_TRECHO.finditer(nome):
+        gravacoes.append(trecho.group(1).lstrip('_'))
+    return gravacoes or [nome]
+
+def _agrupar(arquivos):
+    """
+    Agrupa arquivos que compartilham alguma gravação de origem (union-find),
+    de modo que overlaps ligam as gravações dos dois cortes
+    
+    Returns:
+        list: Id do grupo de cada arquivo
+    """
+    pai = {}
+    
+    def raiz(x):
+        while pai[x] != x:
+            pai[x] = pai[pai[x]]
+            x = pai[x]
+        return x
+    
+    origens = []
+    for caminho, _ in arquivos:
+        gravacoes = gravacoes_de_origem(caminho)
+        origens.append(gravacoes)
+        for gravacao in gravacoes:
+            pai.setdefault(gravacao, gravacao)
+        for gravacao in gravacoes[1:]:
+            pai[raiz(gravacao)] = raiz(gravacoes[0])
+    
+    return [raiz(gravacoes[0]) for gravacoes in origens]
+
+def dividir_por_gravacao(arquivos, proporcoes, semente=0):
+    """
+    Divide arquivos rotulados em partições estratificadas por label, mantendo
+    todos os cortes de uma mesma gravação de origem na mesma partição
+    
+    Os grupos são atribuídos de forma gulosa (maiores primeiro, empates em ordem
+    aleatória) à partição em que o erro quadrático em relação à proporção alvo,
+    somado sobre as labels, menos aumenta.
+    
+    Args:
+        arquivos (list): Lista de (caminho, label)
+        proporcoes (dict): Partição -> fração (ex: {'train': 0.85, 'test': 0.15})
+        semente (int): Semente do embaralhamento
+    
+    Returns:
+        list: Lista de (caminho, label, grupo, partição)
+    """
+    grupos = _agrupar(arquivos)
+    total_label = {}
+    contagem_grupo = {}
+    for (_, label), grupo in zip(arquivos, grupos):
+        total_label[label] = total_label.get(label, 0) + 1
+        contagem_grupo.setdefault(grupo, {})
+        contagem_grupo[grupo][label] = contagem_grupo[grupo].get(label, 0) + 1
+    
+    soma = sum(proporcoes.values())
+    alvo = {particao: {label: total * fracao / soma for label, total in total_label.items()}
+            for particao, fracao in proporcoes.items()}
+    contagem = {particao: {label: 0 for label in total_label} for particao in proporcoes}
+    
+    rng = random.Random(semente)
+    ordem = sorted(contagem_grupo)
+    rng.shuffle(ordem)
+    ordem.sort(key=lambda grupo: sum(contagem_grupo[grupo].values()), reverse=True)
+    
+    particao_do_grupo = {}
+    for grupo in ordem:
+        melhor, melhor_custo = None, None
+        for particao in proporcoes:
+            custo = 0.0
+            for label, n in contagem_grupo[grupo].items():
+                atual = contagem[particao][label] - alvo[particao][label]
+                custo += ((atual + n) ** 2 - atual ** 2) / total_label[label]
+            if melhor_custo is None or custo < melhor_custo:
+                melhor, melhor_custo = particao, custo
+        particao_do_grupo[grupo] = melhor
+        for label, n in contagem_grupo[grupo].items():
+            contagem[melhor][label] += n
+    
+    return [(caminho, label, grupo, particao_do_grupo[grupo])
+            for (caminho, label), grupo in zip(arquivos, grupos)]
+
+def _vincular(origem, destino, modo):
+    """
+    Cria o arquivo de destino sem copiar dados (hardlink ou symlink)
+    
+    Se o hardlink não for possível (ex: volumes diferentes), usa symlink.
+    """
+    if os.path.lexists(destino):
+        os.remove(destino)
+    if modo == 'hardlink':
+        try:
+            os.link(origem, destino)
+            return
+        except OSError:
+            pass
+    os.symlink(os.path.abspath(origem), destino)
+
+def criar_divisao(pasta_entrada, pasta_saida, labels=None, proporcoes=None, modo='hardlink', semente=0):
+    """
+    Divide os cortes de `pasta_entrada/<label>/*.wav` em partições agrupadas por
+    gravação de origem, sem copiar os arquivos
+    
+    Args:
+        pasta_entrada (str): Pasta com uma subpasta por label (ex: croped_calls_train)
+        pasta_saida (str): Pasta de saída
+        labels (list): Labels a incluir (default: todas as subpastas)
+        proporcoes (dict): Partição -> fração (default: {'train': 0.85, 'test': 0.15})
+        modo (str): 'hardlink', 'symlink' (pasta_saida/<partição>/<label>/...) ou
+                    'indice' (apenas os arquivos <partição>.csv)
+        semente (int): Semente da divisão
+    
+    Returns:
+        list: Lista de (caminho, label, grupo, partição)
+    """
+    if proporcoes is None:
+        proporcoes = {'train': 0.85, 'test': 0.15}
+    if modo not in ('hardlink', 'symlink', 'indice'):
+        raise ValueError(f"Modo desconhecido: {modo}")
+    if labels is None:
+        labels = sorted(nome for nome in os.listdir(pasta_entrada)
+                        if os.path.isdir(os.path.join(pasta_entrada, nome)))
+    
+    # Coletar arquivos por label (scandir evita um stat extra por arquivo)
+    arquivos = []
+    for label in labels:
+        pasta_label = os.path.join(pasta_entrada, label)
+        if not os.path.isdir(pasta_label):
+            print(f"Aviso: pasta da label '{label}' não encontrada")
+            continue
+        with os.scandir(pasta_label) as entradas:
+            arquivos.extend((entrada.path, label) for entrada in entradas
+                            if entrada.is_file() and entrada.name.lower().endswith('.wav'))
+    arquivos.sort()
+    
+    divisao = dividir_por_gravacao(arquivos, proporcoes, semente)
+    
+    # Índices: um CSV por partição (caminho, label, gravação de origem)
+    os.makedirs(pasta_saida, exist_ok=True)
+    for particao in proporcoes:
+        with open(os.path.join(pasta_saida, f"{particao}.csv"), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['caminho', 'label', 'gravacao'])
+            for caminho, label, grupo, particao_arquivo in divisao:
+                if particao_arquivo == particao:
+                    writer.writerow([os.path.abspath(caminho), label, grupo])
+    
+    if modo != 'indice':
+        for particao in proporcoes:
+            for label in labels:
+                pasta_destino = os.path.join(pasta_saida, particao, label)
+                shutil.rmtree(pasta_destino, ignore_errors=True)
+                os.makedirs(pasta_destino)
+        for caminho, label, _, particao in divisao:
+            _vincular(caminho, os.path.join(pasta_saida, particao, label, os.path.basename(caminho)), modo)
+    
+    # Resumo no mesmo formato usado pela ferramenta de divisão anterior
+    n_grupos = len({grupo for _, _, grupo, _ in divisao})
+    print(f"{len(divisao)} arquivos de {n_grupos} gravações de origem")
+    for label in labels:
+        partes = []
+        for particao in proporcoes:
+            n = sum(1 for _, l, _, p in divisao if l == label and p == particao)
+            partes.append(f"{n} {particao}")
+        print(f"Label '{label}': {', '.join(partes)}")
+    
+    return divisao
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Divisão treino/teste agrupada por gravação de origem")
+    parser.add_argument('pasta_entrada', help="Pasta com uma subpasta por label")
+    parser.add_argument('pasta_saida', help="Pasta de saída")
+    parser.add_argument('--labels', nargs='+', default=None)
+    parser.add_argument('--treino', type=float, default=0.85, help="Fração de treino")
+    parser.add_argument('--modo', choices=['hardlink', 'symlink', 'indice'], default='hardlink')
+    parser.add_argument('--semente', type=int, default=0)
+    args = parser.parse_args()
+    
+    criar_divisao(args.pasta_entrada, args.pasta_saida, args.labels,
+                  {'train': args.treino, 'test': 1 - args.treino}, args.modo, args.semente)
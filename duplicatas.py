@@ -0,0 +1,180 @@
+import os
+import json
+import glob
+import hashlib
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from armazenamento import ler_cabecalho_wav
+import instrumentacao
+
+# Quadros decodificados por bloco no hash (o arquivo nunca é lido inteiro de uma vez)
+QUADROS_POR_BLOCO = 1 << 16
+
+def _amostras(dados, largura):
+    """Bytes PCM -> amostras inteiras com sinal (int32)"""
+    if largura == 1:
+        return np.frombuffer(dados, dtype=np.uint8).astype(np.int32) - 128
+    if largura == 3:
+        bytes_amostras = np.frombuffer(dados, dtype=np.uint8).reshape(-1, 3)
+        return np.hstack([np.zeros((len(bytes_amostras), 1), dtype=np.uint8), bytes_amostras]
+                         ).copy().view('<i4').ravel() >> 8
+    return np.frombuffer(dados, dtype={2: '<i2', 4: '<i4'}[largura]).astype(np.int32)
+
+def _ler_bloco(f, offset, tamanho_quadro, n_quadros, bloco):
+    f.seek(offset + bloco * QUADROS_POR_BLOCO * tamanho_quadro)
+    restantes = max(0, n_quadros - bloco * QUADROS_POR_BLOCO)
+    return f.read(min(QUADROS_POR_BLOCO, restantes) * tamanho_quadro)
+
+def assinatura_rapida(caminho):
+    """
+    Assinatura barata de um corte, lida só do cabeçalho: (taxa, canais, largura, número de quadros).
+    Cortes com assinaturas diferentes não podem ter as mesmas amostras.
+    """
+    _, n_quadros, canais, largura, taxa = ler_cabecalho_wav(caminho)
+    return taxa, canais, largura, n_quadros
+
+def energia_inicial(caminho):
+    """Norma (raiz da soma dos quadrados) do primeiro bloco de amostras; segundo filtro antes da comparação"""
+    offset, n_quadros, canais, largura, _ = ler_cabecalho_wav(caminho)
+    with open(caminho, 'rb') as f:
+        amostras = _amostras(_ler_bloco(f, offset, canais * largura, n_quadros, 0), largura).astype(np.float64)
+    return float(np.sqrt(np.dot(amostras, amostras))), len(amostras)
+
+def hash_amostras(caminho):
+    """
+    Hash BLAKE2b das amostras decodificadas (não dos bytes do arquivo: cabeçalhos e chunks
+    extras diferentes não importam), calculado bloco a bloco
+    """
+    offset, n_quadros, canais, largura, taxa = ler_cabecalho_wav(caminho)
+    h = hashlib.blake2b(f"{taxa}|{canais}".encode(), digest_size=20)
+    with open(caminho, 'rb') as f:
+        for bloco in range((n_quadros + QUADROS_POR_BLOCO - 1) // QUADROS_POR_BLOCO):
+            h.update(_amostras(_ler_bloco(f, offset, canais * largura, n_quadros, bloco), largura).tobytes())
+    instrumentacao.contar('bytes_lidos', n_quadros * canais * largura)
+    return h.hexdigest()
+
+def quase_iguais(caminho1, caminho2, tolerancia):
+    """
+    Compara dois cortes com a mesma assinatura bloco a bloco, parando no primeiro bloco
+    com alguma amostra diferindo mais que `tolerancia`
+    """
+    offset1, n_quadros, canais, largura, _ = ler_cabecalho_wav(caminho1)
+    offset2 = ler_cabecalho_wav(caminho2)[0]
+    with open(caminho1, 'rb') as f1, open(caminho2, 'rb') as f2:
+        for bloco in range((n_quadros + QUADROS_POR_BLOCO - 1) // QUADROS_POR_BLOCO):
+            amostras1 = _amostras(_ler_bloco(f1, offset1, canais * largura, n_quadros, bloco), largura)
+            amostras2 = _amostras(_ler_bloco(f2, offset2, canais * largura, n_quadros, bloco), largura)
+            if np.max(np.abs(amostras1.astype(np.int64) - amostras2), initial=0) > tolerancia:
+                return False
+    return True
+
+def _separar_grupos(grupos, tolerancia):
+    """
+    Grupos de cortes com a mesma assinatura rápida -> grupos de duplicatas, o primeiro de cada
+    grupo (em ordem de nome) sendo o corte mantido
+    """
+    duplicatas = []
+    for grupo in grupos:
+        try:
+            with instrumentacao.medir('decodificacao'):
+                if tolerancia == 0:
+                    # Iguais: mesma energia no primeiro bloco e mesmo hash de todas as amostras
+                    por_energia = defaultdict(list)
+                    for caminho in grupo:
+                        por_energia[energia_inicial(caminho)].append(caminho)
+                    por_hash = defaultdict(list)
+                    for candidatos in por_energia.values():
+                        for caminho in candidatos if len(candidatos) > 1 else ():
+                            por_hash[hash_amostras(caminho)].append(caminho)
+                    duplicatas.extend(sorted(iguais) for iguais in por_hash.values() if len(iguais) > 1)
+                    continue
+                
+                # Quase iguais: se nenhuma amostra difere mais que a tolerância, as normas do primeiro
+                # bloco diferem no máximo tolerancia * raiz(amostras); só esses pares são comparados
+                mantidos = []
+                for caminho in sorted(grupo):
+                    norma, n_amostras = energia_inicial(caminho)
+                    for norma_mantido, iguais in mantidos:
+                        if (abs(norma - norma_mantido) <= tolerancia * np.sqrt(n_amostras)
+                                and quase_iguais(iguais[0], caminho, tolerancia)):
+                            iguais.append(caminho)
+                            break
+                    else:
+                        mantidos.append((norma, [caminho]))
+                duplicatas.extend(iguais for _, iguais in mantidos if len(iguais) > 1)
+        except Exception as e:
+            print(f"Erro ao comparar {os.path.basename(grupo[0])}: {str(e)}")
+    return duplicatas
+
+def encontrar_duplicatas(pastas, caminho_saida=None, n_workers=None, tolerancia=0, grupos_por_tarefa=64):
+    """
+    Encontra cortes com as mesmas amostras dentro de cada pasta de label (recursivamente,
+    só comparando arquivos da mesma pasta). Só os cortes com a mesma assinatura do cabeçalho
+    e energia compatível no primeiro bloco têm o áudio inteiro decodificado e comparado.
+    
+    Args:
+        pastas (list): Pastas de cortes (ex: J:\\croped_vocal, com uma subpasta por label)
+        caminho_saida (str): JSON com a lista de exclusão (caminho_duplicatas do overlap.py)
+        n_workers (int): Processos em paralelo (default: os.cpu_count())
+        tolerancia (int): Diferença máxima por amostra (em unidades da amostra inteira) para
+                          considerar dois cortes iguais; 0 exige amostras idênticas (comparadas
+                          por hash), valores pequenos pegam cópias reexportadas com dither
+        grupos_por_tarefa (int): Grupos de candidatos por tarefa
+    
+    Returns:
+        dict: Caminho absoluto de cada duplicata -> corte mantido no lugar dela (o primeiro em ordem de nome)
+    """
+    candidatos = defaultdict(list)
+    for pasta in pastas:
+        for caminho in sorted(glob.glob(os.path.join(pasta, '**', '*.wav'), recursive=True)):
+            caminho = os.path.abspath(caminho)
+            try:
+                candidatos[(os.path.dirname(caminho), assinatura_rapida(caminho))].append(caminho)
+            except Exception as e:
+                print(f"Erro ao ler cabeçalho de {os.path.basename(caminho)}: {str(e)}")
+    grupos = [grupo for grupo in candidatos.values() if len(grupo) > 1]
+    print(f"{sum(len(grupo) for grupo in grupos)} cortes com assinatura repetida ({len(grupos)} grupos)")
+    
+    lotes = [grupos[i:i + grupos_por_tarefa] for i in range(0, len(grupos), grupos_por_tarefa)]
+    iguais = []
+    if n_workers == 1 or len(lotes) <= 1:
+        for lote in lotes:
+            iguais.extend(_separar_grupos(lote, tolerancia))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            for resultado in executor.map(_separar_grupos, lotes, [tolerancia] * len(lotes)):
+                iguais.extend(resultado)
+    
+    duplicatas = {}
+    for grupo in iguais:
+        mantido, *repetidos = grupo
+        duplicatas.update((caminho, mantido) for caminho in repetidos)
+    print(f"{len(duplicatas)} duplicatas em {len(iguais)} grupos de cortes iguais")
+    
+    if caminho_saida:
+        caminho_tmp = caminho_saida + '.tmp'
+        with open(caminho_tmp, 'w', encoding='utf-8') as f:
+            json.dump({'tolerancia': tolerancia, 'duplicatas': duplicatas}, f, indent=1)
+        os.replace(caminho_tmp, caminho_saida)
+    return duplicatas
+
+def carregar_duplicatas(caminho_duplicatas):
+    """Conjunto de caminhos absolutos a excluir (lista criada por encontrar_duplicatas); vazio se não existir"""
+    try:
+        with open(caminho_duplicatas, 'r', encoding='utf-8') as f:
+            return set(json.load(f)['duplicatas'])
+    except (OSError, ValueError, KeyError):
+        return set()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lista de cortes duplicados (mesmas amostras) por pasta de label")
+    parser.add_argument('pastas', nargs='+', help="Pastas de cortes")
+    parser.add_argument('--saida', default='duplicatas.json')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--tolerancia', type=int, default=0,
+                        help="Diferença máxima por amostra (detecta cópias quase idênticas)")
+    args = parser.parse_args()
+    
+    encontrar_duplicatas(args.pastas, args.saida, args.workers, args.tolerancia)
@@ -0,0 +1,295 @@
+import os
+import csv
+import json
+import glob
+import time
+import shutil
+import argparse
+import importlib
+import numpy as np
+from armazenamento import ler_cabecalho_wav
+from benchmark import gerar_dados_sinteticos
+from cache_artefatos import gerador
+from duplicatas import _amostras
+
+# Implementações de referência (pydub) de cada alvo: "modulo:funcao"
+REFERENCIAS = {
+    'processar_overlap': 'overlap:processar_overlap',
+    'cortar_background': 'crop:cortar_background',
+    'criar_audio_individual': 'combine_60s:criar_audio_individual',
+}
+
+def carregar_implementacao(especificacao):
+    """Função a partir de "modulo:funcao" (ex: "overlap_rapido:processar_overlap")"""
+    modulo, funcao = especificacao.split(':')
+    return getattr(importlib.import_module(modulo), funcao)
+
+def preparar_entradas(pasta, n_gravacoes=4, duracao_s=60, chamadas_por_minuto=30, semente=0):
+    """
+    Gravações sintéticas (benchmark.py) e os cortes de referência usados como entrada dos alvos
+    
+    Returns:
+        dict: Pastas e listas de arquivos de entrada
+    """
+    from crop import cortar_audios, cortar_background
+    labels = ['p', 'l', 'k']
+    pasta_dados = os.path.join(pasta, 'ALL_DATA')
+    pasta_crop = os.path.join(pasta, 'croped_vocal')
+    gerar_dados_sinteticos(pasta_dados, n_gravacoes, duracao_s, chamadas_por_minuto, labels=labels, semente=semente)
+    cortar_audios(pasta_dados, pasta_crop, labels)
+    cortar_background(pasta_dados, pasta_crop)
+    
+    cortes = [(arq, label) for label in labels for arq in sorted(glob.glob(os.path.join(pasta_crop, label, '*.wav')))]
+    gerador(semente, 'equivalencia').shuffle(cortes)
+    return {
+        'pasta_dados': pasta_dados,
+        'pasta_cortes': pasta_crop,
+        'pares': [(a, b, la, lb) for (a, la), (b, lb) in zip(cortes[0::2], cortes[1::2])],
+        'vocalizacoes': [arq for arq, _ in cortes],
+        'backgrounds': sorted(glob.glob(os.path.join(pasta_crop, 'u', '*.wav'))),
+    }
+
+def _executar_processar_overlap(funcao, entradas, pasta_saida, semente):
+    os.makedirs(pasta_saida, exist_ok=True)
+    taxa_reducao = {'p': (0.1, 0.2), 'l': (0.5, 0.7), 'k': None}
+    for arq1, arq2, label1, label2 in entradas['pares']:
+        funcao(arq1, arq2, pasta_saida, label1, label2, taxa_reducao,
+               rng=gerador(semente, os.path.basename(arq1), os.path.basename(arq2)), espectrograma=False)
+
+def _executar_cortar_background(funcao, entradas, pasta_saida, semente):
+    funcao(entradas['pasta_dados'], pasta_saida)
+
+def _executar_criar_audio_individual(funcao, entradas, pasta_saida, semente, por_audio=24):
+    from combine_60s import salvar_anotacoes_csv
+    os.makedirs(pasta_saida, exist_ok=True)
+    vocalizacoes = entradas['vocalizacoes']
+    for i in range(0, len(vocalizacoes), por_audio):
+        nome = f"audio_60s_{i // por_audio + 1:03d}.wav"
+        audio, anotacoes = funcao(vocalizacoes[i:i + por_audio], entradas['backgrounds'], 60 * 1000,
+                                  rng=gerador(semente, nome))
+        if audio is not None:
+            audio.export(os.path.join(pasta_saida, nome), format='wav')
+            salvar_anotacoes_csv(anotacoes, os.path.join(pasta_saida, nome + '.csv'))
+
+EXECUTORES = {
+    'processar_overlap': _executar_processar_overlap,
+    'cortar_background': _executar_cortar_background,
+    'criar_audio_individual': _executar_criar_audio_individual,
+}
+
+def ler_wav_inteiro(caminho):
+    """
+    Returns:
+        tuple: ((taxa, canais, largura), amostras inteiras com sinal)
+    """
+    offset, n_quadros, canais, largura, taxa = ler_cabecalho_wav(caminho)
+    with open(caminho, 'rb') as f:
+        f.seek(offset)
+        dados = f.read(n_quadros * canais * largura)
+    return (taxa, canais, largura), _amostras(dados, largura)
+
+def _comparar_wav(caminho_ref, caminho_cand, tolerancia):
+    formato_ref, amostras_ref = ler_wav_inteiro(caminho_ref)
+    formato_cand, amostras_cand = ler_wav_inteiro(caminho_cand)
+    if formato_ref != formato_cand:
+        return f"formato {formato_cand} != {formato_ref}", None
+    if len(amostras_ref) != len(amostras_cand):
+        taxa, canais, _ = formato_ref
+        return (f"duração {1000 * len(amostras_cand) / canais / taxa:.3f} ms != "
+                f"{1000 * len(amostras_ref) / canais / taxa:.3f} ms"), None
+    diferenca = int(np.max(np.abs(amostras_ref.astype(np.int64) - amostras_cand), initial=0))
+    if diferenca > tolerancia:
+        primeira = int(np.argmax(np.abs(amostras_ref.astype(np.int64) - amostras_cand) > tolerancia))
+        return f"amostras diferem até {diferenca} (primeira na amostra {primeira})", diferenca
+    return None, diferenca
+
+def _comparar_csv(caminho_ref, caminho_cand, tolerancia_s):
+    with open(caminho_ref, 'r', encoding='utf-8', newline='') as f:
+        linhas_ref = list(csv.reader(f))
+    with open(caminho_cand, 'r', encoding='utf-8', newline='') as f:
+        linhas_cand = list(csv.reader(f))
+    if len(linhas_ref) != len(linhas_cand):
+        return f"{len(linhas_cand) - 1} anotações != {len(linhas_ref) - 1}"
+    for numero, (linha_ref, linha_cand) in enumerate(zip(linhas_ref, linhas_cand)):
+        if len(linha_ref) != len(linha_cand):
+            return f"linha {numero}: {linha_cand} != {linha_ref}"
+        for valor_ref, valor_cand in zip(linha_ref, linha_cand):
+            try:
+                iguais = abs(float(valor_ref) - float(valor_cand)) <= tolerancia_s
+            except ValueError:
+                iguais = valor_ref == valor_cand
+            if not iguais:
+                return f"linha {numero}: {linha_cand} != {linha_ref}"
+    return None
+
+def comparar_saidas(pasta_ref, pasta_cand, tolerancia=0, tolerancia_s=0.0):
+    """
+    Compara as saídas (.wav e .csv) de duas execuções, arquivo a arquivo
+    
+    Args:
+        pasta_ref (str): Saídas da referência
+        pasta_cand (str): Saídas do candidato
+        tolerancia (int): Diferença máxima por amostra (em unidades da amostra inteira)
+        tolerancia_s (float): Diferença máxima nos campos numéricos dos CSVs (onset/offset em s)
+    
+    Returns:
+        tuple: (lista de divergências (arquivo, descrição), número de arquivos, maior diferença de amostra)
+    """
+    def listar(pasta):
+        return {os.path.relpath(caminho, pasta) for extensao in ('*.wav', '*.csv')
+                for caminho in glob.glob(os.path.join(pasta, '**', extensao), recursive=True)}
+    
+    arquivos_ref, arquivos_cand = listar(pasta_ref), listar(pasta_cand)
+    divergencias = [(arquivo, "ausente no candidato") for arquivo in sorted(arquivos_ref - arquivos_cand)]
+    divergencias += [(arquivo, "ausente na referência") for arquivo in sorted(arquivos_cand - arquivos_ref)]
+    maior_diferenca = 0
+    for arquivo in sorted(arquivos_ref & arquivos_cand):
+        caminho_ref, caminho_cand = os.path.join(pasta_ref, arquivo), os.path.join(pasta_cand, arquivo)
+        try:
+            if arquivo.endswith('.wav'):
+                descricao, diferenca = _comparar_wav(caminho_ref, caminho_cand, tolerancia)
+                maior_diferenca = max(maior_diferenca, diferenca or 0)
+            else:
+                descricao = _comparar_csv(caminho_ref, caminho_cand, tolerancia_s)
+        except Exception as e:
+            descricao = f"erro ao comparar: {str(e)}"
+        if descricao is not None:
+            divergencias.append((arquivo, descricao))
+    return divergencias, len(arquivos_ref | arquivos_cand), maior_diferenca
+
+def verificar_equivalencia(pasta_trabalho, candidatos=None, n_gravacoes=4, duracao_s=60, chamadas_por_minuto=30,
+                           semente=0, tolerancia=0, tolerancia_s=0.0, caminho_relatorio=None):
+    """
+    Roda a referência (pydub) e o candidato de cada alvo sobre as mesmas entradas sintéticas,
+    com as mesmas sementes, e compara amostras, durações e CSVs de anotação
+    
+    O candidato recebe os mesmos argumentos da referência (ex: processar_overlap recebe rng e
+    espectrograma=False) e deve consumir o gerador aleatório da mesma forma.
+    
+    Args:
+        pasta_trabalho (str): Pasta temporária (apagada no início)
+        candidatos (dict): Alvo -> "modulo:funcao" (default: a própria referência em todos os
+                           alvos, o que verifica só o determinismo)
+        n_gravacoes (int): Gravações sintéticas de entrada
+        duracao_s (float): Duração de cada gravação
+        chamadas_por_minuto (float): Densidade de chamadas
+        semente (int): Semente dos dados e dos geradores de cada saída
+        tolerancia (int): Diferença máxima por amostra
+        tolerancia_s (float): Diferença máxima em onset/offset das anotações
+        caminho_relatorio (str): JSON com o resultado de cada alvo
+    
+    Returns:
+        list: Resultado por alvo (tempos, aceleração, divergências e se é equivalente)
+    """
+    if candidatos is None:
+        candidatos = dict(REFERENCIAS)
+    shutil.rmtree(pasta_trabalho, ignore_errors=True)
+    entradas = preparar_entradas(os.path.join(pasta_trabalho, 'entradas'), n_gravacoes, duracao_s,
+                                 chamadas_por_minuto, semente)
+    
+    resultados = []
+    for alvo, especificacao in candidatos.items():
+        tempos = {}
+        for lado, funcao in (('referencia', carregar_implementacao(REFERENCIAS[alvo])),
+                             ('candidato', carregar_implementacao(especificacao))):
+            inicio = time.perf_counter()
+            EXECUTORES[alvo](funcao, entradas, os.path.join(pasta_trabalho, alvo, lado), semente)
+            tempos[lado] = time.perf_counter() - inicio
+        
+        divergencias, n_arquivos, maior_diferenca = comparar_saidas(
+            os.path.join(pasta_trabalho, alvo, 'referencia'), os.path.join(pasta_trabalho, alvo, 'candidato'),
+            tolerancia, tolerancia_s)
+        aceleracao = tempos['referencia'] / max(tempos['candidato'], 1e-9)
+        equivalente = not divergencias and n_arquivos > 0
+        resultados.append({
+            'alvo': alvo, 'candidato': especificacao, 'equivalente': equivalente, 'arquivos': n_arquivos,
+            'tempo_referencia_s': round(tempos['referencia'], 3), 'tempo_candidato_s': round(tempos['candidato'], 3),
+            'aceleracao': round(aceleracao, 2), 'maior_diferenca_amostra': maior_diferenca,
+            'divergencias': [{'arquivo': arquivo, 'descricao': descricao} for arquivo, descricao in divergencias]
+        })
+        print(f"  {alvo:24s} {'OK' if equivalente else 'DIVERGE':8s} {n_arquivos:5d} arquivos  "
+              f"{tempos['referencia']:7.2f}s -> {tempos['candidato']:7.2f}s ({aceleracao:.2f}x)  "
+              f"{len(divergencias)} divergências")
+        for arquivo, descricao in divergencias[:10]:
+            print(f"      {arquivo}: {descricao}")
+    
+    if caminho_relatorio:
+        with open(caminho_relatorio, 'w', encoding='utf-8') as f:
+            json.dump({'semente': semente, 'tolerancia': tolerancia, 'tolerancia_s': tolerancia_s,
+                       'resultados': resultados}, f, indent=2)
+        print(f"\nRelatório salvo em: {caminho_relatorio}")
+    return resultados
+
+def verificar_plano(pasta_trabalho, n_gravacoes=4, duracao_s=60, chamadas_por_minuto=30, semente=0, n=20,
+                    n_vocalizacoes=12):
+    """
+    Compara a geração direta (overlap.py + combine_60s.py) com planejar + executar_plano
+    (plano.py) sobre as mesmas entradas sintéticas e a mesma semente: as saídas devem ser
+    idênticas, amostra a amostra e anotação a anotação
+    
+    Args:
+        pasta_trabalho (str): Pasta temporária (apagada no início)
+        n (int): Overlaps de cada tipo
+        n_vocalizacoes (int): Vocalizações de cada tipo nos áudios de 60s
+        (demais parâmetros como em verificar_equivalencia)
+    
+    Returns:
+        list: Divergências (arquivo, descrição); vazia se as saídas são idênticas
+    """
+    from overlap import criar_pares_com_overlap_e_espectrograma
+    from combine_60s import criar_audios_60s
+    from plano import planejar_overlaps, planejar_audios_60s, salvar_plano, executar_plano
+    shutil.rmtree(pasta_trabalho, ignore_errors=True)
+    entradas = preparar_entradas(os.path.join(pasta_trabalho, 'entradas'), n_gravacoes, duracao_s,
+                                 chamadas_por_minuto, semente)
+    pasta_cortes = entradas['pasta_cortes']
+    pares = [['p', 'p'], ['k', 'p'], ['l', 'l']]
+    taxa_reducao = {'p': (0.1, 0.2), 'l': (0.5, 0.7), 'k': None}
+    
+    direto, planejado = os.path.join(pasta_trabalho, 'direto'), os.path.join(pasta_trabalho, 'planejado')
+    criar_pares_com_overlap_e_espectrograma(pasta_cortes, os.path.join(direto, 'overlaps'), pares, taxa_reducao, n,
+                                            semente=semente, espectrograma=False)
+    criar_audios_60s(os.path.join(direto, 'overlaps'), os.path.join(pasta_cortes, 'u'), os.path.join(direto, '60s'),
+                     n_vocalizacoes, semente=semente)
+    
+    plano_overlaps = planejar_overlaps(pasta_cortes, pares, taxa_reducao, n, semente=semente)
+    salvar_plano(plano_overlaps, os.path.join(pasta_trabalho, 'plano_overlaps.csv'))
+    executar_plano(os.path.join(pasta_trabalho, 'plano_overlaps.csv'), os.path.join(planejado, 'overlaps'),
+                   espectrograma=False)
+    # Como em planejar_pipeline: as vocalizações dos áudios de 60s vêm do plano de overlaps
+    salvar_plano(planejar_audios_60s(os.path.join(planejado, 'overlaps'), os.path.join(pasta_cortes, 'u'),
+                                     n_vocalizacoes, semente=semente, plano_overlaps=plano_overlaps),
+                 os.path.join(pasta_trabalho, 'plano_60s.csv'))
+    executar_plano(os.path.join(pasta_trabalho, 'plano_60s.csv'), os.path.join(planejado, '60s'))
+    
+    divergencias, n_arquivos, _ = comparar_saidas(direto, planejado)
+    print(f"  {'plano':24s} {'OK' if not divergencias else 'DIVERGE':8s} {n_arquivos:5d} arquivos  "
+          f"{len(divergencias)} divergências")
+    for arquivo, descricao in divergencias[:10]:
+        print(f"      {arquivo}: {descricao}")
+    return divergencias
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Equivalência das saídas de implementações rápidas com a referência pydub")
+    parser.add_argument('candidatos', nargs='*', metavar='ALVO=MODULO:FUNCAO',
+                        help=f"Candidatos por alvo ({', '.join(REFERENCIAS)}); sem nenhum, compara a referência com ela mesma")
+    parser.add_argument('--pasta', default='equivalencia_tmp', help="Pasta de trabalho temporária")
+    parser.add_argument('--gravacoes', type=int, default=4)
+    parser.add_argument('--duracao', type=float, default=60, help="Duração de cada gravação (s)")
+    parser.add_argument('--densidade', type=float, default=30, help="Chamadas por minuto")
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--tolerancia', type=int, default=0, help="Diferença máxima por amostra")
+    parser.add_argument('--tolerancia-s', type=float, default=0.0, help="Diferença máxima em onset/offset (s)")
+    parser.add_argument('--saida', default=None, help="Relatório JSON")
+    parser.add_argument('--plano', action='store_true',
+                        help="Comparar a geração direta com planejar + executar (plano.py) em vez dos candidatos")
+    args = parser.parse_args()
+    
+    if args.plano:
+        divergencias = verificar_plano(args.pasta, args.gravacoes, args.duracao, args.densidade, args.semente)
+        raise SystemExit(1 if divergencias else 0)
+    candidatos = dict(especificacao.split('=', 1) for especificacao in args.candidatos) or None
+    resultados = verificar_equivalencia(args.pasta, candidatos, args.gravacoes, args.duracao, args.densidade,
+                                        args.semente, args.tolerancia, args.tolerancia_s, args.saida)
+    # Código de saída 1 se algum alvo divergir (para usar como verificação antes de adotar um caminho novo)
+    raise SystemExit(0 if all(resultado['equivalente'] for resultado in resultados) else 1)
@@ -0,0 +1,134 @@
+import os
+from collections import OrderedDict
+import numpy as np
+import instrumentacao
+
+# librosa só é importado nas funções que o usam (ver overlap.py)
+
+# Mesmos parâmetros do espectrograma Mel de gerar_espectrograma (overlap.py)
+TAXA = 48000
+N_FFT = 2048
+HOP = 128
+N_MELS = 128
+FMIN = 1000
+FMAX = 18000
+# Quadros antes do início do clipe que ainda alcançam suas primeiras amostras
+QUADROS_ANTES = N_FFT // 2 // HOP
+# STFTs mapeadas em memória ao mesmo tempo (cada uma mantém um descritor de arquivo aberto)
+MAX_STFTS_MAPEADAS = 64
+
+def base_mel(taxa=TAXA):
+    """
+    Banco de filtros Mel e faixa de bins da STFT que ele usa
+    
+    Returns:
+        tuple: (matriz n_mels x bins da faixa, primeiro bin, último bin + 1)
+    """
+    import librosa
+    filtros = librosa.filters.mel(sr=taxa, n_fft=N_FFT, n_mels=N_MELS, fmin=FMIN, fmax=FMAX)
+    bins = np.flatnonzero(filtros.any(axis=0))
+    return filtros[:, bins[0]:bins[-1] + 1], int(bins[0]), int(bins[-1]) + 1
+
+def stft_clipe(sinal):
+    """
+    STFT complexa de um clipe (float em [-1, 1]) com N_FFT/2 zeros extras em cada
+    ponta, de forma que todos os quadros que alcançam alguma amostra do clipe existam
+    depois do deslocamento. Com center=True e preenchimento por zeros, o quadro t da
+    mistura com o clipe deslocado de k*HOP amostras recebe exatamente o quadro
+    t - k + QUADROS_ANTES desta STFT.
+    """
+    import librosa
+    sinal = np.pad(sinal.astype(np.float32), (N_FFT // 2, N_FFT // 2))
+    return librosa.stft(sinal, n_fft=N_FFT, hop_length=HOP, center=True, pad_mode='constant')
+
+def quantizar_inicio(inicio_ms, taxa=TAXA):
+    """Início em ms -> início em amostras, arredondado para múltiplo do HOP"""
+    return int(round(inicio_ms * taxa / 1000 / HOP)) * HOP
+
+def somar_stfts(stfts, ganhos, inicios_amostras, n_amostras):
+    """
+    STFT da mistura de clipes deslocados (inícios múltiplos de HOP) e com ganho,
+    obtida só com somas dos quadros já calculados
+    
+    Args:
+        stfts (list): STFT de cada clipe (mesma faixa de bins)
+        ganhos (list): Ganho linear de cada clipe
+        inicios_amostras (list): Início de cada clipe em amostras (múltiplo de HOP)
+        n_amostras (int): Comprimento da mistura em amostras
+    
+    Returns:
+        np.ndarray: STFT complexa da mistura (bins x quadros)
+    """
+    n_quadros = 1 + n_amostras // HOP
+    soma = np.zeros((stfts[0].shape[0], n_quadros), dtype=np.complex64)
+    for stft, ganho, inicio in zip(stfts, ganhos, inicios_amostras):
+        deslocamento = inicio // HOP - QUADROS_ANTES
+        primeiro = max(0, -deslocamento)
+        fim = min(n_quadros, deslocamento + stft.shape[1])
+        if fim > deslocamento + primeiro:
+            soma[:, deslocamento + primeiro:fim] += np.float32(ganho) * stft[:, primeiro:fim - deslocamento]
+    return soma
+
+class CacheSTFT:
+    """
+    STFTs complexas dos cortes, calculadas uma vez e guardadas em `<hash do clipe>.npy`
+    (só os bins usados pelo banco Mel), para montar espectrogramas de overlaps por soma
+    
+    Args:
+        pasta (str): Pasta das STFTs
+    """
+    def __init__(self, pasta):
+        self.pasta = pasta
+        os.makedirs(pasta, exist_ok=True)
+        self.filtros, self.bin_inicial, self.bin_final = base_mel()
+        self.hashes = {}
+        self._memoria = OrderedDict()  # hash do clipe -> STFT mapeada (as mais recentes)
+    
+    def stft(self, caminho, armazenamento, sinal=None):
+        """
+        STFT do clipe (faixa de bins do banco Mel)
+        
+        Args:
+            caminho (str): Caminho do corte
+            armazenamento: De onde ler o corte
+            sinal (np.ndarray): Amostras int16 a 48 kHz já carregadas (evita reler o corte)
+        """
+        chave = armazenamento.hash_clipe(caminho, self.hashes)
+        if chave in self._memoria:
+            self._memoria.move_to_end(chave)
+            return self._memoria[chave]
+        caminho_stft = os.path.join(self.pasta, f"{chave}.npy")
+        try:
+            stft = np.load(caminho_stft, mmap_mode='r')
+            instrumentacao.contar('stfts_reutilizadas')
+        except (OSError, ValueError):
+            if sinal is None:
+                from overlap import _sinal_mono_48k
+                sinal = _sinal_mono_48k(armazenamento.carregar(caminho))
+            with instrumentacao.medir('espectrograma'):
+                stft = stft_clipe(sinal / 32768.0)[self.bin_inicial:self.bin_final].astype(np.complex64)
+            caminho_tmp = f"{caminho_stft}.{os.getpid()}.tmp"
+            with open(caminho_tmp, 'wb') as f:
+                np.save(f, stft)
+            os.replace(caminho_tmp, caminho_stft)
+            instrumentacao.contar('stfts_calculadas')
+            # Manter só o mapeamento do arquivo (as páginas ficam a cargo do sistema)
+            stft = np.load(caminho_stft, mmap_mode='r')
+        self._memoria[chave] = stft
+        while len(self._memoria) > MAX_STFTS_MAPEADAS:
+            self._memoria.popitem(last=False)
+        return stft
+    
+    def mel(self, caminhos, ganhos, inicios_amostras, n_amostras, armazenamento, sinais=None):
+        """
+        Espectrograma Mel (potência) de um overlap a partir das STFTs dos cortes
+        
+        Returns:
+            np.ndarray: N_MELS x quadros, como librosa.feature.melspectrogram sobre a mistura
+        """
+        if sinais is None:
+            sinais = [None] * len(caminhos)
+        stfts = [self.stft(caminho, armazenamento, sinal) for caminho, sinal in zip(caminhos, sinais)]
+        with instrumentacao.medir('espectrograma'):
+            soma = somar_stfts(stfts, ganhos, inicios_amostras, n_amostras)
+            return self.filtros @ (soma.real ** 2 + soma.imag ** 2)
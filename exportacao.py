@@ -0,0 +1,237 @@
+import os
+import io
+import csv
+import glob
+import wave
+import tarfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from anotacoes import caminho_anotacoes
+import instrumentacao
+
+# Colunas do índice global (indice.csv)
+COLUNAS_INDICE = ['chave', 'shard', 'offset_wav', 'tamanho_wav', 'offset_csv', 'tamanho_csv']
+
+def coletar_amostras(pastas):
+    """
+    Lista as amostras (WAV + anotações .wav.csv, se houver) das pastas
+    
+    A chave começa pelo nome da pasta; se duas pastas têm o mesmo nome (ex: H:\\EXISTING\\60s e
+    H:\\ALL\\60s), pelo caminho a partir da pasta comum a todas (EXISTING/60s e ALL/60s).
+    
+    Args:
+        pastas (list): Pastas com os áudios (ex: saída do combine_60s ou pastas de overlaps)
+    
+    Returns:
+        list: Lista de (chave, caminho_wav, caminho_csv ou None), com chaves únicas
+    """
+    pastas = [os.path.abspath(pasta) for pasta in pastas]
+    prefixos = [os.path.basename(pasta) for pasta in pastas]
+    if len(set(prefixos)) < len(prefixos):
+        comum = os.path.commonpath(pastas)
+        prefixos = [os.path.relpath(pasta, comum).replace(os.sep, '/') for pasta in pastas]
+    
+    amostras, vistas = [], set()
+    for pasta, prefixo in zip(pastas, prefixos):
+        for caminho_wav in sorted(glob.glob(os.path.join(pasta, '**', '*.wav'), recursive=True)):
+            relativo = os.path.splitext(os.path.relpath(caminho_wav, pasta))[0]
+            chave = f"{prefixo}/{relativo.replace(os.sep, '/')}"
+            if chave in vistas:
+                raise ValueError(f"Chave repetida na exportação: {chave} ({caminho_wav})")
+            vistas.add(chave)
+            amostras.append((chave, caminho_wav, caminho_anotacoes(caminho_wav)))
+    return amostras
+
+def planejar_shards(amostras, tamanho_shard_mb=1024):
+    """
+    Distribui as amostras em shards de tamanho aproximadamente fixo, na ordem dada
+    
+    O plano depende só dos tamanhos dos arquivos, de modo que cada shard pode ser
+    gravado de forma independente (e em paralelo).
+    
+    Returns:
+        list: Lista de listas de amostras, uma por shard
+    """
+    limite = tamanho_shard_mb * 1024 * 1024
+    shards, atual, tamanho_atual = [], [], 0
+    for amostra in amostras:
+        _, caminho_wav, caminho_csv = amostra
+        tamanho = os.path.getsize(caminho_wav) + (os.path.getsize(caminho_csv) if caminho_csv else 0)
+        if atual and tamanho_atual + tamanho > limite:
+            shards.append(atual)
+            atual, tamanho_atual = [], 0
+        atual.append(amostra)
+        tamanho_atual += tamanho
+    if atual:
+        shards.append(atual)
+    return shards
+
+def _adicionar(tar, nome, caminho):
+    info = tar.gettarinfo(caminho, arcname=nome)
+    info.uid = info.gid = 0
+    info.uname = info.gname = ''
+    with open(caminho, 'rb') as f:
+        tar.addfile(info, f)
+    instrumentacao.registrar_leitura(caminho)
+    # Os dados ficam logo antes da posição atual, completados até múltiplo de 512 bytes
+    blocos = -(-info.size // tarfile.BLOCKSIZE)
+    return tar.offset - blocos * tarfile.BLOCKSIZE, info.size
+
+def gravar_shard(caminho_shard, amostras):
+    """
+    Grava um shard tar (membros `<chave>.wav` e `<chave>.csv`, sem compressão)
+    
+    Args:
+        caminho_shard (str): Caminho do arquivo .tar
+        amostras (list): Amostras do shard, como em coletar_amostras
+    
+    Returns:
+        list: Linhas do índice (COLUNAS_INDICE) das amostras do shard
+    """
+    nome_shard = os.path.basename(caminho_shard)
+    linhas = []
+    caminho_tmp = caminho_shard + '.tmp'
+    with instrumentacao.medir('escrita'):
+        with tarfile.open(caminho_tmp, 'w', format=tarfile.GNU_FORMAT) as tar:
+            for chave, caminho_wav, caminho_csv in amostras:
+                offset_wav, tamanho_wav = _adicionar(tar, f"{chave}.wav", caminho_wav)
+                offset_csv, tamanho_csv = (_adicionar(tar, f"{chave}.csv", caminho_csv)
+                                           if caminho_csv else (-1, 0))
+                linhas.append([chave, nome_shard, offset_wav, tamanho_wav, offset_csv, tamanho_csv])
+        os.replace(caminho_tmp, caminho_shard)
+    instrumentacao.registrar_escrita(caminho_shard)
+    return linhas
+
+def exportar_shards(pastas, pasta_saida, tamanho_shard_mb=1024, n_workers=None):
+    """
+    Empacota áudios e anotações em shards tar de tamanho fixo com um índice global
+    
+    Args:
+        pastas (list): Pastas de entrada
+        pasta_saida (str): Pasta dos shards (shard_00000.tar, ...) e do indice.csv
+        tamanho_shard_mb (int): Tamanho aproximado de cada shard em MB
+        n_workers (int): Processos para gravar os shards em paralelo (default: os.cpu_count())
+    
+    Returns:
+        int: Número de amostras exportadas
+    """
+    os.makedirs(pasta_saida, exist_ok=True)
+    amostras = coletar_amostras(pastas)
+    if not amostras:
+        print("Nenhum áudio encontrado para exportar")
+        return 0
+    shards = planejar_shards(amostras, tamanho_shard_mb)
+    caminhos = [os.path.join(pasta_saida, f"shard_{i:05d}.tar") for i in range(len(shards))]
+    print(f"Exportando {len(amostras)} amostras em {len(shards)} shards")
+    
+    if n_workers == 1 or len(shards) == 1:
+        linhas_por_shard = [gravar_shard(caminho, shard) for caminho, shard in zip(caminhos, shards)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            linhas_por_shard = list(executor.map(gravar_shard, caminhos, shards))
+    
+    with open(os.path.join(pasta_saida, 'indice.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUNAS_INDICE)
+        for linhas in linhas_por_shard:
+            writer.writerows(linhas)
+    
+    print(f"Shards e índice salvos em: {pasta_saida}")
+    return len(amostras)
+
+def _decodificar(dados_wav, dados_csv):
+    with wave.open(io.BytesIO(dados_wav), 'rb') as f:
+        taxa = f.getframerate()
+        canais = f.getnchannels()
+        tipo = {1: np.uint8, 2: np.int16, 4: np.int32}[f.getsampwidth()]
+        audio = np.frombuffer(f.readframes(f.getnframes()), dtype=tipo)
+    if canais > 1:
+        audio = audio.reshape(-1, canais)
+    anotacoes = []
+    if dados_csv:
+        for linha in csv.DictReader(io.StringIO(dados_csv.decode('utf-8'))):
+            anotacoes.append((float(linha['onset_s']), float(linha['offset_s']), linha['label']))
+    return audio, taxa, anotacoes
+
+class LeitorShards:
+    """
+    Leitura dos shards exportados: sequencial (iteração) ou aleatória por índice
+    
+    Cada amostra é um dicionário {'chave', 'audio' (amostras PCM), 'taxa', 'anotacoes'}
+    com as anotações como tuplas (onset_s, offset_s, label). Com bruto=True,
+    'wav' e 'csv' trazem os bytes originais em vez do áudio decodificado.
+    
+    Args:
+        pasta (str): Pasta com os shards e o indice.csv
+        bruto (bool): Não decodificar o WAV/CSV
+    """
+    def __init__(self, pasta, bruto=False):
+        self.pasta = pasta
+        self.bruto = bruto
+        with open(os.path.join(pasta, 'indice.csv'), 'r', encoding='utf-8') as f:
+            self.indice = [(linha['chave'], linha['shard'], int(linha['offset_wav']), int(linha['tamanho_wav']),
+                            int(linha['offset_csv']), int(linha['tamanho_csv']))
+                           for linha in csv.DictReader(f)]
+        self.posicoes = {entrada[0]: i for i, entrada in enumerate(self.indice)}
+        self._arquivos = {}
+    
+    def __len__(self):
+        return len(self.indice)
+    
+    def _amostra(self, chave, dados_wav, dados_csv):
+        if self.bruto:
+            return {'chave': chave, 'wav': dados_wav, 'csv': dados_csv}
+        audio, taxa, anotacoes = _decodificar(dados_wav, dados_csv)
+        return {'chave': chave, 'audio': audio, 'taxa': taxa, 'anotacoes': anotacoes}
+    
+    def _ler(self, shard, offset, tamanho):
+        arquivo = self._arquivos.get(shard)
+        if arquivo is None:
+            arquivo = self._arquivos[shard] = open(os.path.join(self.pasta, shard), 'rb')
+        arquivo.seek(offset)
+        return arquivo.read(tamanho)
+    
+    def __getitem__(self, i):
+        """Amostra pela posição no índice ou pela chave"""
+        if isinstance(i, str):
+            i = self.posicoes[i]
+        chave, shard, offset_wav, tamanho_wav, offset_csv, tamanho_csv = self.indice[i]
+        dados_wav = self._ler(shard, offset_wav, tamanho_wav)
+        dados_csv = self._ler(shard, offset_csv, tamanho_csv) if offset_csv >= 0 else None
+        return self._amostra(chave, dados_wav, dados_csv)
+    
+    def __iter__(self):
+        """Percorre os shards em ordem, lendo cada um de forma sequencial"""
+        shards = sorted({entrada[1] for entrada in self.indice})
+        for shard in shards:
+            with tarfile.open(os.path.join(self.pasta, shard), 'r|') as tar:
+                chave_atual, dados_wav, dados_csv = None, None, None
+                for membro in tar:
+                    chave, extensao = os.path.splitext(membro.name)
+                    if chave != chave_atual and chave_atual is not None:
+                        yield self._amostra(chave_atual, dados_wav, dados_csv)
+                        dados_wav, dados_csv = None, None
+                    chave_atual = chave
+                    dados = tar.extractfile(membro).read()
+                    if extensao == '.wav':
+                        dados_wav = dados
+                    else:
+                        dados_csv = dados
+                if chave_atual is not None:
+                    yield self._amostra(chave_atual, dados_wav, dados_csv)
+    
+    def fechar(self):
+        for arquivo in self._arquivos.values():
+            arquivo.close()
+        self._arquivos.clear()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta áudios + anotações em shards tar com índice")
+    parser.add_argument('pastas', nargs='+', help="Pastas de entrada")
+    parser.add_argument('--saida', required=True, help="Pasta dos shards")
+    parser.add_argument('--tamanho-mb', type=int, default=1024, help="Tamanho aproximado de cada shard (MB)")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    
+    exportar_shards(args.pastas, args.saida, args.tamanho_mb, args.workers)
@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import shutil
+import socket
+import argparse
+import threading
+from armazenamento import ArmazenamentoDisco
+from espectros import CacheSTFT
+from plano import carregar_plano, agrupar_plano, renderizar_overlaps, renderizar_audio_60s
+
+# Fila de tarefas em uma pasta compartilhada (ex: no volume H: montado em todas as máquinas).
+# Cada tarefa é um lote de grupos do plano. Um nó reivindica a tarefa criando de forma atômica
+# (O_CREAT | O_EXCL) o arquivo `reivindicacoes/<tarefa>.<tentativa>.json` e renova o lease
+# regravando o arquivo. Se o nó cair, o lease expira e outro nó cria a tentativa seguinte:
+# como a criação é exclusiva, só um nó assume cada tentativa, sem travas nem renomeações.
+ARQUIVO_FILA = 'fila.json'
+DURACAO_LEASE_S = 300
+# Tentativas de uma tarefa (incluindo as assumidas de nós que caíram) antes de concluí-la incompleta
+MAX_TENTATIVAS = 5
+
+def _gravar_atomico(caminho, dados):
+    caminho_tmp = f"{caminho}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(caminho_tmp, 'w', encoding='utf-8') as f:
+        json.dump(dados, f)
+    os.replace(caminho_tmp, caminho)
+
+def criar_fila(caminho_plano, pasta_saida, pasta_fila, tamanho_lote=16, pasta_stft=None, rotulos_quadros=False,
+               espectrograma=True):
+    """
+    Cria a fila de um plano (plano.py) na pasta compartilhada: o plano é copiado para a fila
+    e dividido em tarefas de `tamanho_lote` grupos (overlaps de mesmas origens ou áudios de 60s)
+    
+    Args:
+        caminho_plano (str): CSV de salvar_plano
+        pasta_saida (str): Pasta de saída, no caminho visto por todos os nós (ex: H:\\overlaps)
+        pasta_fila (str): Pasta da fila (também compartilhada)
+        tamanho_lote (int): Grupos do plano por tarefa
+        pasta_stft, rotulos_quadros, espectrograma: Como em executar_plano
+    
+    Returns:
+        int: Número de tarefas
+    """
+    if os.path.exists(os.path.join(pasta_fila, ARQUIVO_FILA)):
+        raise ValueError(f"Já existe uma fila em {pasta_fila}")
+    for subpasta in ('reivindicacoes', 'concluidas', 'relogio'):
+        os.makedirs(os.path.join(pasta_fila, subpasta), exist_ok=True)
+    shutil.copyfile(caminho_plano, os.path.join(pasta_fila, 'plano.csv'))
+    n_grupos = len(agrupar_plano(carregar_plano(caminho_plano)))
+    n_tarefas = (n_grupos + tamanho_lote - 1) // tamanho_lote
+    _gravar_atomico(os.path.join(pasta_fila, ARQUIVO_FILA), {
+        'pasta_saida': os.path.abspath(pasta_saida), 'n_grupos': n_grupos, 'tamanho_lote': tamanho_lote,
+        'n_tarefas': n_tarefas, 'pasta_stft': os.path.abspath(pasta_stft) if pasta_stft else None,
+        'rotulos_quadros': rotulos_quadros, 'espectrograma': espectrograma,
+    })
+    print(f"Fila com {n_tarefas} tarefas ({n_grupos} grupos) em {pasta_fila}")
+    return n_tarefas
+
+class FilaCompartilhada:
+    """
+    Acesso de um nó à fila (criar_fila)
+    
+    Args:
+        pasta_fila (str): Pasta da fila
+        no (str): Identificação do nó (default: máquina-pid)
+        duracao_lease_s (float): Tempo sem renovação após o qual o lease de um nó é considerado
+                                 perdido (o nó renova a cada terço desse tempo)
+    """
+    def __init__(self, pasta_fila, no=None, duracao_lease_s=DURACAO_LEASE_S):
+        self.pasta = pasta_fila
+        self.no = no or f"{socket.gethostname()}-{os.getpid()}"
+        self.duracao_lease_s = duracao_lease_s
+        with open(os.path.join(pasta_fila, ARQUIVO_FILA), 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+    
+    def _caminho_reivindicacao(self, tarefa, tentativa):
+        return os.path.join(self.pasta, 'reivindicacoes', f"{tarefa:06d}.{tentativa}.json")
+    
+    def _caminho_concluida(self, tarefa):
+        return os.path.join(self.pasta, 'concluidas', f"{tarefa:06d}.json")
+    
+    def agora(self):
+        """
+        Hora do servidor de arquivos (mtime de um arquivo recém-gravado), para que os leases
+        sejam comparados no mesmo relógio em todas as máquinas
+        """
+        caminho = os.path.join(self.pasta, 'relogio', f"{self.no}.txt")
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write(self.no)
+        return os.stat(caminho).st_mtime
+    
+    def ultimas_tentativas(self):
+        """Maior tentativa já reivindicada de cada tarefa (uma única listagem da pasta)"""
+        tentativas = {}
+        for nome in os.listdir(os.path.join(self.pasta, 'reivindicacoes')):
+            partes = nome.split('.')
+            if len(partes) == 3 and partes[2] == 'json':
+                tarefa, tentativa = int(partes[0]), int(partes[1])
+                tentativas[tarefa] = max(tentativa, tentativas.get(tarefa, -1))
+        return tentativas
+    
+    def concluidas(self):
+        """Conjunto das tarefas concluídas"""
+        return {int(nome.split('.')[0]) for nome in os.listdir(os.path.join(self.pasta, 'concluidas'))
+                if nome.endswith('.json')}
+    
+    def expirada(self, tarefa, tentativa, agora):
+        """Se o lease da tentativa não foi renovado dentro de duracao_lease_s"""
+        try:
+            mtime = os.stat(self._caminho_reivindicacao(tarefa, tentativa)).st_mtime
+        except FileNotFoundError:
+            return False
+        return agora - mtime > self.duracao_lease_s
+    
+    def reivindicar(self, tarefa, tentativa_atual, agora):
+        """
+        Tenta assumir a tarefa: livre (tentativa_atual -1) ou com o lease da tentativa atual expirado
+        
+        Returns:
+            int: Tentativa assumida, ou None se a tarefa está com outro nó ou se outro nó ganhou a disputa
+        """
+        if tentativa_atual >= 0 and not self.expirada(tarefa, tentativa_atual, agora):
+            return None
+        tentativa = tentativa_atual + 1
+        try:
+            descritor = os.open(self._caminho_reivindicacao(tarefa, tentativa), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        with os.fdopen(descritor, 'w', encoding='utf-8') as f:
+            json.dump({'no': self.no, 'tarefa': tarefa, 'tentativa': tentativa}, f)
+        if tentativa > 0:
+            print(f"[{self.no}] Lease da tarefa {tarefa} expirou; assumindo a tentativa {tentativa}")
+        return tentativa
+    
+    def renovar(self, tarefa, tentativa):
+        """
+        Renova o lease (regrava o arquivo, atualizando o mtime no servidor)
+        
+        Returns:
+            bool: False se outro nó já assumiu uma tentativa posterior (o lease foi perdido)
+        """
+        if os.path.exists(self._caminho_reivindicacao(tarefa, tentativa + 1)):
+            return False
+        with open(self._caminho_reivindicacao(tarefa, tentativa), 'w', encoding='utf-8') as f:
+            json.dump({'no': self.no, 'tarefa': tarefa, 'tentativa': tentativa}, f)
+        return True
+    
+    def liberar(self, tarefa, tentativa):
+        """Devolve a tarefa à fila: o lease da tentativa passa a estar expirado, e a próxima reivindicação assume"""
+        os.utime(self._caminho_reivindicacao(tarefa, tentativa), (0, 0))
+    
+    def concluir(self, tarefa, tentativa, gerados, esperados):
+        _gravar_atomico(self._caminho_concluida(tarefa), {'no': self.no, 'tentativa': tentativa, 'gerados': gerados,
+                                                          'esperados': esperados})
+    
+    def estado(self):
+        """
+        Returns:
+            dict: Número de tarefas concluídas, em andamento, com lease expirado e pendentes
+        """
+        agora, tentativas, concluidas = self.agora(), self.ultimas_tentativas(), self.concluidas()
+        contagem = {'concluidas': 0, 'em_andamento': 0, 'expiradas': 0, 'pendentes': 0}
+        for tarefa in range(self.config['n_tarefas']):
+            if tarefa in concluidas:
+                contagem['concluidas'] += 1
+            elif tarefa not in tentativas:
+                contagem['pendentes'] += 1
+            elif self.expirada(tarefa, tentativas[tarefa], agora):
+                contagem['expiradas'] += 1
+            else:
+                contagem['em_andamento'] += 1
+        return contagem
+
+def _manter_lease(fila, tarefa, tentativa, parar, perdido):
+    while not parar.wait(fila.duracao_lease_s / 3):
+        try:
+            if not fila.renovar(tarefa, tentativa):
+                perdido.set()
+                return
+        except OSError as e:
+            print(f"[{fila.no}] Erro ao renovar o lease da tarefa {tarefa}: {str(e)}")
+
+def trabalhar(pasta_fila, no=None, duracao_lease_s=DURACAO_LEASE_S, espera_s=None, max_tarefas=None,
+              max_tentativas=MAX_TENTATIVAS):
+    """
+    Loop de um nó: reivindica tarefas livres (ou com lease expirado), gera os grupos do plano
+    e marca a tarefa como concluída, até todas as tarefas da fila estarem concluídas.
+    Uma tarefa com alguma saída que falhou (ex: erro de leitura no volume compartilhado) é
+    devolvida à fila em vez de concluída, e outra tentativa a gera de novo.
+    Rode em quantas máquinas (ou processos) quiser; o resultado é o mesmo de executar_plano
+    em um único nó, pois cada saída depende só da sua linha do plano.
+    
+    Args:
+        pasta_fila (str): Pasta da fila
+        no (str): Identificação do nó (default: máquina-pid)
+        duracao_lease_s (float): Ver FilaCompartilhada (deve ser o mesmo em todos os nós)
+        espera_s (float): Espera entre verificações quando todas as tarefas restantes estão
+                          com outros nós (default: um terço do lease)
+        max_tarefas (int): Para depois de concluir este número de tarefas (default: sem limite)
+        max_tentativas (int): Na última tentativa, a tarefa é concluída mesmo com saídas faltando
+    
+    Returns:
+        int: Número de saídas geradas por este nó
+    """
+    fila = FilaCompartilhada(pasta_fila, no, duracao_lease_s)
+    config = fila.config
+    if espera_s is None:
+        espera_s = duracao_lease_s / 3
+    grupos = agrupar_plano(carregar_plano(os.path.join(pasta_fila, 'plano.csv')))
+    armazenamento = ArmazenamentoDisco()
+    espectros = CacheSTFT(config['pasta_stft']) if config['pasta_stft'] and config['espectrograma'] else None
+    gerados_no = 0
+    tarefas_no = 0
+    devolvidas = set()  # Tarefas que este nó devolveu à fila: tentadas por último
+    
+    while max_tarefas is None or tarefas_no < max_tarefas:
+        concluidas = fila.concluidas()
+        restantes = sorted((tarefa for tarefa in range(config['n_tarefas']) if tarefa not in concluidas),
+                           key=lambda tarefa: tarefa in devolvidas)
+        if not restantes:
+            break
+        agora, tentativas = fila.agora(), fila.ultimas_tentativas()
+        tarefa, tentativa = None, None
+        for candidata in restantes:
+            tentativa = fila.reivindicar(candidata, tentativas.get(candidata, -1), agora)
+            if tentativa is not None:
+                tarefa = candidata
+                break
+        if tarefa is None:
+            # Tudo o que falta está com outros nós: esperar até concluírem ou os leases expirarem
+            time.sleep(espera_s)
+            continue
+        
+        parar, perdido = threading.Event(), threading.Event()
+        renovacao = threading.Thread(target=_manter_lease, args=(fila, tarefa, tentativa, parar, perdido), daemon=True)
+        renovacao.start()
+        inicio = tarefa * config['tamanho_lote']
+        lote = grupos[inicio:inicio + config['tamanho_lote']]
+        esperados = sum(len(grupo) if 'mixagem' in grupo[0] else 1 for grupo in lote)
+        gerados = 0
+        try:
+            for grupo in lote:
+                if perdido.is_set():
+                    break
+                if 'mixagem' in grupo[0]:
+                    gerados += renderizar_overlaps(grupo, config['pasta_saida'], armazenamento, espectros,
+                                                   config['espectrograma'])
+                else:
+                    gerados += renderizar_audio_60s(grupo, config['pasta_saida'], armazenamento,
+                                                    config['rotulos_quadros'])
+            armazenamento.aguardar()
+        finally:
+            parar.set()
+            renovacao.join()
+        if perdido.is_set():
+            print(f"[{fila.no}] Lease da tarefa {tarefa} assumido por outro nó; abandonando")
+            continue
+        if gerados < esperados:
+            if tentativa + 1 < max_tentativas:
+                print(f"[{fila.no}] Tarefa {tarefa}: {gerados} de {esperados} saídas geradas; devolvendo à fila")
+                fila.liberar(tarefa, tentativa)
+                devolvidas.add(tarefa)
+                continue
+            print(f"[{fila.no}] Tarefa {tarefa}: {gerados} de {esperados} saídas geradas após {max_tentativas} "
+                  f"tentativas; concluída incompleta")
+        fila.concluir(tarefa, tentativa, gerados, esperados)
+        gerados_no += gerados
+        tarefas_no += 1
+    
+    print(f"[{fila.no}] {tarefas_no} tarefas, {gerados_no} saídas geradas")
+    return gerados_no
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fila em pasta compartilhada para gerar um plano em várias máquinas")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    
+    criar = subparsers.add_parser('criar', help="Criar a fila de um plano")
+    criar.add_argument('plano')
+    criar.add_argument('pasta_saida')
+    criar.add_argument('--fila', required=True, help="Pasta da fila (compartilhada)")
+    criar.add_argument('--lote', type=int, default=16, help="Grupos do plano por tarefa")
+    criar.add_argument('--stft', default=None, help="Pasta do cache de STFTs")
+    criar.add_argument('--rotulos-quadros', action='store_true', help="Gravar os rótulos por quadro (60s)")
+    criar.add_argument('--sem-espectrograma', action='store_true', help="Overlaps sem espectrograma")
+    
+    trabalho = subparsers.add_parser('trabalhar', help="Processar tarefas da fila até ela terminar")
+    trabalho.add_argument('fila')
+    trabalho.add_argument('--no', default=None, help="Identificação do nó (default: máquina-pid)")
+    trabalho.add_argument('--lease', type=float, default=DURACAO_LEASE_S, help="Duração do lease (s)")
+    trabalho.add_argument('--processos', type=int, default=1, help="Nós (processos) nesta máquina")
+    trabalho.add_argument('--tentativas', type=int, default=MAX_TENTATIVAS,
+                          help="Tentativas de uma tarefa com saídas faltando antes de concluí-la incompleta")
+    
+    estado = subparsers.add_parser('estado', help="Resumo da fila")
+    estado.add_argument('fila')
+    args = parser.parse_args()
+    
+    if args.comando == 'criar':
+        criar_fila(args.plano, args.pasta_saida, args.fila, args.lote, args.stft, args.rotulos_quadros,
+                   not args.sem_espectrograma)
+    elif args.comando == 'trabalhar':
+        if args.processos == 1:
+            trabalhar(args.fila, args.no, args.lease, max_tentativas=args.tentativas)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            nos = [f"{args.no or socket.gethostname()}-{i}" for i in range(args.processos)]
+            with ProcessPoolExecutor(max_workers=args.processos) as executor:
+                gerados = sum(executor.map(trabalhar, [args.fila] * len(nos), nos, [args.lease] * len(nos),
+                                           [None] * len(nos), [None] * len(nos), [args.tentativas] * len(nos)))
+            print(f"{gerados} saídas geradas nesta máquina")
+    else:
+        print(json.dumps(FilaCompartilhada(args.fila).estado(), indent=2))
@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Categorias de tempo medidas nas etapas do pipeline
+CATEGORIAS = ('decodificacao', 'reamostragem', 'mixagem', 'espectrograma', 'grafico', 'escrita')
+
+# Estado global: quando desativado, medir() devolve um contexto vazio pré-alocado
+# e os contadores retornam imediatamente, de forma que o custo é só uma checagem
+_ativo = False
+_mostrar_progresso = False
+_NULO = contextlib.nullcontext()
+_tempos = {}
+_chamadas = {}
+_contadores = {}
+_inicio_execucao = None
+_progresso = {}
+# medir() e contar() também são chamados pelas threads de ArmazenamentoAssincrono
+_trava = threading.Lock()
+
+def ativar(progresso=False):
+    """
+    Liga a instrumentação (e zera os dados coletados)
+    
+    Args:
+        progresso (bool): Se True, mostra uma linha de vazão/ETA durante os laços
+    """
+    global _ativo, _mostrar_progresso
+    resetar()
+    _ativo = True
+    _mostrar_progresso = progresso
+
+def desativar():
+    global _ativo, _mostrar_progresso
+    _ativo = False
+    _mostrar_progresso = False
+
+def ativo():
+    return _ativo
+
+def resetar():
+    global _inicio_execucao
+    with _trava:
+        _tempos.clear()
+        _chamadas.clear()
+        _contadores.clear()
+    _progresso.clear()
+    _inicio_execucao = time.perf_counter()
+
+class _Cronometro:
+    __slots__ = ('categoria', 'inicio')
+    
+    def __init__(self, categoria):
+        self.categoria = categoria
+    
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        decorrido = time.perf_counter() - self.inicio
+        with _trava:
+            _tempos[self.categoria] = _tempos.get(self.categoria, 0.0) + decorrido
+            _chamadas[self.categoria] = _chamadas.get(self.categoria, 0) + 1
+        return False
+
+def medir(categoria):
+    """
+    Contexto que acumula o tempo gasto na categoria (ex: 'decodificacao')
+    
+    Uso:
+        with instrumentacao.medir('mixagem'):
+            base = base.overlay(audio2, position=inicio)
+    """
+    if not _ativo:
+        return _NULO
+    return _Cronometro(categoria)
+
+def contar(nome, valor=1):
+    """Soma `valor` ao contador `nome`"""
+    if _ativo:
+        with _trava:
+            _contadores[nome] = _contadores.get(nome, 0) + valor
+
+def registrar_leitura(caminho):
+    """Conta os bytes de um arquivo lido"""
+    if _ativo:
+        try:
+            contar('bytes_lidos', os.path.getsize(caminho))
+        except OSError:
+            pass
+
+def registrar_escrita(caminho):
+    """Conta os bytes de um arquivo gravado"""
+    if _ativo:
+        try:
+            contar('bytes_escritos', os.path.getsize(caminho))
+        except OSError:
+            pass
+
+def progresso(etapa, feitos, total, intervalo_s=0.5):
+    """
+    Atualiza a linha de progresso (itens/s e ETA) de uma etapa, se habilitada
+    
+    Args:
+        etapa (str): Nome da etapa ou do laço
+        feitos (int): Itens concluídos até agora
+        total (int): Total de itens
+        intervalo_s (float): Intervalo mínimo entre atualizações da linha
+    """
+    if not _mostrar_progresso:
+        return
+    agora = time.perf_counter()
+    estado = _progresso.get(etapa)
+    if estado is None or feitos < estado['feitos']:
+        estado = _progresso[etapa] = {'inicio': agora, 'ultima': 0.0, 'feitos': 0}
+    estado['feitos'] = feitos
+    if feitos < total and agora - estado['ultima'] < intervalo_s:
+        return
+    estado['ultima'] = agora
+    
+    decorrido = max(agora - estado['inicio'], 1e-9)
+    vazao = feitos / decorrido
+    eta = (total - feitos) / vazao if vazao > 0 else float('inf')
+    sys.stderr.write(f"\r{etapa}: {feitos}/{total} ({vazao:.1f}/s, ETA {eta:.0f}s)   ")
+    if feitos >= total:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+def pico_memoria_mb():
+    """Pico de memória residente do processo em MB (None se indisponível)"""
+    if resource is not None:
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reporta em KB, macOS em bytes
+        return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    except (ImportError, AttributeError):
+        return None
+
+def relatorio():
+    """
+    Relatório estruturado da execução
+    
+    Returns:
+        dict: Tempo total, tempo e chamadas por categoria, contadores, bytes e pico de memória
+    """
+    total = time.perf_counter() - _inicio_execucao if _inicio_execucao is not None else 0.0
+    with _trava:
+        categorias = {categoria: {'tempo_s': _tempos[categoria], 'chamadas': _chamadas[categoria]}
+                      for categoria in sorted(_tempos)}
+        contadores = dict(_contadores)
+    return {
+        'tempo_total_s': total,
+        'categorias': categorias,
+        'contadores': contadores,
+        'bytes_lidos': contadores.get('bytes_lidos', 0),
+        'bytes_escritos': contadores.get('bytes_escritos', 0),
+        'pico_memoria_mb': pico_memoria_mb()
+    }
+
+def imprimir_relatorio():
+    """
+    Imprime o tempo por categoria, os contadores e o volume de I/O
+    """
+    dados = relatorio()
+    total = max(dados['tempo_total_s'], 1e-9)
+    print("\n" + "="*60)
+    print("INSTRUMENTAÇÃO")
+    print("="*60)
+    print(f"Tempo total: {dados['tempo_total_s']:.2f}s")
+    for categoria, valores in sorted(dados['categorias'].items(), key=lambda x: x[1]['tempo_s'], reverse=True):
+        print(f"  {categoria:15s} {valores['tempo_s']:8.2f}s ({valores['tempo_s'] / total * 100:5.1f}%) "
+              f"em {valores['chamadas']} chamadas")
+    for nome, valor in sorted(dados['contadores'].items()):
+        if not nome.startswith('bytes_'):
+            print(f"  {nome}: {valor}")
+    print(f"Lidos: {dados['bytes_lidos'] / 1e6:.1f} MB  Gravados: {dados['bytes_escritos'] / 1e6:.1f} MB")
+    if dados['pico_memoria_mb'] is not None:
+        print(f"Pico de memória: {dados['pico_memoria_mb']:.0f} MB")
+
+def salvar_relatorio(caminho):
+    """
+    Salva o relatório da execução em JSON
+    """
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(relatorio(), f, indent=2)
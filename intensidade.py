@@ -0,0 +1,198 @@
+import os
+import json
+import glob
+import wave
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import instrumentacao
+
+# Quadros de 10 ms; são "ativos" os quadros a até 30 dB do quadro mais forte
+QUADRO_MS = 10
+LIMIAR_ATIVO_DB = 30
+PISO_DB = -120.0
+
+def _db(potencia):
+    return max(10 * np.log10(max(float(potencia), 1e-30)), PISO_DB)
+
+def ler_amostras(caminho):
+    """
+    Lê um WAV PCM como float32 mono em [-1, 1] (sem passar pelo pydub)
+    
+    Returns:
+        tuple: (np.ndarray, taxa de amostragem)
+    """
+    with wave.open(caminho, 'rb') as f:
+        largura, canais, taxa = f.getsampwidth(), f.getnchannels(), f.getframerate()
+        dados = f.readframes(f.getnframes())
+    if largura == 1:
+        amostras = (np.frombuffer(dados, dtype=np.uint8).astype(np.float32) - 128) / 128
+    else:
+        tipo = {2: np.int16, 4: np.int32}[largura]
+        amostras = np.frombuffer(dados, dtype=tipo).astype(np.float32) / float(1 << (8 * largura - 1))
+    if canais > 1:
+        amostras = amostras.reshape(-1, canais).mean(axis=1)
+    return amostras, taxa
+
+def medir_intensidade(amostras, taxa):
+    """
+    RMS, pico e nível de energia ativa de um clipe (todos em dBFS)
+    
+    O nível ativo é a potência média só dos quadros de 10 ms a até LIMIAR_ATIVO_DB
+    do quadro mais forte, de forma que silêncio no início/fim do corte não abaixa o nível.
+    
+    Returns:
+        dict: {'rms_db', 'pico_db', 'ativo_db', 'duracao_ms'}
+    """
+    if len(amostras) == 0:
+        return {'rms_db': PISO_DB, 'pico_db': PISO_DB, 'ativo_db': PISO_DB, 'duracao_ms': 0}
+    quadrado = amostras.astype(np.float64) ** 2
+    tamanho_quadro = max(1, taxa * QUADRO_MS // 1000)
+    n_quadros = max(1, len(amostras) // tamanho_quadro)
+    if len(amostras) >= tamanho_quadro:
+        energias = quadrado[:n_quadros * tamanho_quadro].reshape(n_quadros, tamanho_quadro).mean(axis=1)
+    else:
+        energias = quadrado.mean(keepdims=True)
+    ativos = energias[energias >= energias.max() * 10 ** (-LIMIAR_ATIVO_DB / 10)]
+    return {
+        'rms_db': round(_db(quadrado.mean()), 2),
+        'pico_db': round(_db(np.max(quadrado)), 2),
+        'ativo_db': round(_db(ativos.mean()), 2),
+        'duracao_ms': round(1000 * len(amostras) / taxa)
+    }
+
+def _medir_arquivos(caminhos):
+    resultados = {}
+    for caminho in caminhos:
+        try:
+            info = os.stat(caminho)
+            with instrumentacao.medir('decodificacao'):
+                amostras, taxa = ler_amostras(caminho)
+            resultados[caminho] = {'tamanho': info.st_size, 'mtime_ns': info.st_mtime_ns,
+                                   **medir_intensidade(amostras, taxa)}
+        except Exception as e:
+            print(f"Erro ao medir {os.path.basename(caminho)}: {str(e)}")
+    return resultados
+
+def carregar_indice(caminho_indice):
+    """Lê o índice de intensidades (dict caminho -> medidas); vazio se não existir"""
+    try:
+        with open(caminho_indice, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def criar_indice_intensidade(pastas, caminho_indice, n_workers=None, tamanho_lote=256):
+    """
+    Mede RMS, pico e nível ativo de todos os .wav das pastas (recursivamente) e
+    grava o índice em JSON. Entradas de arquivos inalterados (tamanho e mtime)
+    são reaproveitadas.
+    
+    Args:
+        pastas (list): Pastas de cortes e de background
+        caminho_indice (str): Arquivo JSON do índice
+        n_workers (int): Processos em paralelo (default: os.cpu_count())
+        tamanho_lote (int): Arquivos por tarefa
+    
+    Returns:
+        dict: Índice caminho absoluto -> medidas
+    """
+    indice = carregar_indice(caminho_indice)
+    pendentes = []
+    vistos = set()
+    for pasta in pastas:
+        for caminho in glob.glob(os.path.join(pasta, '**', '*.wav'), recursive=True):
+            caminho = os.path.abspath(caminho)
+            vistos.add(caminho)
+            info = os.stat(caminho)
+            entrada = indice.get(caminho)
+            if entrada is None or (entrada['tamanho'], entrada['mtime_ns']) != (info.st_size, info.st_mtime_ns):
+                pendentes.append(caminho)
+    
+    # Remover entradas de arquivos que não existem mais nas pastas
+    prefixos = tuple(os.path.join(os.path.abspath(pasta), '') for pasta in pastas)
+    for caminho in [caminho for caminho in indice if caminho.startswith(prefixos) and caminho not in vistos]:
+        del indice[caminho]
+    
+    print(f"Medindo {len(pendentes)} arquivos ({len(vistos) - len(pendentes)} já no índice)")
+    lotes = [pendentes[i:i + tamanho_lote] for i in range(0, len(pendentes), tamanho_lote)]
+    if n_workers == 1 or len(lotes) <= 1:
+        for lote in lotes:
+            indice.update(_medir_arquivos(lote))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            for resultados in executor.map(_medir_arquivos, lotes):
+                indice.update(resultados)
+    
+    caminho_tmp = caminho_indice + '.tmp'
+    with open(caminho_tmp, 'w', encoding='utf-8') as f:
+        json.dump(indice, f)
+    os.replace(caminho_tmp, caminho_indice)
+    return indice
+
+class AlvoNivel:
+    """
+    Ganhos com nível relativo alvo, calculados só a partir do índice de intensidades
+    
+    Args:
+        caminho_indice (str): Índice criado por criar_indice_intensidade
+        nivel_relativo (dict): Tipo de overlap -> (min, max) em dB do áudio reduzido em
+                               relação ao outro, ex: {"pp": (-14, -8), "kp": (-6, 0)}
+        snr_db (tuple): (min, max) em dB das vocalizações em relação ao background
+                        nos áudios de 60s
+        medida (str): 'ativo_db' (default), 'rms_db' ou 'pico_db'
+    """
+    def __init__(self, caminho_indice, nivel_relativo=None, snr_db=None, medida='ativo_db'):
+        self.indice = carregar_indice(caminho_indice)
+        self.nivel_relativo = nivel_relativo or {}
+        self.snr_db = snr_db
+        self.medida = medida
+        self._nivel_fundo = {}
+    
+    def nivel(self, caminho):
+        """Nível do clipe em dBFS, ou None se não estiver no índice"""
+        entrada = self.indice.get(os.path.abspath(caminho))
+        return entrada[self.medida] if entrada else None
+    
+    def faixa(self, label_referencia, label):
+        """Faixa em dB de `label` em relação a `label_referencia`, ou None"""
+        faixa = self.nivel_relativo.get(f"{label_referencia}{label}")
+        if faixa is None:
+            faixa = self.nivel_relativo.get(f"{label}{label_referencia}")
+        return faixa
+    
+    def ganho(self, caminho_referencia, label_referencia, caminho, label, rng):
+        """
+        Ganho linear para que `caminho` fique no nível sorteado em relação à referência
+        
+        Returns:
+            float: Ganho, ou None se não houver faixa para o par ou níveis no índice
+        """
+        faixa = self.faixa(label_referencia, label)
+        nivel_referencia, nivel = self.nivel(caminho_referencia), self.nivel(caminho)
+        if faixa is None or nivel_referencia is None or nivel is None:
+            return None
+        return 10 ** ((nivel_referencia + rng.uniform(*faixa) - nivel) / 20)
+    
+    def nivel_fundo(self, arquivos_background):
+        """Mediana dos níveis RMS dos backgrounds (calculada uma vez por lista)"""
+        chave = tuple(arquivos_background)
+        if chave not in self._nivel_fundo:
+            niveis = [self.indice[os.path.abspath(arquivo)]['rms_db'] for arquivo in arquivos_background
+                      if os.path.abspath(arquivo) in self.indice]
+            self._nivel_fundo[chave] = float(np.median(niveis)) if niveis else None
+        return self._nivel_fundo[chave]
+    
+    def descricao(self):
+        """Configuração do alvo (entra nas chaves do cache de artefatos)"""
+        return {'nivel_relativo': self.nivel_relativo, 'snr_db': self.snr_db, 'medida': self.medida}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Índice de intensidade (RMS, pico, nível ativo) dos cortes")
+    parser.add_argument('pastas', nargs='+', help="Pastas de cortes e background")
+    parser.add_argument('--indice', default='intensidades.json')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    
+    indice = criar_indice_intensidade(args.pastas, args.indice, args.workers)
+    print(f"{len(indice)} arquivos no índice {args.indice}")
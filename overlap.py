@@ -1,18 +1,27 @@
 import os
+import csv
+import math
 import random
-import glob
 import numpy as np
-import librosa
-import librosa.display
-import matplotlib.pyplot as plt
 from pydub import AudioSegment
+from armazenamento import ArmazenamentoDisco
+from cache_artefatos import CacheArtefatos, versao_codigo, gerador
+from catalogo import CatalogoCortes
+from intensidade import AlvoNivel
+from duplicatas import carregar_duplicatas
+from espectros import CacheSTFT, HOP, quantizar_inicio
+import instrumentacao
 import warnings
-from itertools import combinations
 
+# librosa e matplotlib só são importados em gerar_espectrograma: quem não gera espectrogramas
+# (espectrograma=False, workers do plano.py) não paga a importação
 # Ignorar warnings específicos do Librosa
 warnings.filterwarnings("ignore", category=UserWarning)
 
-def criar_pares_com_overlap_e_espectrograma(pasta_labels, pasta_saida, pares_vocalizacoes, taxa_reducao=None, n=1000):
+def criar_pares_com_overlap_e_espectrograma(pasta_labels, pasta_saida, pares_vocalizacoes, taxa_reducao=None, n=1000,
+                                            armazenamento=None, semente=None, pasta_cache=None, variantes=1,
+                                            caminho_catalogo=None, caminho_intensidades=None, nivel_relativo=None,
+                                            pasta_stft=None, caminho_duplicatas=None, espectrograma=True):
     """
     Cria pares de áudios com sobreposição baseados em tipos de vocalizações específicos
     
@@ -20,129 +29,341 @@ def criar_pares_com_overlap_e_espectrograma(pasta_labels, pasta_saida, pares_voc
         pasta_labels (str): Pasta com os áudios cortados das labels (cada label em sua pasta)
         pasta_saida (str): Pasta para salvar os áudios combinados e espectrogramas
         pares_vocalizacoes (list): Lista de pares de vocalizações ex: [["l", "l"],["p","p"],["k","p"]]
+                                   (trios como ["p","p","l"] geram overlaps de três áudios)
         taxa_reducao (dict): Dicionário com taxas de redução por label. 
                             Keys: labels (ex: "p", "l", "k")
                             Values: tuples (min, max) ou None para não aplicar redução
                             Exemplo: {"p": (0.15, 0.2), "l": (0.1, 0.15), "k": None}
         n (int): Número máximo de overlaps para cada tipo de vocalização (default: 1000)
+        armazenamento: De onde ler os cortes e onde gravar os overlaps (default: ArmazenamentoDisco)
+        semente (int): Se informada, cada tipo e cada par têm seu próprio gerador aleatório
+                       derivado dela, de modo que mudar um par não altera os sorteios dos outros
+        pasta_cache (str): Armazém de artefatos (CacheArtefatos); overlaps com as mesmas
+                           entradas são reaproveitados em vez de gerados novamente
+        variantes (int): Número de variantes (ordem, ganhos e deslocamentos diferentes) geradas
+                         de cada par/trio carregado; com mais de uma, as variantes são mixadas
+                         em lote e registradas em `pasta_saida/variantes.csv`
+        caminho_catalogo (str): Banco SQLite do catálogo de cortes (CatalogoCortes); a listagem
+                                vem do catálogo, que só revarre pastas cujo mtime mudou
+        caminho_intensidades (str): Índice de intensidade (intensidade.py) dos cortes
+        nivel_relativo (dict): Tipo de overlap -> (min, max) em dB do áudio reduzido em relação
+                               ao outro, ex: {"pp": (-14, -8)}; com o índice, substitui
+                               taxa_reducao para os tipos listados
+        pasta_stft (str): Se informada, guarda a STFT de cada corte (CacheSTFT) e monta o
+                          espectrograma de cada overlap somando as STFTs deslocadas e com
+                          ganho, sem nova FFT; o início do overlap é quantizado ao hop (128 amostras)
+        caminho_duplicatas (str): Lista de cortes duplicados (duplicatas.py); as duplicatas ficam
+                                  fora do sorteio e nunca são lidas nem mixadas
+        espectrograma (bool): Se False, grava só os áudios (sem PNG, sem STFT e sem importar
+                              librosa/matplotlib)
     """
     # Inicializar taxa_reducao como dict vazio se None
     if taxa_reducao is None:
         taxa_reducao = {}
+    if armazenamento is None:
+        armazenamento = ArmazenamentoDisco()
+    cache = CacheArtefatos(pasta_cache, versao_codigo(__file__)) if pasta_cache else None
+    alvo_nivel = AlvoNivel(caminho_intensidades, nivel_relativo) if caminho_intensidades else None
+    espectros = CacheSTFT(pasta_stft) if pasta_stft and espectrograma else None
     # Garantir que a pasta de saída existe
-    os.makedirs(pasta_saida, exist_ok=True)
+    armazenamento.criar_pasta(pasta_saida)
     
-    # Coletar todos os arquivos por label
+    # Coletar todos os arquivos por label, identificados por ids inteiros
+    catalogo = CatalogoCortes(caminho_catalogo) if caminho_catalogo else None
+    excluir = carregar_duplicatas(caminho_duplicatas) if caminho_duplicatas else None
+    caminhos, arquivos_por_label = coletar_cortes(pasta_labels, armazenamento, catalogo, excluir=excluir)
+    
+    # Sortear os cortes de todos os tipos (ids inteiros; bitmap dos já usados)
+    grupos = selecionar_overlaps(caminhos, arquivos_por_label, pares_vocalizacoes, n, semente)
+    metadados = []  # Componentes de cada variante gerada em lote (variantes.csv)
+    
+    for nome_pasta, itens in grupos:
+        # Criar pasta para este tipo de overlap
+        pasta_overlap = os.path.join(pasta_saida, nome_pasta)
+        armazenamento.criar_pasta(pasta_overlap)
+        armazenamento.antecipar([tuple(caminhos[id_corte] for id_corte in ids) for ids, _ in itens])
+        
+        for indice, (ids, labels) in enumerate(itens):
+            instrumentacao.progresso(f"overlap {nome_pasta}", indice, len(itens))
+            arquivos = [caminhos[id_corte] for id_corte in ids]
+            
+            rng = gerador(semente, nome_pasta, *[os.path.basename(arq) for arq in arquivos])
+            if variantes > 1 or len(ids) == 3:
+                # K variantes do mesmo par/trio, com a ordem sorteada em cada uma
+                processar_variantes(arquivos, pasta_overlap, list(labels), taxa_reducao, variantes,
+                                    armazenamento, rng, cache, metadados, alvo_nivel, espectros, espectrograma)
+                continue
+            
+            # Escolher aleatoriamente qual áudio começa primeiro
+            (arq1, arq2), (label1, label2) = arquivos, labels
+            if rng.random() < 0.5:
+                arq1, arq2 = arq2, arq1
+                # Na pasta 'w' a label acompanha o arquivo; nos tipos pedidos ela segue a posição no par
+                if nome_pasta == 'w':
+                    label1, label2 = label2, label1
+            
+            # Processar o overlap com taxa de redução específica
+            processar_overlap(arq1, arq2, pasta_overlap, label1, label2, taxa_reducao, armazenamento, rng, cache,
+                              alvo_nivel, espectros, espectrograma)
+        instrumentacao.progresso(f"overlap {nome_pasta}", len(itens), len(itens))
+    
+    if catalogo is not None:
+        catalogo.fechar()
+    armazenamento.aguardar()
+    if metadados:
+        salvar_metadados_variantes(metadados, os.path.join(pasta_saida, 'variantes.csv'))
+    if cache is not None:
+        cache.salvar_hashes()
+
+def coletar_cortes(pasta_labels, armazenamento, catalogo=None, ignorar=("u",), excluir=None):
+    """
+    Lista os cortes de cada label (subpasta de `pasta_labels`) com ids inteiros
+    
+    Args:
+        pasta_labels (str): Pasta com uma subpasta por label
+        armazenamento: Usado para listar quando não há catálogo
+        catalogo (CatalogoCortes): Se informado, os ids e a listagem vêm do catálogo
+        ignorar (tuple): Labels ignoradas (a pasta "u" é de background)
+        excluir (set): Caminhos absolutos que ficam fora da listagem (ex: duplicatas)
+    
+    Returns:
+        tuple: (dict id -> caminho, dict label -> np.ndarray de ids)
+    """
+    caminhos = {}
     arquivos_por_label = {}
-    for label_pasta in os.listdir(pasta_labels):
-        # Pule a pasta "u"
-        if label_pasta == "u":
-            continue
-        caminho_label = os.path.join(pasta_labels, label_pasta)
-        if os.path.isdir(caminho_label):
-            arquivos = glob.glob(os.path.join(caminho_label, '*.wav'))
+    if catalogo is not None:
+        for label in catalogo.atualizar_raiz(pasta_labels):
+            if label in ignorar:
+                continue
+            ids, arquivos = catalogo.listar(os.path.join(pasta_labels, label))
+            if excluir:
+                manter = [os.path.abspath(arquivo) not in excluir for arquivo in arquivos]
+                ids, arquivos = ids[np.array(manter, dtype=bool)], [a for a, m in zip(arquivos, manter) if m]
             if arquivos:
-                arquivos_por_label[label_pasta] = arquivos
+                caminhos.update(zip(ids.tolist(), arquivos))
+                arquivos_por_label[label] = ids
+        return caminhos, arquivos_por_label
     
-    # Processar cada par específico de vocalizações
-    arquivos_usados = set()  # Para tracking dos arquivos já usados (não podem ser reutilizados)
+    for label in armazenamento.listar_pastas(pasta_labels):
+        if label in ignorar:
+            continue
+        arquivos = armazenamento.listar_wavs(os.path.join(pasta_labels, label))
+        if excluir:
+            arquivos = [arquivo for arquivo in arquivos if os.path.abspath(arquivo) not in excluir]
+        if arquivos:
+            ids = np.arange(len(caminhos), len(caminhos) + len(arquivos))
+            caminhos.update(zip(ids.tolist(), arquivos))
+            arquivos_por_label[label] = ids
+    return caminhos, arquivos_por_label
+
+def selecionar_overlaps(caminhos, arquivos_por_label, pares_vocalizacoes, n, semente=None):
+    """
+    Sorteia os cortes de cada overlap de todos os tipos, sem carregar áudio. Cada corte é
+    usado em um único tipo; a pasta 'w' recebe pares aleatórios dos cortes que sobraram.
+    
+    Args:
+        caminhos (dict): id -> caminho (de coletar_cortes)
+        arquivos_por_label (dict): label -> np.ndarray de ids
+        pares_vocalizacoes (list): Pares (ou trios) de labels
+        n (int): Número máximo de overlaps por tipo
+        semente (int): Semente dos geradores de cada tipo
+    
+    Returns:
+        list: (nome da pasta, lista de (ids, labels)) por tipo, na ordem de geração
+    """
+    # Bitmap dos ids já usados (não podem ser reutilizados)
+    arquivos_usados = np.zeros(max(caminhos, default=-1) + 1, dtype=bool)
+    grupos = []
     
     for par in pares_vocalizacoes:
-        label1, label2 = par
-        nome_pasta = f"{label1}{label2}"
-        
-        # Criar pasta para este tipo de overlap
-        pasta_overlap = os.path.join(pasta_saida, nome_pasta)
-        os.makedirs(pasta_overlap, exist_ok=True)
+        nome_pasta = ''.join(par)
+        itens = []
+        grupos.append((nome_pasta, itens))
         
         # Verificar se as labels existem
-        if label1 not in arquivos_por_label or label2 not in arquivos_por_label:
-            print(f"Aviso: Labels {label1} ou {label2} não encontradas. Pulando par.")
+        if any(label not in arquivos_por_label for label in par):
+            print(f"Aviso: Alguma das labels {', '.join(par)} não foi encontrada. Pulando {nome_pasta}.")
             continue
         
-        # Criar todos os pares possíveis sem repetição, excluindo arquivos já usados
-        arquivos1 = [arq for arq in arquivos_por_label[label1] if arq not in arquivos_usados]
-        arquivos2 = [arq for arq in arquivos_por_label[label2] if arq not in arquivos_usados]
-        
-        pares_possiveis = []
-        
-        if label1 == label2:
-            # Mesmo label: usar combinações sem repetição
-            pares_possiveis = list(combinations(arquivos1, 2))
-        else:
-            # Labels diferentes: produto cartesiano
-            for arq1 in arquivos1:
-                for arq2 in arquivos2:
-                    pares_possiveis.append((arq1, arq2))
-        
-        # Processar cada par possível (limitado a n overlaps)
-        if len(pares_possiveis) > n:
-            pares_selecionados = random.sample(pares_possiveis, n)
+        # Apenas arquivos ainda não usados
+        listas = [arquivos_por_label[label][~arquivos_usados[arquivos_por_label[label]]].tolist() for label in par]
+        rng = gerador(semente, nome_pasta)
+        if len(par) == 3:
+            selecionados = sortear_combinacoes(listas, n, rng)
+            print(f"Processando {len(selecionados)} overlaps triplos para {nome_pasta}")
         else:
-            pares_selecionados = pares_possiveis
+            selecionados, total = sortear_pares(listas[0], listas[1] if par[0] != par[1] else None, n, rng)
+            print(f"Processando {len(selecionados)} overlaps para {nome_pasta} (de {total} possíveis)")
         
-        print(f"Processando {len(pares_selecionados)} overlaps para {nome_pasta} (de {len(pares_possiveis)} possíveis)")
-        
-        for arq1, arq2 in pares_selecionados:
+        for ids in selecionados:
             # Marcar os arquivos como usados (não podem ser reutilizados)
-            arquivos_usados.add(arq1)
-            arquivos_usados.add(arq2)
-            
-            # Escolher aleatoriamente qual áudio começa primeiro
-            if random.random() < 0.5:
-                arq1, arq2 = arq2, arq1
-            
-            # Processar o overlap com taxa de redução específica
-            processar_overlap(arq1, arq2, pasta_overlap, label1, label2, taxa_reducao)
+            arquivos_usados[list(ids)] = True
+            itens.append((tuple(ids), tuple(par)))
     
-    # Criar pasta 'w' com overlaps aleatórios não utilizados
+    # Pasta 'w' com overlaps aleatórios dos arquivos não utilizados
     if n > 0:
-        criar_overlaps_aleatorios(arquivos_por_label, pasta_saida, arquivos_usados, taxa_reducao, n)
+        itens = []
+        grupos.append(('w', itens))
+        arquivos_disponiveis = []
+        label_por_arquivo = {}
+        for label, ids in arquivos_por_label.items():
+            for id_corte in ids[~arquivos_usados[ids]].tolist():
+                arquivos_disponiveis.append(id_corte)
+                label_por_arquivo[id_corte] = label
+        
+        print(f"Arquivos disponíveis para overlaps aleatórios: {len(arquivos_disponiveis)}")
+        if len(arquivos_disponiveis) < 2:
+            print("Não há arquivos suficientes disponíveis para criar overlaps aleatórios.")
+        else:
+            selecionados, _ = sortear_pares(arquivos_disponiveis, None, n, gerador(semente, 'w'), sempre_sortear=True)
+            print(f"Criando {len(selecionados)} overlaps aleatórios na pasta 'w'")
+            itens.extend((ids, (label_por_arquivo[ids[0]], label_por_arquivo[ids[1]])) for ids in selecionados)
+    
+    return grupos
 
-def criar_overlaps_aleatorios(arquivos_por_label, pasta_saida, arquivos_usados, taxa_reducao, n):
+def sortear_pares(lista1, lista2, n, rng=random, sempre_sortear=False):
+    """
+    Sorteia até n pares distintos sem materializar todos os pares possíveis. Os pares são
+    indexados na ordem de itertools.combinations (lista2=None) ou do produto cartesiano,
+    e rng.sample sobre range(total) escolhe os mesmos índices que escolheria na lista.
+    
+    Args:
+        lista1 (list): Arquivos da primeira posição
+        lista2 (list): Arquivos da segunda posição; None para pares dentro de lista1
+        n (int): Número máximo de pares
+        rng: Gerador aleatório
+        sempre_sortear (bool): Sortear (embaralhar) mesmo quando há n pares ou menos
+    
+    Returns:
+        tuple: (lista de pares, número de pares possíveis)
     """
-    Cria overlaps aleatórios usando apenas arquivos que não foram utilizados anteriormente
+    if lista2 is None:
+        total = len(lista1) * (len(lista1) - 1) // 2
+        par_por_indice = lambda k: _combinacao_por_indice(lista1, k)
+    else:
+        total = len(lista1) * len(lista2)
+        par_por_indice = lambda k: (lista1[k // len(lista2)], lista2[k % len(lista2)])
+    if total > n or sempre_sortear:
+        indices = rng.sample(range(total), min(n, total))
+    else:
+        indices = range(total)
+    return [par_por_indice(k) for k in indices], total
+
+def _combinacao_por_indice(lista, k):
+    """k-ésimo par de itertools.combinations(lista, 2)"""
+    m = len(lista)
+    # Pares começando antes de i: i * (2m - i - 1) / 2
+    antes = lambda i: i * (2 * m - i - 1) // 2
+    i = (2 * m - 1 - math.isqrt((2 * m - 1) ** 2 - 8 * k)) // 2
+    while antes(i + 1) <= k:
+        i += 1
+    while antes(i) > k:
+        i -= 1
+    return lista[i], lista[i + 1 + k - antes(i)]
+
+def sortear_combinacoes(listas, n, rng=random, tentativas_por_item=20):
     """
-    pasta_outros = os.path.join(pasta_saida, 'w')
-    os.makedirs(pasta_outros, exist_ok=True)
+    Sorteia até n combinações distintas com um arquivo de cada lista (sem repetir arquivo
+    dentro de uma combinação)
     
-    # Coletar todos os arquivos disponíveis que não foram usados
-    arquivos_disponiveis = []
-    arquivos_por_arquivo = {}  # Mapeia arquivo para sua label
-    for label, arquivos in arquivos_por_label.items():
-        for arquivo in arquivos:
-            if arquivo not in arquivos_usados:
-                arquivos_disponiveis.append(arquivo)
-                arquivos_por_arquivo[arquivo] = label
+    Args:
+        listas (list): Uma lista de arquivos por posição da combinação
+        n (int): Número de combinações desejado
+        rng: Gerador aleatório
+        tentativas_por_item (int): Limite de sorteios por combinação pedida
     
-    print(f"Arquivos disponíveis para overlaps aleatórios: {len(arquivos_disponiveis)}")
+    Returns:
+        list: Lista de tuplas de arquivos
+    """
+    if any(not lista for lista in listas):
+        return []
+    escolhidas = set()
+    combinacoes = []
+    for _ in range(n * tentativas_por_item):
+        if len(combinacoes) >= n:
+            break
+        combinacao = tuple(rng.choice(lista) for lista in listas)
+        chave = tuple(sorted(combinacao))
+        if len(set(combinacao)) < len(combinacao) or chave in escolhidas:
+            continue
+        escolhidas.add(chave)
+        combinacoes.append(combinacao)
+    return combinacoes
+
+def parametros_overlap(duracao1, duracao2, label1, label2, taxa_reducao, rng=random, alvo_nivel=None,
+                       arquivos=None):
+    """
+    Sorteia os parâmetros de um overlap a partir apenas das durações dos áudios
+    
+    Args:
+        duracao1 (int): Duração do primeiro áudio (ms)
+        duracao2 (int): Duração do segundo áudio (ms)
+        label1 (str): Label do primeiro arquivo
+        label2 (str): Label do segundo arquivo
+        taxa_reducao (dict): Dicionário com taxas de redução por label
+        rng: Gerador aleatório (default: módulo random)
+        alvo_nivel (AlvoNivel): Se houver faixa de nível para o par, o ganho do áudio
+                                reduzido é calculado pelo índice de intensidade
+        arquivos (tuple): Caminhos dos dois áudios (necessários com alvo_nivel)
     
-    # Verificar se temos arquivos suficientes para criar pares
-    if len(arquivos_disponiveis) < 2:
-        print("Não há arquivos suficientes disponíveis para criar overlaps aleatórios.")
-        return
+    Returns:
+        tuple: (áudio reduzido: 1, 2 ou None, taxa de redução linear ou None, início do overlap em ms)
+    """
+    # Determinar qual áudio será reduzido baseado nas regras específicas
+    audio_reduzido = None  # 1 ou 2
+    label_para_reducao = None
     
-    # Criar lista de todos os pares possíveis com arquivos disponíveis
-    pares_disponiveis = list(combinations(arquivos_disponiveis, 2))
+    if label1 == label2:
+        # Mesmo label: aplicar regras específicas
+        if label1 == "l":
+            # Para "l", reduzir o de menor duração
+            if duracao1 < duracao2:
+                audio_reduzido = 1
+                label_para_reducao = label1
+            else:
+                audio_reduzido = 2
+                label_para_reducao = label2
+        elif label1 == "p":
+            # Para "p", reduzir o de maior duração
+            if duracao1 > duracao2:
+                audio_reduzido = 1
+                label_para_reducao = label1
+            else:
+                audio_reduzido = 2
+                label_para_reducao = label2
+        else:
+            # Para outros pares iguais, usar a lógica antiga (reduzir audio2)
+            audio_reduzido = 2
+            label_para_reducao = label2
+    else:
+        # Labels diferentes: reduzir audio2 (lógica original)
+        audio_reduzido = 2
+        label_para_reducao = label2
     
-    # Selecionar N pares aleatórios
-    n_disponiveis = min(n, len(pares_disponiveis))
-    pares_selecionados = random.sample(pares_disponiveis, n_disponiveis)
+    # Gerar taxa de redução aleatória dentro da faixa especificada
+    reduzido, taxa_red = None, None
+    if alvo_nivel is not None and arquivos is not None:
+        # Nível alvo em relação ao áudio não reduzido; sem faixa/índice, usa taxa_reducao
+        reduzido = audio_reduzido
+        referencia = 0 if reduzido == 2 else 1
+        taxa_red = alvo_nivel.ganho(arquivos[referencia], (label1, label2)[referencia],
+                                    arquivos[reduzido - 1], label_para_reducao, rng)
+        if taxa_red is None:
+            reduzido = None
+    if (taxa_red is None and label_para_reducao and label_para_reducao in taxa_reducao
+            and taxa_reducao[label_para_reducao] is not None):
+        taxa_reducao_min, taxa_reducao_max = taxa_reducao[label_para_reducao]
+        taxa_red = rng.uniform(taxa_reducao_min, taxa_reducao_max)
+        reduzido = audio_reduzido
     
-    print(f"Criando {n_disponiveis} overlaps aleatórios na pasta 'w'")
+    # Escolher ponto de início aleatório para sobreposição (dentro do primeiro áudio)
+    max_inicio = duracao1 - 1  # Garante pelo menos 1ms de sobreposição
+    inicio_overlap = rng.randint(0, max_inicio) if max_inicio > 0 else 0
     
-    # Processar cada par selecionado
-    for arq1, arq2 in pares_selecionados:
-        # Escolher aleatoriamente qual áudio começa primeiro
-        if random.random() < 0.5:
-            arq1, arq2 = arq2, arq1
-        
-        # Obter as labels dos arquivos
-        label1 = arquivos_por_arquivo[arq1]
-        label2 = arquivos_por_arquivo[arq2]
-        processar_overlap(arq1, arq2, pasta_outros, label1, label2, taxa_reducao)
+    return reduzido, taxa_red, inicio_overlap
 
-def processar_overlap(arq1, arq2, pasta_destino, label1, label2, taxa_reducao):
+def processar_overlap(arq1, arq2, pasta_destino, label1, label2, taxa_reducao, armazenamento=None, rng=None,
+                      cache=None, alvo_nivel=None, espectros=None, espectrograma=True):
     """
     Processa um único overlap entre dois arquivos de áudio com taxa de redução baseada na label
     
@@ -153,69 +374,127 @@ def processar_overlap(arq1, arq2, pasta_destino, label1, label2, taxa_reducao):
         label1 (str): Label do primeiro arquivo
         label2 (str): Label do segundo arquivo
         taxa_reducao (dict): Dicionário com taxas de redução por label
+        armazenamento: De onde ler os áudios e onde gravar o overlap (default: ArmazenamentoDisco)
+        rng: Gerador aleatório dos parâmetros (default: módulo random)
+        cache (CacheArtefatos): Se informado, reaproveita o overlap quando as entradas já foram geradas
+        alvo_nivel (AlvoNivel): Ganho do áudio reduzido pelo índice de intensidade
+        espectros (CacheSTFT): Se informado, o início é quantizado ao hop da STFT e o espectrograma
+                               é a soma das STFTs dos dois cortes, sem nova FFT
+        espectrograma (bool): Se False, grava só o áudio (espectros é ignorado)
     """
+    if not espectrograma:
+        espectros = None
+    if armazenamento is None:
+        armazenamento = ArmazenamentoDisco()
+    if rng is None:
+        rng = random
     try:
-        # Carregar os áudios
-        audio1 = AudioSegment.from_wav(arq1)
-        audio2 = AudioSegment.from_wav(arq2)
+        # Os parâmetros dependem só das durações: com cache, elas vêm do cabeçalho e
+        # os áudios só são decodificados se o overlap ainda não existir
+        if cache is not None:
+            duracao1 = armazenamento.duracao_ms(arq1)
+            duracao2 = armazenamento.duracao_ms(arq2)
+        else:
+            audio1 = armazenamento.carregar(arq1)
+            audio2 = armazenamento.carregar(arq2)
+            duracao1 = len(audio1)
+            duracao2 = len(audio2)
         
-        duracao1 = len(audio1)
-        duracao2 = len(audio2)
+        reduzido, taxa_red, inicio_overlap = parametros_overlap(duracao1, duracao2, label1, label2, taxa_reducao, rng,
+                                                                alvo_nivel, (arq1, arq2))
         
-        # Determinar qual áudio será reduzido baseado nas regras específicas
-        reduzir_audio1 = False
-        reduzir_audio2 = False
-        label_para_reducao = None
+        nome_base = nome_overlap(arq1, arq2, taxa_red)
+        nome_audio = nome_base + ".wav"
+        caminho_audio = os.path.join(pasta_destino, nome_audio)
+        caminho_imagem = os.path.join(pasta_destino, f"{nome_base}.png")
         
-        if label1 == label2:
-            # Mesmo label: aplicar regras específicas
-            if label1 == "l":
-                # Para "l", reduzir o de menor duração
-                if duracao1 < duracao2:
-                    reduzir_audio1 = True
-                    label_para_reducao = label1
-                else:
-                    reduzir_audio2 = True
-                    label_para_reducao = label2
-            elif label1 == "p":
-                # Para "p", reduzir o de maior duração
-                if duracao1 > duracao2:
-                    reduzir_audio1 = True
-                    label_para_reducao = label1
-                else:
-                    reduzir_audio2 = True
-                    label_para_reducao = label2
-            else:
-                # Para outros pares iguais, usar a lógica antiga (reduzir audio2)
-                reduzir_audio2 = True
-                label_para_reducao = label2
-        else:
-            # Labels diferentes: reduzir audio2 (lógica original)
-            reduzir_audio2 = True
-            label_para_reducao = label2
+        if cache is not None:
+            chave = cache.chave(
+                'overlap',
+                fontes=[cache.hash_clipe(arq1, armazenamento), cache.hash_clipe(arq2, armazenamento)],
+                labels=[label1, label2], reduzido=reduzido, taxa_reducao=taxa_red, inicio_ms=inicio_overlap,
+                **({'hop': HOP} if espectros is not None else {}),
+                **({} if espectrograma else {'espectrograma': False})
+            )
+            meta = cache.buscar(chave)
+            if meta is not None:
+                armazenamento.importar(cache.arquivo(chave, 'audio.wav'), caminho_audio)
+                if 'espectrograma.png' in meta['arquivos']:
+                    cache.restaurar(chave, 'espectrograma.png', caminho_imagem)
+                instrumentacao.contar('overlaps_reutilizados')
+                return
+            audio1 = armazenamento.carregar(arq1)
+            audio2 = armazenamento.carregar(arq2)
         
-        # Aplicar redução ao áudio escolhido
-        taxa_str = "noReduc"
-        if label_para_reducao and label_para_reducao in taxa_reducao and taxa_reducao[label_para_reducao] is not None:
-            taxa_reducao_min, taxa_reducao_max = taxa_reducao[label_para_reducao]
-            # Gerar taxa de redução aleatória dentro da faixa especificada
-            taxa_red = random.uniform(taxa_reducao_min, taxa_reducao_max)
-            reducao_db = 20 * np.log10(taxa_red)  # Conversão linear para dB
-            
-            if reduzir_audio1:
-                audio1 = audio1 + reducao_db
-            elif reduzir_audio2:
-                audio2 = audio2 + reducao_db
-            
-            taxa_str = f"{taxa_red:.3f}".replace('.', 'p')  # Usar a taxa específica com 3 casas decimais
+        ganhos = [1.0, 1.0]
+        if taxa_red is not None:
+            ganhos[reduzido - 1] = taxa_red
+        base, S = mixar_overlap([arq1, arq2], [audio1, audio2], ganhos, inicio_overlap, armazenamento, espectros)
         
-        # Escolher ponto de início aleatório para sobreposição (dentro do primeiro áudio)
-        max_inicio = duracao1 - 1  # Garante pelo menos 1ms de sobreposição
-        inicio_overlap = random.randint(0, max_inicio) if max_inicio > 0 else 0
+        # Exportar áudio combinado
+        armazenamento.salvar(base, caminho_audio)
         
-        # Calcular duração total necessária
-        duracao_total = max(duracao1, inicio_overlap + duracao2)
+        # Gerar e salvar espectrograma (a partir do áudio já em memória)
+        if espectrograma:
+            gerar_espectrograma(caminho_audio, pasta_destino, nome_base, audio=base, S=S)
+        instrumentacao.contar('overlaps')
         
+        if cache is not None:
+            arquivos = {'audio.wav': base}
+            if os.path.exists(caminho_imagem):
+                arquivos['espectrograma.png'] = caminho_imagem
+            cache.guardar(chave, arquivos, {'nome_base': nome_base, 'arquivos': sorted(arquivos)})
+    
+    except Exception as e:
+        print(f"Erro ao processar overlap entre {os.path.basename(arq1)} e {os.path.basename(arq2)}: {str(e)}")
+
+def nome_overlap(arq1, arq2, taxa_red):
+    """Nome base do overlap de dois áudios: origens e taxa de redução com 3 casas (ou noReduc)"""
+    # Usar a taxa específica com 3 casas decimais no nome
+    taxa_str = f"{taxa_red:.3f}".replace('.', 'p') if taxa_red is not None else "noReduc"
+    nome1 = os.path.splitext(os.path.basename(arq1))[0]
+    nome2 = os.path.splitext(os.path.basename(arq2))[0]
+    return f"{nome1}_{nome2}_{taxa_str}"
+
+def mixar_overlap(arquivos, audios, ganhos, inicio_overlap, armazenamento, espectros=None):
+    """
+    Mixa dois áudios com o segundo começando em inicio_overlap (ms)
+    
+    Args:
+        arquivos (list): Caminhos dos dois áudios (para o cache de STFTs)
+        audios (list): Os dois AudioSegments já carregados
+        ganhos (list): Ganho linear de cada áudio (1.0 = sem redução)
+        inicio_overlap (int): Início do segundo áudio em ms
+        armazenamento: De onde ler os cortes (CacheSTFT)
+        espectros (CacheSTFT): Se informado, mixa por amostras com o início no hop e
+                               calcula o espectrograma pela soma das STFTs
+    
+    Returns:
+        tuple: (AudioSegment mixado, espectrograma Mel ou None)
+    """
+    audio1, audio2 = audios
+    if espectros is not None:
+        # Mixagem por amostras com o início no hop, para o áudio coincidir com a soma das STFTs
+        sinais = [_sinal_mono_48k(audio1), _sinal_mono_48k(audio2)]
+        with instrumentacao.medir('mixagem'):
+            mixes, comprimentos = mixar_variantes(sinais, 48000, [{'ganhos': ganhos,
+                                                                   'inicios_ms': [0, inicio_overlap]}], True)
+        base = AudioSegment(mixes[0, :comprimentos[0]].tobytes(), frame_rate=48000, sample_width=2, channels=1)
+        S = espectros.mel(arquivos, ganhos, [0, quantizar_inicio(inicio_overlap)], comprimentos[0],
+                          armazenamento, sinais)
+        return base, S
+    
+    # Aplicar redução ao áudio escolhido (conversão linear para dB)
+    with instrumentacao.medir('mixagem'):
+        if ganhos[0] != 1.0:
+            audio1 = audio1 + 20 * np.log10(ganhos[0])
+        if ganhos[1] != 1.0:
+            audio2 = audio2 + 20 * np.log10(ganhos[1])
+    
+    # Calcular duração total necessária
+    duracao_total = max(len(audio1), inicio_overlap + len(audio2))
+    
+    with instrumentacao.medir('mixagem'):
         # Criar áudio base (silêncio) com a duração total
         base = AudioSegment.silent(duration=duracao_total, frame_rate=48000)
         
@@ -224,24 +503,224 @@ def processar_overlap(arq1, arq2, pasta_destino, label1, label2, taxa_reducao):
         
         # Adicionar o segundo áudio com redução na posição escolhida
         base = base.overlay(audio2, position=inicio_overlap)
+    return base, None
+
+def parametros_variantes(duracoes, labels, taxa_reducao, k, rng=random, alvo_nivel=None, arquivos=None):
+    """
+    Sorteia os parâmetros de K variantes de um overlap de 2 ou 3 áudios
+    
+    Com dois áudios, cada variante sorteia a ordem e usa as mesmas regras de
+    parametros_overlap. Com três, o primeiro da ordem fica com ganho 1 e cada um
+    dos seguintes recebe a redução da sua label e começa dentro do trecho já montado.
+    
+    Args:
+        duracoes (list): Duração de cada áudio (ms)
+        labels (list): Label de cada áudio
+        taxa_reducao (dict): Dicionário com taxas de redução por label
+        k (int): Número de variantes
+        rng: Gerador aleatório (default: módulo random)
+        alvo_nivel (AlvoNivel): Ganhos pelo índice de intensidade, em relação ao primeiro da ordem
+        arquivos (list): Caminhos dos áudios (necessários com alvo_nivel)
+    
+    Returns:
+        list: Uma entrada por variante {'ordem', 'ganhos', 'inicios_ms'}, com ganhos e
+              inícios indexados pelo áudio de origem
+    """
+    variantes = []
+    for _ in range(k):
+        ordem = list(range(len(duracoes)))
+        rng.shuffle(ordem)
+        ganhos = [1.0] * len(duracoes)
+        inicios = [0] * len(duracoes)
+        if len(duracoes) == 2:
+            a, b = ordem
+            reduzido, taxa_red, inicio = parametros_overlap(
+                duracoes[a], duracoes[b], labels[a], labels[b], taxa_reducao, rng, alvo_nivel,
+                (arquivos[a], arquivos[b]) if arquivos is not None else None)
+            if taxa_red is not None:
+                ganhos[a if reduzido == 1 else b] = taxa_red
+            inicios[b] = inicio
+        else:
+            fim = duracoes[ordem[0]]
+            for j in ordem[1:]:
+                ganho = None
+                if alvo_nivel is not None and arquivos is not None:
+                    ganho = alvo_nivel.ganho(arquivos[ordem[0]], labels[ordem[0]], arquivos[j], labels[j], rng)
+                if ganho is None and taxa_reducao.get(labels[j]) is not None:
+                    ganho = rng.uniform(*taxa_reducao[labels[j]])
+                if ganho is not None:
+                    ganhos[j] = ganho
+                inicios[j] = rng.randint(0, fim - 1) if fim > 1 else 0
+                fim = max(fim, inicios[j] + duracoes[j])
+        variantes.append({'ordem': ordem, 'ganhos': ganhos, 'inicios_ms': inicios})
+    return variantes
+
+def inicios_em_amostras(variantes, taxa_amostragem, quantizar=False):
+    """
+    Inícios (K x áudios) em amostras; com quantizar=True, arredondados ao hop da STFT
+    """
+    if quantizar:
+        return np.array([[quantizar_inicio(inicio, taxa_amostragem) for inicio in v['inicios_ms']]
+                         for v in variantes])
+    return np.array([[inicio * taxa_amostragem // 1000 for inicio in v['inicios_ms']] for v in variantes])
+
+def mixar_variantes(sinais, taxa_amostragem, variantes, quantizar=False):
+    """
+    Mixa todas as variantes de uma vez sobre um array empilhado (K x amostras)
+    
+    Args:
+        sinais (list): Amostras int16 de cada áudio de origem (np.ndarray)
+        taxa_amostragem (int): Taxa de amostragem comum
+        variantes (list): Parâmetros de parametros_variantes
+        quantizar (bool): Arredondar os inícios ao hop da STFT (modo pasta_stft)
+    
+    Returns:
+        tuple: (np.ndarray int16 K x max_amostras, np.ndarray com o comprimento de cada variante)
+    """
+    inicios = inicios_em_amostras(variantes, taxa_amostragem, quantizar)
+    ganhos = np.array([v['ganhos'] for v in variantes], dtype=np.float32)
+    comprimentos = (inicios + np.array([len(sinal) for sinal in sinais])).max(axis=1)
+    
+    saida = np.zeros((len(variantes), comprimentos.max()), dtype=np.float32)
+    linhas = np.arange(len(variantes))[:, None]
+    for j, sinal in enumerate(sinais):
+        colunas = inicios[:, j, None] + np.arange(len(sinal))
+        saida[linhas, colunas] += ganhos[:, j, None] * sinal.astype(np.float32)
+    return np.clip(np.round(saida), -32768, 32767).astype(np.int16), comprimentos
+
+def nomes_variantes(arquivos, variantes):
+    """
+    Nome base de cada variante: origens na ordem da variante, taxas das reduções
+    aplicadas e número da variante
+    """
+    nomes = [os.path.splitext(os.path.basename(arq))[0] for arq in arquivos]
+    nomes_base = []
+    for indice, variante in enumerate(variantes):
+        taxas = [f"{variante['ganhos'][j]:.3f}".replace('.', 'p') for j in variante['ordem']
+                 if variante['ganhos'][j] != 1.0]
+        nomes_base.append('_'.join([nomes[j] for j in variante['ordem']] + (taxas or ["noReduc"]))
+                          + f"_v{indice + 1:02d}")
+    return nomes_base
+
+def _sinal_mono_48k(audio):
+    if audio.frame_rate != 48000:
+        with instrumentacao.medir('reamostragem'):
+            audio = audio.set_frame_rate(48000)
+    audio = audio.set_channels(1).set_sample_width(2)
+    return np.array(audio.get_array_of_samples(), dtype=np.int16)
+
+def processar_variantes(arquivos, pasta_destino, labels, taxa_reducao, k, armazenamento=None, rng=None,
+                        cache=None, metadados=None, alvo_nivel=None, espectros=None, espectrograma=True):
+    """
+    Carrega um par (ou trio) de áudios uma única vez e gera K variantes com ordem,
+    ganhos e deslocamentos diferentes, mixadas em lote
+    
+    Args:
+        arquivos (list): Caminhos dos 2 ou 3 áudios de origem
+        pasta_destino (str): Pasta de destino
+        labels (list): Label de cada áudio
+        taxa_reducao (dict): Dicionário com taxas de redução por label
+        k (int): Número de variantes
+        armazenamento: De onde ler os áudios e onde gravar as variantes (default: ArmazenamentoDisco)
+        rng: Gerador aleatório dos parâmetros (default: módulo random)
+        cache (CacheArtefatos): Se informado, reaproveita o lote quando as entradas já foram geradas
+        metadados (list): Se informada, recebe uma linha por componente de cada variante
+        alvo_nivel (AlvoNivel): Ganhos pelo índice de intensidade
+        espectros (CacheSTFT): Espectrogramas pela soma das STFTs dos cortes (inícios quantizados ao hop)
+        espectrograma (bool): Se False, grava só os áudios (espectros é ignorado)
+    """
+    if not espectrograma:
+        espectros = None
+    if armazenamento is None:
+        armazenamento = ArmazenamentoDisco()
+    if rng is None:
+        rng = random
+    try:
+        duracoes = [armazenamento.duracao_ms(arq) for arq in arquivos]
+        variantes = parametros_variantes(duracoes, labels, taxa_reducao, k, rng, alvo_nivel, arquivos)
+        quantizar = espectros is not None
+        inicios = inicios_em_amostras(variantes, 48000, quantizar)
         
-        # Gerar nome do arquivo de saída
-        nome1 = os.path.splitext(os.path.basename(arq1))[0]
-        nome2 = os.path.splitext(os.path.basename(arq2))[0]
-        nome_base = f"{nome1}_{nome2}_{taxa_str}"
-        nome_audio = nome_base + ".wav"
-        caminho_audio = os.path.join(pasta_destino, nome_audio)
+        nomes_base = nomes_variantes(arquivos, variantes)
         
-        # Exportar áudio combinado
-        base.export(caminho_audio, format="wav")
+        def registrar():
+            if metadados is None:
+                return
+            for indice, (nome_base, variante) in enumerate(zip(nomes_base, variantes)):
+                for j in variante['ordem']:
+                    onset_s = inicios[indice, j] / 48000.0
+                    metadados.append({
+                        'arquivo': os.path.join(pasta_destino, nome_base + ".wav"),
+                        'origem': arquivos[j],
+                        'label': labels[j],
+                        'ganho': round(variante['ganhos'][j], 4),
+                        'onset_s': round(onset_s, 3),
+                        'offset_s': round(onset_s + duracoes[j] / 1000.0, 3)
+                    })
+        
+        if cache is not None:
+            chave = cache.chave('variantes', fontes=[cache.hash_clipe(arq, armazenamento) for arq in arquivos],
+                                labels=labels, variantes=variantes, **({'hop': HOP} if quantizar else {}),
+                                **({} if espectrograma else {'espectrograma': False}))
+            meta = cache.buscar(chave)
+            if meta is not None:
+                for indice, nome_base in enumerate(nomes_base):
+                    armazenamento.importar(cache.arquivo(chave, f"{indice}.wav"),
+                                           os.path.join(pasta_destino, nome_base + ".wav"))
+                    if f"{indice}.png" in meta['arquivos']:
+                        cache.restaurar(chave, f"{indice}.png", os.path.join(pasta_destino, nome_base + ".png"))
+                instrumentacao.contar('overlaps_reutilizados', len(variantes))
+                registrar()
+                return
         
-        # Gerar e salvar espectrograma
-        gerar_espectrograma(caminho_audio, pasta_destino, nome_base)
+        sinais = [_sinal_mono_48k(armazenamento.carregar(arq)) for arq in arquivos]
+        with instrumentacao.medir('mixagem'):
+            mixes, comprimentos = mixar_variantes(sinais, 48000, variantes, quantizar)
         
+        arquivos_cache = {}
+        for indice, nome_base in enumerate(nomes_base):
+            audio = AudioSegment(mixes[indice, :comprimentos[indice]].tobytes(), frame_rate=48000,
+                                 sample_width=2, channels=1)
+            caminho_audio = os.path.join(pasta_destino, nome_base + ".wav")
+            armazenamento.salvar(audio, caminho_audio)
+            S = None
+            if espectros is not None:
+                S = espectros.mel(arquivos, variantes[indice]['ganhos'], inicios[indice], comprimentos[indice],
+                                  armazenamento, sinais)
+            if espectrograma:
+                gerar_espectrograma(caminho_audio, pasta_destino, nome_base, audio=audio, S=S)
+            instrumentacao.contar('overlaps')
+            arquivos_cache[f"{indice}.wav"] = audio
+            caminho_imagem = os.path.join(pasta_destino, nome_base + ".png")
+            if os.path.exists(caminho_imagem):
+                arquivos_cache[f"{indice}.png"] = caminho_imagem
+        registrar()
+        
+        if cache is not None:
+            cache.guardar(chave, arquivos_cache, {'nomes_base': nomes_base, 'arquivos': sorted(arquivos_cache)})
+    
     except Exception as e:
-        print(f"Erro ao processar overlap entre {os.path.basename(arq1)} e {os.path.basename(arq2)}: {str(e)}")
+        print(f"Erro ao processar variantes de {', '.join(os.path.basename(arq) for arq in arquivos)}: {str(e)}")
+
+def salvar_metadados_variantes(metadados, caminho_csv):
+    """
+    Salva os componentes das variantes geradas (um por linha) em CSV
+    
+    Args:
+        metadados (list): Linhas com arquivo, origem, label, ganho, onset_s e offset_s
+        caminho_csv (str): Caminho do CSV
+    """
+    try:
+        os.makedirs(os.path.dirname(caminho_csv) or '.', exist_ok=True)
+        with open(caminho_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=['arquivo', 'origem', 'label', 'ganho', 'onset_s', 'offset_s'])
+            writer.writeheader()
+            writer.writerows(metadados)
+        instrumentacao.registrar_escrita(caminho_csv)
+    except Exception as e:
+        print(f"Erro ao salvar metadados das variantes: {str(e)}")
 
-def gerar_espectrograma(caminho_audio, pasta_saida, nome_base):
+def gerar_espectrograma(caminho_audio, pasta_saida, nome_base, audio=None, S=None):
     """
     Gera e salva um espectrograma a partir de um arquivo de áudio
     
@@ -249,31 +728,65 @@ def gerar_espectrograma(caminho_audio, pasta_saida, nome_base):
         caminho_audio (str): Caminho completo para o arquivo de áudio
         pasta_saida (str): Pasta para salvar o espectrograma
         nome_base (str): Nome base para o arquivo de saída (sem extensão)
+        audio (AudioSegment): Áudio já carregado (evita reler caminho_audio do disco)
+        S (np.ndarray): Espectrograma Mel (potência) já calculado, ex: por CacheSTFT.mel
     """
     try:
-        # Carregar o áudio com Librosa
-        y, sr = librosa.load(caminho_audio, sr=None)
+        import librosa
+        import librosa.display
+        import matplotlib.pyplot as plt
         
-        # Criar figura para o espectrograma
-        plt.figure(figsize=(10, 4))
+        if S is not None:
+            sr = audio.frame_rate if audio is not None else 48000
+        elif audio is not None:
+            # Mesma normalização do librosa.load (float em [-1, 1], mono)
+            y, sr = audio_para_array(audio), audio.frame_rate
+        else:
+            # Carregar o áudio com Librosa
+            with instrumentacao.medir('decodificacao'):
+                y, sr = librosa.load(caminho_audio, sr=None)
+            instrumentacao.registrar_leitura(caminho_audio)
         
         # Gerar espectrograma Mel
-        S = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=128, fmax=18000, n_fft=2048, hop_length=128, fmin=1000)
-        S_dB = librosa.power_to_db(S, ref=np.max)
-        
-        # Plotar espectrograma
-        librosa.display.specshow(S_dB, sr=sr, x_axis='time', y_axis='mel', fmax=18000, fmin=1000)
-        plt.colorbar(format='%+2.0f dB')
-        plt.title(f'Espectrograma: {nome_base}')
-        
-        # Salvar e fechar a figura
-        caminho_imagem = os.path.join(pasta_saida, f"{nome_base}.png")
-        plt.savefig(caminho_imagem, bbox_inches='tight', dpi=150)
-        plt.close()
+        with instrumentacao.medir('espectrograma'):
+            if S is None:
+                S = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=128, fmax=18000, n_fft=2048, hop_length=128, fmin=1000)
+            S_dB = librosa.power_to_db(S, ref=np.max)
         
+        with instrumentacao.medir('grafico'):
+            # Criar figura para o espectrograma
+            plt.figure(figsize=(10, 4))
+            
+            # Plotar espectrograma
+            librosa.display.specshow(S_dB, sr=sr, x_axis='time', y_axis='mel', fmax=18000, fmin=1000)
+            plt.colorbar(format='%+2.0f dB')
+            plt.title(f'Espectrograma: {nome_base}')
+            
+            # Salvar e fechar a figura
+            os.makedirs(pasta_saida, exist_ok=True)
+            caminho_imagem = os.path.join(pasta_saida, f"{nome_base}.png")
+            plt.savefig(caminho_imagem, bbox_inches='tight', dpi=150)
+            plt.close()
+        instrumentacao.registrar_escrita(caminho_imagem)
+    
     except Exception as e:
         print(f"Erro ao gerar espectrograma para {nome_base}: {str(e)}")
 
+def audio_para_array(audio):
+    """
+    Converte um AudioSegment em array float32 mono normalizado em [-1, 1]
+    
+    Args:
+        audio (AudioSegment): Áudio de entrada
+    
+    Returns:
+        np.ndarray: Amostras (média dos canais se estéreo)
+    """
+    amostras = np.array(audio.get_array_of_samples(), dtype=np.float32)
+    if audio.channels > 1:
+        amostras = amostras.reshape(-1, audio.channels).mean(axis=1)
+    return amostras / float(1 << (8 * audio.sample_width - 1))
+
 if __name__ == "__main__":
     # pares_desejados = [["l", "l"], ["p", "p"], ["k", "p"]]
     pares_desejados = [["p", "r_plus"]]
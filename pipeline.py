@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+import time
+import random
+from graphlib import TopologicalSorter
+import numpy as np
+from armazenamento import ArmazenamentoMemoria, ArmazenamentoAssincrono
+import instrumentacao
+
+def _executar_crop(config, armazenamento):
+    from crop import cortar_audios
+    cortar_audios(config['pasta_entrada'], config['pasta_saida'], config['labels'], armazenamento,
+                  virtual=config.get('virtual', False))
+
+def _executar_background(config, armazenamento):
+    from crop import cortar_background
+    cortar_background(config['pasta_entrada'], config['pasta_saida'], armazenamento,
+                      virtual=config.get('virtual', False))
+
+def _executar_overlap(config, armazenamento):
+    from overlap import criar_pares_com_overlap_e_espectrograma
+    criar_pares_com_overlap_e_espectrograma(
+        config['pasta_labels'],
+        config['pasta_saida'],
+        config['pares_vocalizacoes'],
+        taxa_reducao=config.get('taxa_reducao'),
+        n=config.get('n', 1000),
+        armazenamento=armazenamento,
+        semente=config.get('semente'),
+        pasta_cache=config.get('cache'),
+        variantes=config.get('variantes', 1),
+        caminho_catalogo=config.get('catalogo'),
+        caminho_intensidades=config.get('intensidades'),
+        nivel_relativo=config.get('nivel_relativo'),
+        pasta_stft=config.get('stft'),
+        caminho_duplicatas=config.get('duplicatas'),
+        espectrograma=config.get('espectrograma', True)
+    )
+
+def _executar_combine_60s(config, armazenamento):
+    from combine_60s import criar_audios_60s
+    criar_audios_60s(
+        config['pasta_overlaps'],
+        config['pasta_background'],
+        config['pasta_saida'],
+        n_vocalizacoes=config.get('n_vocalizacoes', 500),
+        armazenamento=armazenamento,
+        semente=config.get('semente'),
+        pasta_cache=config.get('cache'),
+        caminho_catalogo=config.get('catalogo'),
+        caminho_intensidades=config.get('intensidades'),
+        snr_db=config.get('snr_db'),
+        rotulos_quadros=config.get('rotulos_quadros', False)
+    )
+
+def _executar_analyze(config, armazenamento):
+    from analyze_annotations import analisar_pastas_headless
+    analisar_pastas_headless(config['pastas'], config['pasta_relatorio'], n_workers=config.get('n_workers'))
+
+def _executar_exportacao(config, armazenamento):
+    from exportacao import exportar_shards
+    exportar_shards(config['pastas'], config['pasta_saida'], config.get('tamanho_shard_mb', 1024),
+                    n_workers=config.get('n_workers'))
+
+# Etapas conhecidas: chaves de configuração com as pastas lidas e gravadas.
+# As dependências entre etapas são deduzidas dessas pastas.
+ETAPAS = {
+    'crop': {'entradas': [], 'saidas': ['pasta_saida'], 'funcao': _executar_crop},
+    'background': {'entradas': [], 'saidas': ['pasta_saida'], 'funcao': _executar_background},
+    'overlap': {'entradas': ['pasta_labels'], 'saidas': ['pasta_saida'], 'funcao': _executar_overlap},
+    'combine_60s': {'entradas': ['pasta_overlaps', 'pasta_background'], 'saidas': ['pasta_saida'],
+                    'funcao': _executar_combine_60s},
+    'analyze': {'entradas': ['pastas'], 'saidas': [], 'funcao': _executar_analyze},
+    'exportacao': {'entradas': ['pastas'], 'saidas': ['pasta_saida'], 'funcao': _executar_exportacao},
+}
+
+# Etapas cuja saída é sempre gravada em disco (áudios finais + CSVs)
+ETAPAS_SEMPRE_PERSISTIDAS = {'combine_60s'}
+
+# Etapas que leem suas entradas direto do disco (as etapas das quais dependem são gravadas)
+ETAPAS_LEEM_DISCO = {'analyze', 'exportacao'}
+
+def _pastas(config, chaves):
+    pastas = []
+    for chave in chaves:
+        valor = config.get(chave)
+        if isinstance(valor, str):
+            pastas.append(os.path.abspath(valor))
+        elif valor:
+            pastas.extend(os.path.abspath(pasta) for pasta in valor)
+    return pastas
+
+def _contida(pasta, pasta_base):
+    return pasta == pasta_base or pasta.startswith(os.path.join(pasta_base, ''))
+
+def montar_grafo(config_etapas):
+    """
+    Monta o grafo de dependências: uma etapa depende de outra se lê alguma pasta
+    gravada por ela (a mesma pasta ou uma subpasta)
+    
+    Args:
+        config_etapas (dict): Configuração por etapa (nome -> parâmetros)
+    
+    Returns:
+        dict: Etapa -> conjunto de etapas das quais depende
+    """
+    grafo = {}
+    for nome, config in config_etapas.items():
+        if nome not in ETAPAS:
+            raise ValueError(f"Etapa desconhecida: {nome}")
+        entradas = _pastas(config, ETAPAS[nome]['entradas'])
+        grafo[nome] = set()
+        for outro, config_outro in config_etapas.items():
+            if outro == nome:
+                continue
+            saidas = _pastas(config_outro, ETAPAS[outro]['saidas'])
+            if any(_contida(entrada, saida) for entrada in entradas for saida in saidas):
+                grafo[nome].add(outro)
+    return grafo
+
+def executar_pipeline(config):
+    """
+    Executa as etapas configuradas em ordem topológica, passando os clipes
+    intermediários em memória sempre que não precisam ser gravados
+    
+    Args:
+        config (dict): {'etapas': {nome: parâmetros}, 'semente': int (opcional),
+                       'cache': pasta do armazém de artefatos (opcional),
+                       'catalogo': banco SQLite do catálogo de cortes (opcional),
+                       'intensidades': índice de intensidade dos cortes (opcional),
+                       'instrumentacao': {'progresso': bool, 'relatorio': caminho} (opcional),
+                       'io': parâmetros de ArmazenamentoAssincrono, ex: {'profundidade_leitura': 8}
+                             (opcional; liga a leitura antecipada e a gravação em segundo plano)}.
+                       'semente', 'cache', 'catalogo' e 'intensidades' valem para todas as etapas, salvo se a etapa
+                       definir os seus.
+                       Cada etapa aceita 'persistir' (bool) para gravar sua saída em disco;
+                       saídas sem nenhuma etapa consumidora na execução são sempre gravadas.
+    
+    Returns:
+        dict: Tempo de execução (s) por etapa
+    """
+    config_etapas = config['etapas']
+    grafo = montar_grafo(config_etapas)
+    ordem = list(TopologicalSorter(grafo).static_order())
+    
+    if config.get('semente') is not None:
+        random.seed(config['semente'])
+        np.random.seed(config['semente'])
+    
+    # Consumidores de cada etapa e pastas que precisam ir para o disco
+    consumidores = {nome: {outro for outro, deps in grafo.items() if nome in deps} for nome in grafo}
+    pastas_persistidas = []
+    for nome, config_etapa in config_etapas.items():
+        persistir = config_etapa.get('persistir', False)
+        if (nome in ETAPAS_SEMPRE_PERSISTIDAS or not consumidores[nome]
+                or consumidores[nome] & ETAPAS_LEEM_DISCO):
+            persistir = True
+        if persistir:
+            pastas_persistidas.extend(_pastas(config_etapa, ETAPAS[nome]['saidas']))
+    
+    # Instrumentação opcional: {"instrumentacao": {"progresso": true, "relatorio": "run.json"}}
+    config_instrumentacao = config.get('instrumentacao')
+    if config_instrumentacao:
+        instrumentacao.ativar(progresso=config_instrumentacao.get('progresso', False))
+    
+    armazenamento = ArmazenamentoMemoria(pastas_persistidas)
+    if config.get('io') is not None:
+        armazenamento = ArmazenamentoAssincrono(armazenamento, **config['io'])
+    pendentes = {nome: set(consumidores[nome]) for nome in grafo}
+    tempos = {}
+    
+    print(f"Ordem de execução: {' -> '.join(ordem)}")
+    for nome in ordem:
+        print(f"\n=== Etapa: {nome} ===")
+        inicio = time.perf_counter()
+        config_etapa = {'semente': config.get('semente'), 'cache': config.get('cache'),
+                        'catalogo': config.get('catalogo'), 'intensidades': config.get('intensidades'),
+                        **config_etapas[nome]}
+        ETAPAS[nome]['funcao'](config_etapa, armazenamento)
+        armazenamento.aguardar()
+        tempos[nome] = time.perf_counter() - inicio
+        
+        # Libera os clipes em memória das etapas cujos consumidores já terminaram
+        # (desde que nenhuma etapa ainda necessária grave na mesma pasta)
+        for dependencia in grafo[nome]:
+            pendentes[dependencia].discard(nome)
+        pastas_necessarias = [pasta for outra in grafo if pendentes[outra]
+                              for pasta in _pastas(config_etapas[outra], ETAPAS[outra]['saidas'])]
+        for dependencia in grafo[nome]:
+            if pendentes[dependencia]:
+                continue
+            for pasta in _pastas(config_etapas[dependencia], ETAPAS[dependencia]['saidas']):
+                if not any(_contida(pasta, outra) or _contida(outra, pasta) for outra in pastas_necessarias):
+                    armazenamento.descartar(pasta)
+        
+        print(f"Etapa {nome} concluída em {tempos[nome]:.1f}s "
+              f"({armazenamento.bytes_em_memoria() / 1e6:.1f} MB de áudio em memória)")
+    
+    if isinstance(armazenamento, ArmazenamentoAssincrono):
+        armazenamento.fechar()
+    
+    if config_instrumentacao:
+        instrumentacao.imprimir_relatorio()
+        if config_instrumentacao.get('relatorio'):
+            relatorio = instrumentacao.relatorio()
+            relatorio['etapas'] = tempos
+            with open(config_instrumentacao['relatorio'], 'w', encoding='utf-8') as f:
+                json.dump(relatorio, f, indent=2)
+        instrumentacao.desativar()
+    
+    return tempos
+
+def carregar_config(caminho_config):
+    """
+    Lê a configuração do pipeline de um arquivo JSON
+    """
+    with open(caminho_config, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+if __name__ == "__main__":
+    caminho_config = sys.argv[1] if len(sys.argv) > 1 else 'pipeline.json'
+    tempos = executar_pipeline(carregar_config(caminho_config))
+    
+    print("\nResumo:")
+    for nome, tempo in tempos.items():
+        print(f"  {nome}: {tempo:.1f}s")
@@ -0,0 +1,512 @@
+import os
+import csv
+import json
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from pydub import AudioSegment
+from armazenamento import ArmazenamentoDisco
+from cache_artefatos import gerador
+from catalogo import CatalogoCortes
+from intensidade import AlvoNivel
+from duplicatas import carregar_duplicatas
+from espectros import CacheSTFT
+from overlap import (coletar_cortes, selecionar_overlaps, parametros_overlap, parametros_variantes, nome_overlap,
+                     nomes_variantes, mixar_overlap, mixar_variantes, inicios_em_amostras, _sinal_mono_48k,
+                     gerar_espectrograma)
+from combine_60s import (agrupar_vocalizacoes, obter_label_do_caminho, salvar_anotacoes_csv, DURACAO_ALVO_MS)
+from rotulos import salvar_rotulos
+import instrumentacao
+
+# Colunas dos planos e conversão de cada uma ao ler o CSV (listas separadas por ';')
+COLUNAS_OVERLAPS = {
+    'saida': str, 'tipo': str, 'mixagem': str, 'origens': [str], 'labels': [str], 'ordem': [int],
+    'ganhos': [float], 'inicios_ms': [int], 'duracao_ms': int,
+}
+COLUNAS_60S = {
+    'saida': str, 'segmento': str, 'origem': str, 'inicio_ms': int, 'duracao_ms': int, 'repeticoes': int,
+    'ganho_db': float, 'label': str, 'onset_s': float, 'offset_s': float,
+}
+
+def planejar_overlaps(pasta_labels, pares_vocalizacoes, taxa_reducao=None, n=1000, armazenamento=None,
+                      semente=None, variantes=1, caminho_catalogo=None, caminho_intensidades=None,
+                      nivel_relativo=None, caminho_duplicatas=None):
+    """
+    Faz todos os sorteios de criar_pares_com_overlap_e_espectrograma (cortes, ordem, ganhos e
+    início) sem decodificar nenhum áudio: só as durações são lidas (do catálogo ou do cabeçalho)
+    
+    Com a mesma semente, o plano descreve exatamente os overlaps da geração direta.
+    Os parâmetros são os mesmos de criar_pares_com_overlap_e_espectrograma.
+    
+    Returns:
+        list: Uma linha por overlap (colunas de COLUNAS_OVERLAPS); `saida` é relativa à pasta de saída
+    """
+    if taxa_reducao is None:
+        taxa_reducao = {}
+    if armazenamento is None:
+        armazenamento = ArmazenamentoDisco()
+    alvo_nivel = AlvoNivel(caminho_intensidades, nivel_relativo) if caminho_intensidades else None
+    
+    catalogo = CatalogoCortes(caminho_catalogo) if caminho_catalogo else None
+    excluir = carregar_duplicatas(caminho_duplicatas) if caminho_duplicatas else None
+    caminhos, arquivos_por_label = coletar_cortes(pasta_labels, armazenamento, catalogo, excluir=excluir)
+    duracoes = {}
+    if catalogo is not None:
+        # O catálogo já tem a duração de cada corte
+        duracoes = {caminho: duracao_ms for _, caminho, _, _, _, _, duracao_ms, _ in catalogo.consultar()
+                    if duracao_ms is not None}
+        catalogo.fechar()
+    
+    def duracao(caminho):
+        if caminho not in duracoes:
+            duracoes[caminho] = armazenamento.duracao_ms(caminho)
+        return duracoes[caminho]
+    
+    linhas = []
+    for nome_pasta, itens in selecionar_overlaps(caminhos, arquivos_por_label, pares_vocalizacoes, n, semente):
+        for ids, labels in itens:
+            arquivos = [caminhos[id_corte] for id_corte in ids]
+            rng = gerador(semente, nome_pasta, *[os.path.basename(arq) for arq in arquivos])
+            try:
+                if variantes > 1 or len(ids) == 3:
+                    duracoes_item = [duracao(arq) for arq in arquivos]
+                    lista = parametros_variantes(duracoes_item, list(labels), taxa_reducao, variantes, rng,
+                                                 alvo_nivel, arquivos)
+                    for nome_base, variante in zip(nomes_variantes(arquivos, lista), lista):
+                        linhas.append({
+                            'saida': os.path.join(nome_pasta, nome_base + ".wav"), 'tipo': nome_pasta,
+                            'mixagem': 'lote', 'origens': arquivos, 'labels': list(labels),
+                            'ordem': variante['ordem'], 'ganhos': variante['ganhos'],
+                            'inicios_ms': variante['inicios_ms'],
+                            'duracao_ms': max(inicio + d for inicio, d in zip(variante['inicios_ms'], duracoes_item))
+                        })
+                    continue
+                
+                # Mesma ordem de sorteios de processar_overlap
+                (arq1, arq2), (label1, label2) = arquivos, labels
+                if rng.random() < 0.5:
+                    arq1, arq2 = arq2, arq1
+                    # Na pasta 'w' a label acompanha o arquivo; nos tipos pedidos ela segue a posição no par
+                    if nome_pasta == 'w':
+                        label1, label2 = label2, label1
+                duracao1, duracao2 = duracao(arq1), duracao(arq2)
+                reduzido, taxa_red, inicio = parametros_overlap(duracao1, duracao2, label1, label2, taxa_reducao,
+                                                                rng, alvo_nivel, (arq1, arq2))
+                ganhos = [1.0, 1.0]
+                if taxa_red is not None:
+                    ganhos[reduzido - 1] = taxa_red
+                linhas.append({
+                    'saida': os.path.join(nome_pasta, nome_overlap(arq1, arq2, taxa_red) + ".wav"),
+                    'tipo': nome_pasta, 'mixagem': 'overlay', 'origens': [arq1, arq2], 'labels': [label1, label2],
+                    'ordem': [0, 1], 'ganhos': ganhos, 'inicios_ms': [0, inicio],
+                    'duracao_ms': max(duracao1, inicio + duracao2)
+                })
+            except Exception as e:
+                print(f"Erro ao planejar overlap de {', '.join(os.path.basename(arq) for arq in arquivos)}: {str(e)}")
+    
+    print(f"Plano com {len(linhas)} overlaps")
+    return linhas
+
+def planejar_audios_60s(pasta_overlaps, pasta_background, n_vocalizacoes=500, armazenamento=None, semente=None,
+                        caminho_catalogo=None, caminho_intensidades=None, snr_db=None, plano_overlaps=None):
+    """
+    Faz os sorteios de criar_audios_60s (vocalizações de cada áudio, backgrounds, intervalos e
+    ganhos) sem decodificar áudio, e calcula as anotações de cada áudio
+    
+    Args:
+        plano_overlaps (list): Se informado, as vocalizações e suas durações vêm do plano de
+                               overlaps (em ordem de nome, como no catálogo), de forma que os
+                               overlaps ainda não precisam existir
+        (demais parâmetros como em criar_audios_60s)
+    
+    Returns:
+        list: Uma linha por segmento de cada áudio, em ordem (colunas de COLUNAS_60S)
+    """
+    if armazenamento is None:
+        armazenamento = ArmazenamentoDisco()
+    alvo_nivel = AlvoNivel(caminho_intensidades, snr_db=snr_db) if caminho_intensidades and snr_db else None
+    catalogo = CatalogoCortes(caminho_catalogo) if caminho_catalogo else None
+    duracoes = {}
+    
+    def listar_wavs(pasta):
+        if catalogo is None:
+            return armazenamento.listar_wavs(pasta)
+        catalogo.atualizar(pasta)
+        return catalogo.listar(pasta)[1]
+    
+    vocalizacoes_por_tipo = {}
+    if plano_overlaps is not None:
+        for linha in plano_overlaps:
+            caminho = os.path.join(pasta_overlaps, linha['saida'])
+            vocalizacoes_por_tipo.setdefault(linha['tipo'], []).append(caminho)
+            duracoes[caminho] = linha['duracao_ms']
+        vocalizacoes_por_tipo = {tipo: sorted(vocalizacoes_por_tipo[tipo]) for tipo in sorted(vocalizacoes_por_tipo)}
+    else:
+        pastas = catalogo.atualizar_raiz(pasta_overlaps) if catalogo else armazenamento.listar_pastas(pasta_overlaps)
+        for pasta in pastas:
+            vocalizacoes_por_tipo[pasta] = listar_wavs(os.path.join(pasta_overlaps, pasta))
+    lotes = agrupar_vocalizacoes(vocalizacoes_por_tipo, n_vocalizacoes, semente)
+    
+    arquivos_background = listar_wavs(pasta_background)
+    if catalogo is not None:
+        catalogo.fechar()
+    if not arquivos_background:
+        print("Erro: Nenhum arquivo de background encontrado!")
+        return []
+    
+    def duracao(caminho):
+        if caminho not in duracoes:
+            duracoes[caminho] = armazenamento.duracao_ms(caminho)
+        return duracoes[caminho]
+    
+    linhas = []
+    for i, lote in enumerate(lotes):
+        rng = gerador(semente, 'audio_60s', i + 1)
+        linhas.extend(planejar_audio_individual(f"audio_60s_{i+1:03d}.wav", lote, arquivos_background, duracao,
+                                                DURACAO_ALVO_MS, rng, alvo_nivel))
+    
+    print(f"Plano com {len(lotes)} áudios de 60s")
+    return linhas
+
+def planejar_audio_individual(saida, vocalizacoes, arquivos_background, duracao, duracao_alvo_ms, rng,
+                              alvo_nivel=None):
+    """
+    Segmentos de um áudio de 60s, com os mesmos sorteios (e na mesma ordem) de
+    criar_audio_individual e obter_segmento_background_aleatorio
+    
+    Args:
+        saida (str): Nome do áudio
+        vocalizacoes (list): Caminhos das vocalizações deste áudio
+        arquivos_background (list): Arquivos de background disponíveis
+        duracao (callable): Caminho -> duração em ms
+        duracao_alvo_ms (int): Duração do áudio
+        rng: Gerador aleatório do áudio
+        alvo_nivel (AlvoNivel): Ganho de cada vocalização pelo índice de intensidade
+    
+    Returns:
+        list: Linhas do plano (colunas de COLUNAS_60S)
+    """
+    linhas = []
+    posicao = 0
+    
+    def segmento_background(duracao_ms):
+        arquivo_bg = rng.choice(arquivos_background)
+        duracao_bg = duracao(arquivo_bg)
+        if duracao_bg <= 0:
+            return None
+        repeticoes = 1
+        if duracao_bg < duracao_ms:
+            repeticoes = int(np.ceil(duracao_ms / duracao_bg))
+        inicio = rng.randint(0, duracao_bg * repeticoes - duracao_ms) if duracao_bg * repeticoes > duracao_ms else 0
+        return {'saida': saida, 'segmento': 'background', 'origem': arquivo_bg, 'inicio_ms': inicio,
+                'duracao_ms': duracao_ms, 'repeticoes': repeticoes}
+    
+    # Background "base" sorteado (e não usado) por criar_audio_individual
+    rng.choice(arquivos_background)
+    nivel_fundo = alvo_nivel.nivel_fundo(arquivos_background) if alvo_nivel is not None else None
+    
+    for i, caminho_vocalizacao in enumerate(vocalizacoes):
+        duracao_vocalizacao = duracao(caminho_vocalizacao)
+        ganho_db = None
+        nivel_vocalizacao = alvo_nivel.nivel(caminho_vocalizacao) if nivel_fundo is not None else None
+        if nivel_vocalizacao is not None:
+            ganho_db = nivel_fundo + rng.uniform(*alvo_nivel.snr_db) - nivel_vocalizacao
+        linhas.append({'saida': saida, 'segmento': 'vocalizacao', 'origem': caminho_vocalizacao, 'inicio_ms': 0,
+                       'duracao_ms': duracao_vocalizacao, 'repeticoes': 1, 'ganho_db': ganho_db,
+                       'label': obter_label_do_caminho(caminho_vocalizacao),
+                       'onset_s': round(posicao / 1000.0, 3),
+                       'offset_s': round((posicao + duracao_vocalizacao) / 1000.0, 3)})
+        posicao += duracao_vocalizacao
+        if posicao >= duracao_alvo_ms:
+            break
+        
+        # Intervalo de background (exceto na última vocalização)
+        if i < len(vocalizacoes) - 1:
+            duracao_intervalo = min(rng.randint(1000, 2000), duracao_alvo_ms - posicao)
+            segmento = segmento_background(duracao_intervalo)
+            if segmento:
+                linhas.append(segmento)
+                posicao += duracao_intervalo
+    
+    if posicao > duracao_alvo_ms:
+        # A última vocalização é cortada no fim do áudio (e sai se começou exatamente nele)
+        linhas[-1]['duracao_ms'] -= posicao - duracao_alvo_ms
+        linhas[-1]['offset_s'] = min(linhas[-1]['offset_s'], duracao_alvo_ms / 1000.0)
+        if linhas[-1]['duracao_ms'] <= 0:
+            linhas.pop()
+    elif posicao < duracao_alvo_ms:
+        # Completar com background e, se não houver, com silêncio
+        segmento = segmento_background(duracao_alvo_ms - posicao)
+        if segmento:
+            linhas.append(segmento)
+        else:
+            linhas.append({'saida': saida, 'segmento': 'silencio', 'inicio_ms': 0,
+                           'duracao_ms': duracao_alvo_ms - posicao, 'repeticoes': 1})
+    return linhas
+
+def salvar_plano(linhas, caminho_plano):
+    """
+    Grava um plano (de overlaps ou de áudios de 60s) em CSV, uma linha por saída/segmento
+    """
+    colunas = COLUNAS_OVERLAPS if not linhas or 'mixagem' in linhas[0] else COLUNAS_60S
+    os.makedirs(os.path.dirname(caminho_plano) or '.', exist_ok=True)
+    caminho_tmp = caminho_plano + '.tmp'
+    with open(caminho_tmp, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(colunas)
+        for linha in linhas:
+            valores = []
+            for coluna, tipo in colunas.items():
+                valor = linha.get(coluna)
+                if valor is None:
+                    valores.append('')
+                elif isinstance(tipo, list):
+                    valores.append(';'.join(repr(v) if isinstance(v, float) else str(v) for v in valor))
+                else:
+                    valores.append(repr(valor) if isinstance(valor, float) else valor)
+            writer.writerow(valores)
+    os.replace(caminho_tmp, caminho_plano)
+    instrumentacao.registrar_escrita(caminho_plano)
+
+def carregar_plano(caminho_plano):
+    """
+    Lê um plano gravado por salvar_plano
+    
+    Returns:
+        list: Linhas com os tipos de COLUNAS_OVERLAPS ou COLUNAS_60S
+    """
+    with open(caminho_plano, newline='', encoding='utf-8') as f:
+        leitor = csv.DictReader(f)
+        colunas = COLUNAS_OVERLAPS if 'mixagem' in leitor.fieldnames else COLUNAS_60S
+        linhas = []
+        for registro in leitor:
+            linha = {}
+            for coluna, tipo in colunas.items():
+                valor = registro[coluna]
+                if isinstance(tipo, list):
+                    linha[coluna] = [tipo[0](v) for v in valor.split(';')] if valor else []
+                else:
+                    linha[coluna] = tipo(valor) if valor != '' else None
+            linhas.append(linha)
+    return linhas
+
+def agrupar_plano(linhas):
+    """
+    Agrupa as linhas em unidades de execução: os overlaps com as mesmas origens e mixagem
+    (variantes de um par/trio, lidas uma única vez) ou os segmentos de um áudio de 60s
+    
+    Returns:
+        list: Listas de linhas consecutivas
+    """
+    grupos = []
+    for linha in linhas:
+        chave = (linha['mixagem'], tuple(linha['origens'])) if 'mixagem' in linha else linha['saida']
+        if grupos and grupos[-1][0] == chave:
+            grupos[-1][1].append(linha)
+        else:
+            grupos.append((chave, [linha]))
+    return [grupo for _, grupo in grupos]
+
+def renderizar_overlaps(linhas, pasta_saida, armazenamento, espectros=None, espectrograma=True):
+    """
+    Gera os overlaps de um grupo do plano (mesmas origens): áudio e (se espectrograma) espectrograma
+    """
+    arquivos = linhas[0]['origens']
+    try:
+        if linhas[0]['mixagem'] == 'overlay':
+            audios = [armazenamento.carregar(arq) for arq in arquivos]
+            saidas = [mixar_overlap(arquivos, audios, linha['ganhos'], linha['inicios_ms'][1], armazenamento,
+                                    espectros) for linha in linhas]
+        else:
+            variantes = [{'ganhos': linha['ganhos'], 'inicios_ms': linha['inicios_ms']} for linha in linhas]
+            quantizar = espectros is not None
+            sinais = [_sinal_mono_48k(armazenamento.carregar(arq)) for arq in arquivos]
+            with instrumentacao.medir('mixagem'):
+                mixes, comprimentos = mixar_variantes(sinais, 48000, variantes, quantizar)
+            inicios = inicios_em_amostras(variantes, 48000, quantizar)
+            saidas = []
+            for indice, variante in enumerate(variantes):
+                audio = AudioSegment(mixes[indice, :comprimentos[indice]].tobytes(), frame_rate=48000,
+                                     sample_width=2, channels=1)
+                S = None
+                if espectros is not None:
+                    S = espectros.mel(arquivos, variante['ganhos'], inicios[indice], comprimentos[indice],
+                                      armazenamento, sinais)
+                saidas.append((audio, S))
+        
+        for linha, (audio, S) in zip(linhas, saidas):
+            caminho_audio = os.path.join(pasta_saida, linha['saida'])
+            pasta_destino = os.path.dirname(caminho_audio)
+            armazenamento.criar_pasta(pasta_destino)
+            armazenamento.salvar(audio, caminho_audio)
+            if espectrograma:
+                gerar_espectrograma(caminho_audio, pasta_destino,
+                                    os.path.splitext(os.path.basename(caminho_audio))[0], audio=audio, S=S)
+            instrumentacao.contar('overlaps')
+        return len(linhas)
+    
+    except Exception as e:
+        print(f"Erro ao gerar overlaps de {', '.join(os.path.basename(arq) for arq in arquivos)}: {str(e)}")
+        return 0
+
+def renderizar_audio_60s(linhas, pasta_saida, armazenamento, rotulos_quadros=False):
+    """
+    Monta um áudio de 60s a partir dos seus segmentos no plano e grava áudio + CSV de anotações
+    (e, com rotulos_quadros, os rótulos por quadro)
+    """
+    saida = linhas[0]['saida']
+    try:
+        audio_final = AudioSegment.silent(duration=0, frame_rate=48000)
+        for linha in linhas:
+            if linha['segmento'] == 'silencio':
+                audio_final += AudioSegment.silent(duration=linha['duracao_ms'], frame_rate=48000)
+                continue
+            segmento = armazenamento.carregar(linha['origem'])
+            if segmento.frame_rate != 48000:
+                with instrumentacao.medir('reamostragem'):
+                    segmento = segmento.set_frame_rate(48000)
+            with instrumentacao.medir('mixagem'):
+                if linha['repeticoes'] > 1:
+                    segmento = segmento * linha['repeticoes']
+                if linha['ganho_db'] is not None:
+                    segmento = segmento + linha['ganho_db']
+                if len(segmento) > linha['duracao_ms']:
+                    segmento = segmento[linha['inicio_ms']:linha['inicio_ms'] + linha['duracao_ms']]
+                audio_final += segmento
+        
+        anotacoes = [{'onset_s': linha['onset_s'], 'offset_s': linha['offset_s'], 'label': linha['label']}
+                     for linha in linhas if linha['segmento'] == 'vocalizacao']
+        caminho_saida = os.path.join(pasta_saida, saida)
+        armazenamento.criar_pasta(os.path.dirname(caminho_saida))
+        armazenamento.salvar(audio_final, caminho_saida)
+        salvar_anotacoes_csv(anotacoes, caminho_saida + ".csv")
+        if rotulos_quadros:
+            salvar_rotulos(caminho_saida, anotacoes, int(audio_final.frame_count()))
+        instrumentacao.registrar_escrita(caminho_saida + ".csv")
+        instrumentacao.contar('audios_60s')
+        return 1
+    
+    except Exception as e:
+        print(f"Erro ao gerar {saida}: {str(e)}")
+        return 0
+
+def _executar_grupos(grupos, pasta_saida, armazenamento=None, pasta_stft=None, rotulos_quadros=False,
+                     espectrograma=True):
+    if armazenamento is None:
+        armazenamento = ArmazenamentoDisco()
+    espectros = CacheSTFT(pasta_stft) if pasta_stft and espectrograma else None
+    gerados = 0
+    for grupo in grupos:
+        if 'mixagem' in grupo[0]:
+            gerados += renderizar_overlaps(grupo, pasta_saida, armazenamento, espectros, espectrograma)
+        else:
+            gerados += renderizar_audio_60s(grupo, pasta_saida, armazenamento, rotulos_quadros)
+    armazenamento.aguardar()
+    return gerados
+
+def executar_plano(caminho_plano, pasta_saida, armazenamento=None, n_workers=1, tipos=None, intervalo=None,
+                   pasta_stft=None, tamanho_lote=16, rotulos_quadros=False, espectrograma=True):
+    """
+    Gera as saídas de um plano (todas ou um subconjunto), em paralelo
+    
+    Args:
+        caminho_plano (str): CSV de salvar_plano (overlaps ou áudios de 60s)
+        pasta_saida (str): Pasta de saída (as saídas do plano são relativas a ela)
+        armazenamento: De onde ler os cortes e onde gravar (só com n_workers=1; os
+                       processos usam ArmazenamentoDisco)
+        n_workers (int): Processos em paralelo (None: os.cpu_count())
+        tipos (list): Só os overlaps destes tipos (ex: ["pp", "w"])
+        intervalo (tuple): (início, fim) no índice das saídas do plano (após filtrar por tipo)
+        pasta_stft (str): Espectrogramas pela soma das STFTs (CacheSTFT), como em overlap.py
+        tamanho_lote (int): Grupos do plano por tarefa
+        rotulos_quadros (bool): Gravar os rótulos por quadro de cada áudio de 60s (rotulos.py)
+        espectrograma (bool): Se False, os overlaps são gravados sem espectrograma (pasta_stft é ignorada)
+    
+    Returns:
+        int: Número de saídas geradas
+    """
+    linhas = carregar_plano(caminho_plano)
+    if tipos is not None:
+        linhas = [linha for linha in linhas if linha.get('tipo') in tipos]
+    if intervalo is not None:
+        # O intervalo conta saídas: linhas de overlaps ou áudios de 60s
+        saidas = list(dict.fromkeys(linha['saida'] for linha in linhas))
+        selecionadas = set(saidas[intervalo[0]:intervalo[1]])
+        linhas = [linha for linha in linhas if linha['saida'] in selecionadas]
+    grupos = agrupar_plano(linhas)
+    print(f"Executando {len(grupos)} grupos do plano {caminho_plano}")
+    
+    lotes = [grupos[i:i + tamanho_lote] for i in range(0, len(grupos), tamanho_lote)]
+    if n_workers == 1 or len(lotes) <= 1:
+        return _executar_grupos(grupos, pasta_saida, armazenamento, pasta_stft, rotulos_quadros, espectrograma)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return sum(executor.map(_executar_grupos, lotes, [pasta_saida] * len(lotes), [None] * len(lotes),
+                                [pasta_stft] * len(lotes), [rotulos_quadros] * len(lotes),
+                                [espectrograma] * len(lotes)))
+
+def planejar_pipeline(config, caminho_plano_overlaps=None, caminho_plano_60s=None):
+    """
+    Planos das etapas overlap e combine_60s de uma configuração do pipeline.py, sem gerar áudio
+    (os cortes precisam existir; o plano de 60s usa o plano de overlaps quando as duas etapas
+    estão na configuração)
+    
+    Returns:
+        tuple: (linhas do plano de overlaps, linhas do plano de 60s); None para etapas ausentes
+    """
+    etapas = config['etapas']
+    globais = {chave: config.get(chave) for chave in ('semente', 'catalogo', 'intensidades')}
+    plano_overlaps, plano_60s = None, None
+    if 'overlap' in etapas:
+        etapa = {**globais, **etapas['overlap']}
+        plano_overlaps = planejar_overlaps(
+            etapa['pasta_labels'], etapa['pares_vocalizacoes'], taxa_reducao=etapa.get('taxa_reducao'),
+            n=etapa.get('n', 1000), semente=etapa.get('semente'), variantes=etapa.get('variantes', 1),
+            caminho_catalogo=etapa.get('catalogo'), caminho_intensidades=etapa.get('intensidades'),
+            nivel_relativo=etapa.get('nivel_relativo'), caminho_duplicatas=etapa.get('duplicatas'))
+        if caminho_plano_overlaps:
+            salvar_plano(plano_overlaps, caminho_plano_overlaps)
+    if 'combine_60s' in etapas:
+        etapa = {**globais, **etapas['combine_60s']}
+        planejado = (plano_overlaps is not None and
+                     os.path.abspath(etapa['pasta_overlaps']) == os.path.abspath(etapas['overlap']['pasta_saida']))
+        plano_60s = planejar_audios_60s(
+            etapa['pasta_overlaps'], etapa['pasta_background'], n_vocalizacoes=etapa.get('n_vocalizacoes', 500),
+            semente=etapa.get('semente'), caminho_catalogo=None if planejado else etapa.get('catalogo'),
+            caminho_intensidades=etapa.get('intensidades'), snr_db=etapa.get('snr_db'),
+            plano_overlaps=plano_overlaps if planejado else None)
+        if caminho_plano_60s:
+            salvar_plano(plano_60s, caminho_plano_60s)
+    return plano_overlaps, plano_60s
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Planejar (sem áudio) e executar a geração de overlaps e áudios de 60s")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    
+    planejar = subparsers.add_parser('planejar', help="Planos das etapas overlap e combine_60s de um pipeline.json")
+    planejar.add_argument('config', help="Configuração do pipeline.py")
+    planejar.add_argument('--overlaps', default='plano_overlaps.csv')
+    planejar.add_argument('--audios-60s', default='plano_60s.csv')
+    
+    executar = subparsers.add_parser('executar', help="Gerar as saídas de um plano")
+    executar.add_argument('plano')
+    executar.add_argument('pasta_saida')
+    executar.add_argument('--workers', type=int, default=None)
+    executar.add_argument('--tipos', nargs='+', default=None)
+    executar.add_argument('--intervalo', default=None, help="início:fim no índice das saídas")
+    executar.add_argument('--stft', default=None, help="Pasta do cache de STFTs")
+    executar.add_argument('--rotulos-quadros', action='store_true', help="Gravar os rótulos por quadro (60s)")
+    executar.add_argument('--sem-espectrograma', action='store_true', help="Overlaps sem espectrograma")
+    args = parser.parse_args()
+    
+    if args.comando == 'planejar':
+        with open(args.config, 'r', encoding='utf-8') as f:
+            planejar_pipeline(json.load(f), args.overlaps, args.audios_60s)
+    else:
+        intervalo = None
+        if args.intervalo:
+            inicio, fim = args.intervalo.split(':')
+            intervalo = (int(inicio) if inicio else 0, int(fim) if fim else None)
+        gerados = executar_plano(args.plano, args.pasta_saida, n_workers=args.workers, tipos=args.tipos,
+                                 intervalo=intervalo, pasta_stft=args.stft,
+                                 rotulos_quadros=args.rotulos_quadros, espectrograma=not args.sem_espectrograma)
+        print(f"{gerados} saídas geradas em {args.pasta_saida}")
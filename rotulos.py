@@ -0,0 +1,214 @@
+import os
+import json
+import glob
+import wave
+import argparse
+import numpy as np
+from anotacoes import carregar_anotacoes, caminho_anotacoes
+
+# Mesmo hop do espectrograma Mel (overlap.py / espectros.py): um quadro a cada 128 amostras
+HOP = 128
+TAXA = 48000
+# Labels dos áudios de 60s (obter_label_do_caminho em combine_60s.py)
+CLASSES_60S = ('m', 'n', 'v', 'w', 'u')
+
+def numero_quadros(n_amostras, hop=HOP):
+    """Quadros do espectrograma com center=True (como o librosa) para n_amostras"""
+    return 1 + n_amostras // hop
+
+def matriz_quadros(onsets, offsets, labels, n_quadros, classes, hop=HOP, taxa=TAXA):
+    """
+    Rótulos por quadro: o quadro t (centro em t * hop amostras) recebe a classe k se algum
+    intervalo da classe contém o seu centro (onset <= t < offset, como Anotacoes.no_ponto)
+    
+    Args:
+        onsets (array): Inícios em segundos
+        offsets (array): Fins em segundos
+        labels (array): Label de cada intervalo (labels fora de `classes` são ignoradas)
+        n_quadros (int): Número de quadros
+        classes (list): Ordem das colunas
+        hop (int): Amostras por quadro
+        taxa (int): Taxa de amostragem
+    
+    Returns:
+        np.ndarray: uint8 n_quadros x classes (0/1; intervalos sobrepostos marcam várias colunas)
+    """
+    indice_classe = {label: k for k, label in enumerate(classes)}
+    colunas = np.array([indice_classe.get(label, -1) for label in labels], dtype=np.int64)
+    validos = colunas >= 0
+    # Primeiro quadro com centro >= tempo (arredondado para não errar por ponto flutuante)
+    inicio = np.ceil(np.round(np.asarray(onsets, dtype=np.float64)[validos] * taxa / hop, 6)).astype(np.int64)
+    fim = np.ceil(np.round(np.asarray(offsets, dtype=np.float64)[validos] * taxa / hop, 6)).astype(np.int64)
+    inicio = np.clip(inicio, 0, n_quadros)
+    fim = np.clip(fim, 0, n_quadros)
+    
+    # Diferenças (+1 no início, -1 no fim) e soma acumulada por classe
+    delta = np.zeros((n_quadros + 1, len(classes)), dtype=np.int32)
+    np.add.at(delta, (inicio, colunas[validos]), 1)
+    np.add.at(delta, (fim, colunas[validos]), -1)
+    return (np.cumsum(delta[:-1], axis=0) > 0).astype(np.uint8)
+
+def caminho_rotulos(caminho_wav):
+    """Arquivo de rótulos por quadro de um WAV (audio.wav.rotulos.npy)"""
+    return f"{os.path.splitext(caminho_wav)[0]}.wav.rotulos.npy"
+
+# Ordem das colunas (e hop) dos .wav.rotulos.npy de uma pasta, gravada ao lado deles
+ARQUIVO_CLASSES = 'rotulos_classes.json'
+_classes_conferidas = set()  # (pasta, classes, hop) já gravados ou conferidos neste processo
+
+def gravar_classes(pasta, classes, hop=HOP, substituir=False):
+    """
+    Grava a ordem das colunas dos rótulos por quadro da pasta (ARQUIVO_CLASSES)
+    
+    Args:
+        substituir (bool): Sobrescrever uma ordem diferente já gravada (senão é um erro:
+                           os .npy existentes da pasta passariam a ser lidos com as colunas erradas)
+    """
+    pasta = os.path.abspath(pasta)
+    if (pasta, tuple(classes), hop) in _classes_conferidas:
+        return
+    dados = {'classes': list(classes), 'hop': hop}
+    caminho = os.path.join(pasta, ARQUIVO_CLASSES)
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            existentes = json.load(f)
+    except (OSError, ValueError):
+        existentes = None
+    if existentes != dados:
+        if existentes is not None and not substituir:
+            raise ValueError(f"Rótulos de {pasta} já usam as classes {existentes.get('classes')} "
+                             f"(hop {existentes.get('hop')}), não {list(classes)} (hop {hop})")
+        caminho_tmp = f"{caminho}.{os.getpid()}.tmp"
+        with open(caminho_tmp, 'w', encoding='utf-8') as f:
+            json.dump(dados, f)
+        os.replace(caminho_tmp, caminho)
+    _classes_conferidas.add((pasta, tuple(classes), hop))
+
+def carregar_rotulos(caminho_wav):
+    """
+    Rótulos por quadro de um áudio e a ordem das colunas (ARQUIVO_CLASSES da pasta)
+    
+    Returns:
+        tuple: (matriz quadros x classes, classes, hop)
+    """
+    with open(os.path.join(os.path.dirname(os.path.abspath(caminho_wav)), ARQUIVO_CLASSES), 'r',
+              encoding='utf-8') as f:
+        dados = json.load(f)
+    return np.load(caminho_rotulos(caminho_wav)), dados['classes'], dados['hop']
+
+def salvar_rotulos(caminho_wav, anotacoes, n_amostras, classes=CLASSES_60S, hop=HOP, taxa=TAXA):
+    """
+    Grava os rótulos por quadro de um áudio ao lado dele (caminho_rotulos) e a ordem das
+    colunas na pasta (ARQUIVO_CLASSES)
+    
+    Args:
+        caminho_wav (str): Áudio
+        anotacoes (list): Dicionários com onset_s, offset_s e label (como em salvar_anotacoes_csv)
+        n_amostras (int): Comprimento do áudio em amostras
+    """
+    gravar_classes(os.path.dirname(os.path.abspath(caminho_wav)), classes, hop)
+    matriz = matriz_quadros([a['onset_s'] for a in anotacoes], [a['offset_s'] for a in anotacoes],
+                            [a['label'] for a in anotacoes], numero_quadros(n_amostras, hop), classes, hop, taxa)
+    np.save(caminho_rotulos(caminho_wav), matriz)
+    return matriz
+
+def _amostras_wav(caminho_wav):
+    with wave.open(caminho_wav, 'rb') as f:
+        return f.getnframes(), f.getframerate()
+
+def criar_rotulos_pastas(pastas, classes=CLASSES_60S, hop=HOP, por_arquivo=True, caminho_loja=None):
+    """
+    Rótulos por quadro de todos os .wav com anotações (.wav.csv) das pastas (recursivamente)
+    
+    Args:
+        pastas (list): Pastas com áudios anotados (ex: saída do combine_60s)
+        classes (list): Ordem das colunas (default: CLASSES_60S, a mesma do combine_60s);
+                        labels fora dela são ignoradas e listadas no final
+        hop (int): Amostras por quadro
+        por_arquivo (bool): Gravar um `.wav.rotulos.npy` ao lado de cada áudio (e a ordem das
+                            colunas em ARQUIVO_CLASSES, substituindo a anterior)
+        caminho_loja (str): Se informado, grava também uma loja única para leitura mapeada:
+                            `<caminho_loja>.npy` (todos os quadros concatenados) e
+                            `<caminho_loja>.json` (classes, hop e posição de cada áudio)
+    
+    Returns:
+        tuple: (classes, número de áudios)
+    """
+    # Número de quadros de cada áudio pelo cabeçalho, para alocar a loja antes de ler as anotações
+    arquivos = []
+    for pasta in pastas:
+        for caminho_wav in sorted(glob.glob(os.path.join(pasta, '**', '*.wav'), recursive=True)):
+            caminho_csv = caminho_anotacoes(caminho_wav)
+            if caminho_csv is not None:
+                n_amostras, taxa = _amostras_wav(caminho_wav)
+                arquivos.append((caminho_wav, caminho_csv, taxa, numero_quadros(n_amostras, hop)))
+    
+    loja, indice, posicao = None, {}, 0
+    if caminho_loja:
+        loja = np.lib.format.open_memmap(caminho_loja + '.npy.tmp', mode='w+', dtype=np.uint8,
+                                         shape=(sum(n_quadros for *_, n_quadros in arquivos), len(classes)))
+    ignoradas = set()
+    for caminho_wav, caminho_csv, taxa, n_quadros in arquivos:
+        anotacoes = carregar_anotacoes(caminho_csv)
+        ignoradas.update(set(anotacoes.vocabulario) - set(classes))
+        matriz = matriz_quadros(anotacoes.onsets, anotacoes.offsets, anotacoes.labels, n_quadros, classes, hop, taxa)
+        if por_arquivo:
+            gravar_classes(os.path.dirname(os.path.abspath(caminho_wav)), classes, hop, substituir=True)
+            np.save(caminho_rotulos(caminho_wav), matriz)
+        if loja is not None:
+            loja[posicao:posicao + n_quadros] = matriz
+            indice[os.path.abspath(caminho_wav)] = [posicao, n_quadros, taxa]
+            posicao += n_quadros
+    
+    if loja is not None:
+        loja.flush()
+        del loja
+        os.replace(caminho_loja + '.npy.tmp', caminho_loja + '.npy')
+        with open(caminho_loja + '.json.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'classes': list(classes), 'hop': hop, 'arquivos': indice}, f)
+        os.replace(caminho_loja + '.json.tmp', caminho_loja + '.json')
+    
+    print(f"Rótulos por quadro de {len(arquivos)} áudios ({len(classes)} classes: {', '.join(classes)})")
+    if ignoradas:
+        print(f"Labels ignoradas (fora de --classes): {', '.join(sorted(ignoradas))}")
+    return classes, len(arquivos)
+
+class LojaRotulos:
+    """
+    Leitura da loja de rótulos por quadro (criar_rotulos_pastas com caminho_loja), mapeada
+    em memória: cada consulta é só uma fatia do array, sem ler CSVs
+    
+    Args:
+        caminho_loja (str): Caminho sem extensão (`<caminho_loja>.npy` e `.json`)
+    """
+    def __init__(self, caminho_loja):
+        with open(caminho_loja + '.json', 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+        self.classes = dados['classes']
+        self.hop = dados['hop']
+        self.arquivos = dados['arquivos']
+        self.matriz = np.load(caminho_loja + '.npy', mmap_mode='r')
+    
+    def __len__(self):
+        return len(self.arquivos)
+    
+    def quadros(self, caminho_wav, inicio_s=None, fim_s=None):
+        """
+        Rótulos (quadros x classes) de um áudio, opcionalmente só dos quadros entre inicio_s e fim_s
+        """
+        posicao, n_quadros, taxa = self.arquivos[os.path.abspath(caminho_wav)]
+        primeiro = 0 if inicio_s is None else min(n_quadros, int(np.ceil(inicio_s * taxa / self.hop)))
+        ultimo = n_quadros if fim_s is None else min(n_quadros, int(np.ceil(fim_s * taxa / self.hop)))
+        return self.matriz[posicao + primeiro:posicao + max(primeiro, ultimo)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rótulos por quadro (uint8 .npy) a partir das anotações .wav.csv")
+    parser.add_argument('pastas', nargs='+', help="Pastas com áudios anotados")
+    parser.add_argument('--classes', nargs='+', default=list(CLASSES_60S),
+                        help="Ordem das colunas (default: a do combine_60s)")
+    parser.add_argument('--hop', type=int, default=HOP)
+    parser.add_argument('--loja', default=None, help="Loja única mapeada em memória (caminho sem extensão)")
+    parser.add_argument('--sem-arquivos', action='store_true', help="Não gravar um .npy por áudio")
+    args = parser.parse_args()
+    
+    criar_rotulos_pastas(args.pastas, args.classes, args.hop, not args.sem_arquivos, args.loja)
@@ -1,7 +1,8 @@
 import os
 import glob
+from anotacoes import carregar_anotacoes
 
-def txt_to_csv(input_folder="."):
+def txt_to_csv(input_folder=".", labels_validos=None):
     # Encontra todos os arquivos .txt no diretório
     txt_files = glob.glob(os.path.join(input_folder, "*.txt"))
     
@@ -9,20 +10,19 @@ def txt_to_csv(input_folder="."):
         # Define o nome do arquivo CSV
         csv_file = txt_file.replace(".txt", ".wav.csv")
         
-        with open(txt_file, 'r', encoding='utf-8') as infile:
-            with open(csv_file, 'w', encoding='utf-8') as outfile:
-                # Escreve o cabeçalho
-                outfile.write("onset_s,offset_s,label\n")
-                
-                # Processa cada linha
-                for line in infile:
-                    line = line.strip()
-                    if line:  # Ignora linhas vazias
-                        # Substitui tabs e espaços por vírgulas
-                        csv_line = line.replace('\t', ',').replace(' ', ',')
-                        outfile.write(csv_line + '\n')
+        # Lê e valida as linhas (onset offset label separados por espaços ou tabs);
+        # linhas inválidas são descartadas com aviso. Qualquer label é mantida, a menos que
+        # labels_validos seja informado (ex: anotacoes.LABELS_CONHECIDOS)
+        try:
+            anotacoes = carregar_anotacoes(txt_file, labels_validos=labels_validos)
+        except (ValueError, OSError) as e:
+            print(f"Erro ao converter {txt_file}: {str(e)}")
+            continue
+        
+        # Escreve o CSV no formato padrão (com cabeçalho)
+        anotacoes.salvar_csv(csv_file)
         
         print(f"Convertido: {txt_file} -> {csv_file}")
 
 if __name__ == "__main__":
-    txt_to_csv(r"C:\Users\EthogenesisLab\Downloads\Feitos_Feitos-20251005T222933Z-1-001\Feitos_Feitos")
\ No newline at end of file
+    txt_to_csv(r"C:\Users\EthogenesisLab\Downloads\Feitos_Feitos-20251005T222933Z-1-001\Feitos_Feitos")